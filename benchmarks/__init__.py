@@ -0,0 +1,8 @@
+"""
+benchmarks
+----------
+Standalone performance benchmarks for PyTraceX. Each module exposes a
+``run()`` function returning a JSON-serializable dict and can be executed
+directly, e.g. ``python -m benchmarks.bench_trace_event``; ``python -m benchmarks``
+runs them all and emits a single JSON document.
+"""
@@ -0,0 +1,119 @@
+"""
+__main__.py
+-----------
+Run the benchmark suite and emit one JSON document, e.g.::
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --quick --only decorators io_tracing
+    python -m benchmarks --compare baseline.json
+
+Every benchmark module's ``run()`` is called with the parameters below
+(``--quick`` uses smaller ones). ``--compare`` adds the relative change of
+every numeric result against an earlier results file.
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import platform
+import sys
+import time
+from typing import Any, Dict, Iterator, Tuple
+
+# name -> (full-size parameters, quick parameters)
+SUITE: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {
+    "trace_event": ({"n": 100_000}, {"n": 10_000}),
+    "decorators": ({"n": 20_000, "size": 1_000}, {"n": 2_000, "size": 100}),
+    "io_tracing": ({"chunks": 20_000}, {"chunks": 2_000}),
+    "middleware": ({"n": 20_000}, {"n": 2_000}),
+    "record_event": ({"thread_counts": (1, 8, 32), "events": 100_000}, {"thread_counts": (1, 8, 32), "events": 10_000}),
+    "dashboard": ({"store_sizes": (1_000, 10_000, 100_000)}, {"store_sizes": (1_000, 10_000), "repeat": 10}),
+    "sqlite_storage": ({"rows": 200_000}, {"rows": 20_000}),
+    "collector": ({"workers": 4, "events_per_worker": 50_000}, {"workers": 2, "events_per_worker": 5_000}),
+}
+
+
+def _version() -> str:
+    try:
+        from importlib.metadata import version
+        return version("pytracex")
+    except Exception:
+        return "unknown"
+
+
+def run_suite(names=None, quick: bool = False) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "pytracex": _version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "started": time.time(),
+        "benchmarks": {},
+    }
+    for name in names or SUITE:
+        full, small = SUITE[name]
+        module = importlib.import_module(f"benchmarks.bench_{name}")
+        print(f"Running {name}...", file=sys.stderr)
+        start = time.perf_counter()
+        try:
+            result = module.run(**(small if quick else full))
+        except Exception as e:
+            result = {"error": repr(e)}
+        result["elapsed_sec"] = time.perf_counter() - start
+        results["benchmarks"][name] = result
+    return results
+
+
+def _numbers(value: Any, path: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _numbers(item, f"{path}.{key}" if path else str(key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield path, value
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """
+    For every numeric result present in both runs: both values and the
+    relative change. Whether higher is better depends on the metric's name
+    (``*_per_sec`` vs. latencies and overheads).
+    """
+    before = dict(_numbers(baseline.get("benchmarks", {})))
+    changes = {}
+    for path, value in _numbers(current.get("benchmarks", {})):
+        if path in before and not path.endswith("elapsed_sec"):
+            old = before[path]
+            changes[path] = {
+                "baseline": old,
+                "current": value,
+                "change": (value - old) / abs(old) if old else None,
+            }
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the PyTraceX benchmark suite.")
+    parser.add_argument("--only", nargs="+", choices=sorted(SUITE), help="benchmarks to run (default: all)")
+    parser.add_argument("--quick", action="store_true", help="smaller parameters for a fast smoke run")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file from an earlier run")
+    parser.add_argument("--verbose", action="store_true", help="keep INFO logging from traced code")
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    results = run_suite(args.only, args.quick)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            results["comparison"] = compare(json.load(f), results)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
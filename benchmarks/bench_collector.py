@@ -0,0 +1,68 @@
+"""
+bench_collector.py
+------------------
+Cross-process throughput of the collector: forked worker processes record
+events that are shipped over the Unix socket to a ``CollectorServer`` in this
+process, which records them into its ``TraceManager``.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+from pytracex.collector import CollectorServer, connect_collector
+from pytracex.trace_manager import TraceManager, TraceEvent
+
+
+def _worker(events: int):
+    manager = TraceManager()
+    for i in range(events):
+        manager.record_event(TraceEvent(event_type="bench", function_name="work", duration=0.001, meta={"i": i}))
+    manager.flush()
+
+
+def run(workers: int = 4, events_per_worker: int = 50_000) -> Dict[str, Any]:
+    manager = TraceManager()
+    manager.clear_events()
+    total = workers * events_per_worker
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "collector.sock")
+        with CollectorServer(path, manager) as server:
+            processor = connect_collector(path, max_queue_size=100_000, max_batch_size=2_000, overflow="block")
+            try:
+                start = time.perf_counter()
+                pids = []
+                for _ in range(workers):
+                    pid = os.fork()
+                    if pid == 0:
+                        try:
+                            _worker(events_per_worker)
+                        finally:
+                            os._exit(0)
+                    pids.append(pid)
+                for pid in pids:
+                    os.waitpid(pid, 0)
+                sent = time.perf_counter()
+                while server.received < total:
+                    time.sleep(0.001)
+                elapsed = time.perf_counter() - start
+            finally:
+                manager.remove_exporter(processor)
+    manager.clear_events()
+    return {
+        "workers": workers,
+        "events": total,
+        "events_per_sec": total / elapsed,
+        "drain_after_workers_exit_sec": elapsed - (sent - start),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--events", type=int, default=50_000, help="events per worker")
+    args = parser.parse_args()
+    print(json.dumps(run(args.workers, args.events), indent=2))
@@ -0,0 +1,60 @@
+"""
+bench_dashboard.py
+------------------
+Latency of the dashboard's ``GET /traces`` (first page, a later page and a
+filtered page) as the store grows. Requires FastAPI and httpx.
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict, Sequence
+
+from pytracex.trace_manager import TraceManager, TraceEvent
+
+
+def _latency_ms(client, url: str, repeat: int) -> float:
+    client.get(url)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(url)
+        response.raise_for_status()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(store_sizes: Sequence[int] = (1_000, 10_000, 100_000), repeat: int = 50) -> Dict[str, Any]:
+    try:
+        from fastapi.testclient import TestClient
+        from pytracex.dashboard import create_app
+    except ImportError as e:
+        return {"skipped": f"dashboard dependencies missing: {e}"}
+
+    manager = TraceManager()
+    client = TestClient(create_app(manager))
+    results: Dict[str, Any] = {"repeat": repeat, "latency_ms": {}}
+    for size in store_sizes:
+        manager.clear_events()
+        for i in range(size):
+            manager.record_event(TraceEvent(
+                event_type="function_call" if i % 2 else "http_request",
+                function_name=f"func_{i % 10}",
+                duration=0.001,
+                meta={"i": i},
+            ))
+        manager.flush()
+        middle = manager.query(limit=size // 2)[1]
+        results["latency_ms"][str(size)] = {
+            "first_page": _latency_ms(client, "/traces?limit=100", repeat),
+            "cursor_page": _latency_ms(client, f"/traces?limit=100&cursor={middle}", repeat),
+            "filtered_page": _latency_ms(client, "/traces?limit=100&function_name=func_7", repeat),
+        }
+    manager.clear_events()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.repeat), indent=2))
@@ -0,0 +1,100 @@
+"""
+bench_decorators.py
+-------------------
+Per-call overhead of ``@trace``, ``@audit`` and ``@ml_step`` over an
+undecorated function, for arguments of increasing size, and of the fast path
+taken by sampled-out and disabled ``@trace`` calls.
+"""
+
+import argparse
+import json
+import time
+from functools import wraps
+from typing import Any, Callable, Dict
+
+from pytracex import sampling
+from pytracex.decorators import trace, audit
+from pytracex.ml_tracking import ml_step
+from pytracex.trace_manager import TraceManager
+
+DECORATORS = {
+    "trace": trace,
+    "audit": audit,
+    "ml_step": ml_step(),
+}
+
+
+def _arguments(size: int) -> Dict[str, Any]:
+    return {
+        "scalar": (42,),
+        "list": (list(range(size)),),
+        "dict": ({f"key_{i}": i for i in range(size)},),
+        "text": ("x" * size,),
+    }
+
+
+def _ns_per_call(func: Callable, args: tuple, n: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        func(*args)
+    return (time.perf_counter_ns() - start) / n
+
+
+def _fast_path(n: int) -> Dict[str, float]:
+    """
+    ns per call of sampled-out and disabled ``@trace`` calls next to the
+    thinnest possible pass-through wrapper.
+    """
+    def work(value):
+        return value
+
+    def passthrough(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return func(*args, **kwargs)
+        return wrapper
+
+    args = (1,)
+    results = {
+        "passthrough": min(_ns_per_call(passthrough(work), args, n) for _ in range(5)),
+        "sampled_out": min(_ns_per_call(trace(sample_rate=0.0)(work), args, n) for _ in range(5)),
+    }
+    sampling.set_tracing_enabled(False)
+    try:
+        results["disabled"] = min(_ns_per_call(trace(work), args, n) for _ in range(5))
+    finally:
+        sampling.set_tracing_enabled(True)
+    return results
+
+
+def run(n: int = 20_000, size: int = 1_000) -> Dict[str, Any]:
+    manager = TraceManager()
+
+    def work(value):
+        return value
+
+    results: Dict[str, Any] = {"calls": n, "argument_size": size, "overhead_ns_per_call": {}}
+    for arg_name, args in _arguments(size).items():
+        baseline = _ns_per_call(work, args, n)
+        row = {"baseline": baseline}
+        for name, decorator in DECORATORS.items():
+            manager.clear_events()
+            decorated = decorator(work)
+            start = time.perf_counter_ns()
+            for _ in range(n):
+                decorated(*args)
+            # Include work deferred to background stages (audit signing).
+            manager.flush()
+            row[name] = (time.perf_counter_ns() - start) / n - baseline
+        results["overhead_ns_per_call"][arg_name] = row
+    results["fast_path_ns_per_call"] = _fast_path(n)
+    manager.clear_events()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", type=int, default=20_000, help="calls per measurement")
+    parser.add_argument("--size", type=int, default=1_000, help="items in list/dict/str arguments")
+    args = parser.parse_args()
+    print(json.dumps(run(args.n, args.size), indent=2))
@@ -0,0 +1,67 @@
+"""
+bench_io_tracing.py
+-------------------
+Read and write throughput through ``traced_open`` in "events" and
+"aggregate" mode, compared with the untraced ``open()``.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+from pytracex.io_tracing import traced_io
+from pytracex.trace_manager import TraceManager
+
+
+def _write(path: str, chunk: bytes, chunks: int) -> float:
+    start = time.perf_counter()
+    with open(path, "wb") as f:
+        for _ in range(chunks):
+            f.write(chunk)
+    return time.perf_counter() - start
+
+
+def _read(path: str, chunk_size: int) -> float:
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        while f.read(chunk_size):
+            pass
+    return time.perf_counter() - start
+
+
+def _throughput(path: str, chunk: bytes, chunks: int) -> Dict[str, float]:
+    megabytes = len(chunk) * chunks / 1e6
+    write = _write(path, chunk, chunks)
+    read = _read(path, len(chunk))
+    return {
+        "write_mb_per_sec": megabytes / write,
+        "read_mb_per_sec": megabytes / read,
+        "write_ops_per_sec": chunks / write,
+        "read_ops_per_sec": chunks / read,
+    }
+
+
+def run(chunk_size: int = 4096, chunks: int = 20_000) -> Dict[str, Any]:
+    manager = TraceManager()
+    manager.clear_events()
+    chunk = b"x" * chunk_size
+    results: Dict[str, Any] = {"chunk_size": chunk_size, "chunks": chunks}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.bin")
+        results["untraced"] = _throughput(path, chunk, chunks)
+        for mode in ("events", "aggregate"):
+            with traced_io(mode=mode):
+                results[mode] = _throughput(path, chunk, chunks)
+            manager.clear_events()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--chunks", type=int, default=20_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.chunk_size, args.chunks), indent=2))
@@ -0,0 +1,79 @@
+"""
+bench_middleware.py
+-------------------
+Requests/sec of an in-process ASGI app with and without ``TracingMiddleware``.
+Requests are driven directly through the ASGI interface, so the numbers
+measure middleware overhead rather than network or server costs.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict
+
+from pytracex.middlewares import TracingMiddleware
+from pytracex.trace_manager import TraceManager
+
+
+async def plain_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _fastapi_app():
+    try:
+        from fastapi import FastAPI
+    except ImportError:
+        return None
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        return {"item_id": item_id}
+
+    return app
+
+
+async def _drive(app, n: int, path: str) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    headers = [(b"host", b"bench"), (b"x-correlation-id", b"bench-request")]
+    start = time.perf_counter()
+    for _ in range(n):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "", "headers": headers,
+            "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+        }
+        await app(scope, receive, send)
+    return n / (time.perf_counter() - start)
+
+
+def _compare(app, n: int, path: str) -> Dict[str, float]:
+    manager = TraceManager()
+    manager.clear_events()
+    baseline = asyncio.run(_drive(app, n, path))
+    traced = asyncio.run(_drive(TracingMiddleware(app), n, path))
+    manager.clear_events()
+    return {
+        "requests_per_sec": baseline,
+        "traced_requests_per_sec": traced,
+        "overhead_us_per_request": (1 / traced - 1 / baseline) * 1e6,
+    }
+
+
+def run(n: int = 20_000) -> Dict[str, Any]:
+    results = {"requests": n, "raw_asgi": _compare(plain_app, n, "/")}
+    app = _fastapi_app()
+    if app is not None:
+        results["fastapi"] = _compare(app, n // 4, "/items/1")
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
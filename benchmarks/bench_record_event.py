@@ -0,0 +1,54 @@
+"""
+bench_record_event.py
+---------------------
+Aggregate ``TraceManager.record_event`` throughput with several threads
+recording concurrently.
+"""
+
+import argparse
+import json
+import threading
+import time
+from typing import Any, Dict, Sequence
+
+from pytracex.trace_manager import TraceManager, TraceEvent
+
+
+def _measure(manager: TraceManager, threads: int, events_per_thread: int) -> float:
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for i in range(events_per_thread):
+            manager.record_event(TraceEvent(event_type="bench", function_name="work", duration=0.001, meta={"i": i}))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    manager.flush()
+    return threads * events_per_thread / (time.perf_counter() - start)
+
+
+def run(thread_counts: Sequence[int] = (1, 8, 32), events: int = 100_000) -> Dict[str, Any]:
+    """
+    ``events`` is the total per measurement, split evenly across threads.
+    """
+    manager = TraceManager()
+    results: Dict[str, Any] = {"events": events, "events_per_sec": {}}
+    for threads in thread_counts:
+        manager.clear_events()
+        results["events_per_sec"][str(threads)] = _measure(manager, threads, events // threads)
+    manager.clear_events()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--events", type=int, default=100_000, help="events per measurement")
+    args = parser.parse_args()
+    print(json.dumps(run(args.threads, args.events), indent=2))
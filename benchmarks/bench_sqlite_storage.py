@@ -0,0 +1,81 @@
+"""
+bench_sqlite_storage.py
+-----------------------
+Measures sustained insert throughput of ``SQLiteStorage`` and the latency of
+the dashboard's typical queries (filtered pages, time ranges, cursor pages).
+
+The default row count keeps a run short; pass ``--rows 10000000`` for the
+full-size measurement.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Dict
+
+from pytracex.storage import SQLiteStorage
+from pytracex.trace_manager import TraceEvent
+
+EVENT_TYPES = ("function_call", "audit_call", "http_request", "ml_step")
+
+
+def _insert(storage: SQLiteStorage, rows: int, base_time: float) -> float:
+    start = time.perf_counter()
+    for i in range(rows):
+        storage.append(TraceEvent(
+            event_type=EVENT_TYPES[i % len(EVENT_TYPES)],
+            function_name=f"func_{i % 1000}",
+            timestamp=base_time + i * 0.001,
+            duration=0.0001,
+            meta={"args": [i], "kwargs": {}},
+        ))
+    storage.flush()
+    return rows / (time.perf_counter() - start)
+
+
+def _latency_ms(query, repeat: int = 20) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(timings), "max_ms": max(timings)}
+
+
+def run(rows: int = 200_000) -> Dict[str, Any]:
+    base_time = 1_700_000_000.0
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteStorage(
+            os.path.join(tmp, "bench.db"),
+            max_queue_size=100_000,
+            max_batch_size=5_000,
+            overflow="block",
+        )
+        try:
+            inserts_per_sec = _insert(storage, rows, base_time)
+            middle = base_time + rows * 0.0005
+            cursor = rows // 2  # seqs start at 0 in a fresh database
+            results = {
+                "rows": rows,
+                "inserts_per_sec": inserts_per_sec,
+                "db_bytes": os.path.getsize(os.path.join(tmp, "bench.db")),
+                "filter_event_type": _latency_ms(lambda: storage.query({"event_type": "audit_call"}, limit=100)),
+                "filter_function_name": _latency_ms(lambda: storage.query({"function_name": "func_7"}, limit=100)),
+                "time_range": _latency_ms(lambda: storage.query(since=middle, until=middle + 1.0, limit=1000)),
+                "cursor_page": _latency_ms(lambda: storage.query(cursor=cursor, limit=100)),
+                "filtered_cursor_page": _latency_ms(
+                    lambda: storage.query({"event_type": "ml_step"}, cursor=cursor, limit=100)
+                ),
+            }
+        finally:
+            storage.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    print(json.dumps(run(parser.parse_args().rows), indent=2))
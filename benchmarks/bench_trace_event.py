@@ -0,0 +1,79 @@
+"""
+bench_trace_event.py
+--------------------
+Compares construction throughput and retained memory of ``TraceEvent``
+against the original uuid4/dict-based implementation.
+"""
+
+import gc
+import json
+import time
+import tracemalloc
+import uuid
+from typing import Any, Dict
+
+from pytracex.context import get_correlation_id
+from pytracex.trace_manager import TraceEvent
+
+
+class LegacyTraceEvent:
+    """
+    The pre-slots TraceEvent, kept here as the comparison baseline.
+    """
+
+    def __init__(self, event_type, function_name="", timestamp=None, duration=0.0, meta=None):
+        self.event_id = str(uuid.uuid4())
+        self.event_type = event_type
+        self.function_name = function_name
+        self.timestamp = timestamp or time.time()
+        self.duration = duration
+        self.meta = meta or {}
+        self.meta["correlation_id"] = get_correlation_id()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "event_id": self.event_id,
+            "event_type": self.event_type,
+            "function_name": self.function_name,
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "meta": self.meta
+        }
+
+
+def _throughput(factory, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        factory()
+    return n / (time.perf_counter() - start)
+
+
+def _retained_bytes(factory, n):
+    gc.collect()
+    tracemalloc.start()
+    kept = [factory() for _ in range(n)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current / n
+
+
+def run(n: int = 100_000) -> Dict[str, Any]:
+    # The legacy store kept to_dict() output; the new one keeps the event itself.
+    legacy = lambda: LegacyTraceEvent("function_call", "f", duration=0.001, meta={"args": (1, 2)}).to_dict()
+    current = lambda: TraceEvent("function_call", "f", duration=0.001, meta={"args": (1, 2)})
+
+    results = {
+        "events": n,
+        "legacy_events_per_sec": _throughput(legacy, n),
+        "events_per_sec": _throughput(current, n),
+        "legacy_bytes_per_event": _retained_bytes(legacy, n),
+        "bytes_per_event": _retained_bytes(current, n),
+    }
+    results["speedup"] = results["events_per_sec"] / results["legacy_events_per_sec"]
+    results["memory_ratio"] = results["bytes_per_event"] / results["legacy_bytes_per_event"]
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -15,8 +15,12 @@ __version__ = "0.4.0"
 from .trace_manager import TraceManager
 from .decorators import trace, audit
 from .ml_tracking import ml_step
-from .context import set_correlation_id, get_correlation_id
-from .io_tracing import trace_file_ops  
+from .sampling import set_tracing_enabled, is_tracing_enabled, set_sample_rate
+from .context import set_correlation_id, get_correlation_id, start_span, end_span, get_current_span
+from .io_tracing import trace_file_ops, untrace_file_ops, traced_io
+from .exporters import Exporter, InMemoryExporter, JSONLFileExporter, SQLiteExporter
+from .utils.hashing import verify_log
+from .collector import connect_collector, serve_collector
 
 # Optional modules (conditionally imported)
 try:
@@ -33,5 +37,20 @@ __all__ = [
     "run_dashboard",
     "set_correlation_id",
     "get_correlation_id",
-    "trace_file_ops"
+    "start_span",
+    "end_span",
+    "get_current_span",
+    "set_tracing_enabled",
+    "is_tracing_enabled",
+    "set_sample_rate",
+    "trace_file_ops",
+    "untrace_file_ops",
+    "traced_io",
+    "Exporter",
+    "InMemoryExporter",
+    "JSONLFileExporter",
+    "SQLiteExporter",
+    "verify_log",
+    "connect_collector",
+    "serve_collector",
 ]
@@ -0,0 +1,193 @@
+"""
+collector.py
+------------
+Aggregates events from several processes (uvicorn/gunicorn workers,
+multiprocessing pools) into one ``TraceManager``.
+
+Workers attach a ``CollectorExporter``, which ships batches of events from the
+export thread over a Unix domain socket. The aggregator, typically the dashboard
+process, runs a ``CollectorServer`` that records them into its own manager.
+Each frame is a 4-byte big-endian length followed by a JSON array of event
+dicts.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import threading
+from typing import Any, Dict, List, Optional
+from .config import LOGGER, COLLECTOR_SOCKET_PATH, COLLECTOR_MAX_FRAME
+from .exporters import Exporter, BatchExportProcessor
+from .trace_manager import TraceManager, TraceEvent
+
+_HEADER = struct.Struct("!I")
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), default=repr).encode("utf-8")
+
+
+class CollectorExporter(Exporter):
+    """
+    Sends each batch as one frame to the collector at ``path``. The socket is
+    opened lazily and reopened once if the aggregator restarted.
+    """
+
+    def __init__(self, path: str = COLLECTOR_SOCKET_PATH):
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def export(self, batch: List[Dict[str, Any]]):
+        payload = _dumps(batch)
+        frame = _HEADER.pack(len(payload)) + payload
+        if self._sock is None:
+            self._sock = self._connect()
+        try:
+            self._sock.sendall(frame)
+        except OSError:
+            self.shutdown()
+            self._sock = self._connect()
+            self._sock.sendall(frame)
+
+    def after_fork(self):
+        # The child needs its own connection; writing to the inherited one
+        # would interleave its frames with the parent's. Closing the child's
+        # copy of the descriptor leaves the parent's connection open.
+        self.shutdown()
+
+    def shutdown(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class _FrameHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server: "CollectorServer" = self.server.collector
+        read = self.rfile.read
+        while True:
+            header = read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            (size,) = _HEADER.unpack(header)
+            if size > COLLECTOR_MAX_FRAME:
+                LOGGER.warning("Collector frame of %d bytes exceeds the limit; closing connection.", size)
+                return
+            payload = read(size)
+            if len(payload) < size:
+                return
+            try:
+                events = [TraceEvent.from_dict(data) for data in json.loads(payload)]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                LOGGER.warning("Collector received a malformed frame; closing connection.")
+                return
+            server._record(events)
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:  # Windows: no Unix domain sockets, so no collector.
+    _UnixServer = None
+
+
+def _check_directory(directory: str):
+    """
+    Create the socket's directory (mode 0700) if it is missing, and refuse a
+    directory another user owns: they could replace the socket.
+    """
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    owner = os.stat(directory).st_uid
+    if owner not in (0, os.getuid()):
+        raise PermissionError(f"Collector socket directory {directory} is owned by another user (uid {owner}).")
+
+
+class CollectorServer:
+    """
+    Receives events from ``CollectorExporter`` clients on ``path`` and records
+    them into ``manager`` (default: this process's ``TraceManager``), keeping
+    their original IDs. The socket is only accessible to the current user, and
+    its directory is created (mode 0700) if missing.
+    """
+
+    def __init__(self, path: str = COLLECTOR_SOCKET_PATH, manager: TraceManager = None):
+        self.path = path
+        self.manager = manager or TraceManager()
+        self.received = 0
+        self._received_lock = threading.Lock()
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CollectorServer":
+        if _UnixServer is None:
+            raise RuntimeError("The collector requires Unix domain sockets.")
+        _check_directory(os.path.dirname(os.path.abspath(self.path)))
+        # A socket file left behind by a previous aggregator blocks bind().
+        if os.path.exists(self.path) and stat.S_ISSOCK(os.stat(self.path).st_mode):
+            os.unlink(self.path)
+        # bind() creates the socket file: with this umask it is never, even
+        # briefly, accessible to other users.
+        umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(self.path, _FrameHandler)
+        finally:
+            os.umask(umask)
+        self._server.collector = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="pytracex-collector", daemon=True)
+        self._thread.start()
+        return self
+
+    def _record(self, events: List[TraceEvent]):
+        record_event = self.manager.record_event
+        for event in events:
+            record_event(event)
+        with self._received_lock:
+            self.received += len(events)
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def connect_collector(path: str = COLLECTOR_SOCKET_PATH, **options) -> BatchExportProcessor:
+    """
+    Ship every event recorded in this process to the collector at ``path``.
+    Keyword options are passed to ``BatchExportProcessor``.
+
+    Call it once, before or after forking: exporter threads are restarted in
+    forked children, so a gunicorn ``--preload`` master can set it up for all
+    its workers.
+    """
+    return TraceManager().add_exporter(CollectorExporter(path), **options)
+
+
+def serve_collector(path: str = COLLECTOR_SOCKET_PATH, manager: TraceManager = None) -> CollectorServer:
+    """
+    Start a ``CollectorServer`` on a background thread and return it.
+    """
+    return CollectorServer(path, manager).start()
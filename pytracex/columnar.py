@@ -0,0 +1,328 @@
+"""
+columnar.py
+-----------
+Columnar export of stored events for offline analysis.
+
+Events become typed NumPy columns: IDs as int64, timestamps and durations as
+float64, event_type/function_name/correlation_id dictionary-encoded (int32
+codes plus a list of categories) and meta flattened into one typed column per
+key. Columns are written as ``.npy`` files (loadable as memory maps) or, when
+pyarrow is installed, as a Parquet file with dictionary-encoded string columns.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+# Bound at import time so file I/O tracing never traces the export itself.
+_open = open
+
+SCHEMA_FILE = "schema.json"
+DICTIONARY_FIELDS = ("event_type", "function_name", "correlation_id")
+INT_FIELDS = ("event_id", "trace_id", "span_id", "parent_span_id")
+FLOAT_FIELDS = ("timestamp", "duration")
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+# Column kinds recorded in the schema.
+INT = "int64"
+FLOAT = "float64"
+BOOL = "bool"
+DICTIONARY = "dictionary"
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("NumPy not installed. Install it to use columnar export.")
+
+
+class Columns:
+    """
+    A set of equal-length columns. ``arrays`` maps names to NumPy arrays;
+    dictionary-encoded columns hold int32 codes (-1 for missing) into
+    ``categories[name]``. Missing ints are -1, missing floats NaN.
+    """
+
+    def __init__(self, arrays: Dict[str, Any], kinds: Dict[str, str], categories: Dict[str, List[str]]):
+        self.arrays = arrays
+        self.kinds = kinds
+        self.categories = categories
+
+    def __len__(self) -> int:
+        return len(self.arrays["timestamp"]) if "timestamp" in self.arrays else 0
+
+    def __getitem__(self, name: str):
+        return self.arrays[name]
+
+    def decode(self, name: str) -> List[Any]:
+        """
+        The values of a dictionary-encoded column as Python strings/None.
+        """
+        values = self.categories[name]
+        return [values[code] if code >= 0 else None for code in self.arrays[name].tolist()]
+
+
+def _flatten(meta: Dict[str, Any], prefix: str, out: Dict[str, Any]):
+    for key, value in meta.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            _flatten(value, f"{name}.", out)
+        else:
+            out[name] = value
+
+
+def _kind_of(values: Iterable[Any]) -> str:
+    kind = None
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value_kind = BOOL
+        elif isinstance(value, int):
+            if not _INT64_MIN <= value <= _INT64_MAX:
+                # Doesn't fit an int64 column; float64 would round it.
+                return DICTIONARY
+            value_kind = INT
+        elif isinstance(value, float):
+            value_kind = FLOAT
+        else:
+            return DICTIONARY
+        if kind is None or kind == value_kind:
+            kind = value_kind
+        elif {kind, value_kind} <= {INT, FLOAT}:
+            kind = FLOAT
+        else:
+            return DICTIONARY
+    return kind or DICTIONARY
+
+
+def _encode(values: List[Any]) -> Tuple[Any, List[str]]:
+    categories: Dict[str, int] = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        if not isinstance(value, str):
+            value = json.dumps(value, separators=(",", ":"), default=repr)
+        code = categories.get(value)
+        if code is None:
+            code = categories[value] = len(categories)
+        codes[i] = code
+    return codes, list(categories)
+
+
+def _typed(values: List[Any], kind: str):
+    if kind == BOOL and None not in values:
+        return np.array(values, dtype=np.bool_), BOOL
+    if kind == INT and None not in values:
+        return np.array(values, dtype=np.int64), INT
+    if kind in (INT, FLOAT, BOOL):
+        # Missing values: fall back to float64 with NaN.
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64), FLOAT
+    raise ValueError(kind)
+
+
+def to_columns(events: Iterable[Any] = None, meta_fields: Sequence[str] = None) -> Columns:
+    """
+    Convert events (dicts or ``TraceEvent`` objects; default: everything in
+    the TraceManager's storage, read page by page) into ``Columns``.
+
+    Nested meta dicts are flattened with dotted names and stored as
+    ``meta.<key>`` columns; ``meta_fields`` limits which flattened keys are kept.
+    """
+    _require_numpy()
+    from .storage import as_event_dict
+
+    if events is None:
+        from .trace_manager import TraceManager
+        events = TraceManager().iter_events()
+
+    fields = INT_FIELDS + FLOAT_FIELDS + DICTIONARY_FIELDS
+    values: Dict[str, List[Any]] = {name: [] for name in fields}
+    meta_values: Dict[str, List[Any]] = {}
+    wanted = set(meta_fields) if meta_fields is not None else None
+    count = 0
+    for item in events:
+        event = as_event_dict(item)
+        meta = event.get("meta") or {}
+        for name in INT_FIELDS + FLOAT_FIELDS:
+            values[name].append(event.get(name))
+        values["event_type"].append(event["event_type"])
+        values["function_name"].append(event["function_name"])
+        values["correlation_id"].append(meta.get("correlation_id"))
+        flat: Dict[str, Any] = {}
+        _flatten(meta, "", flat)
+        flat.pop("correlation_id", None)
+        for key, value in flat.items():
+            if wanted is not None and key not in wanted:
+                continue
+            column = meta_values.get(key)
+            if column is None:
+                column = meta_values[key] = [None] * count
+            column.append(value)
+        count += 1
+        for column in meta_values.values():
+            if len(column) < count:
+                column.append(None)
+
+    arrays: Dict[str, Any] = {}
+    kinds: Dict[str, str] = {}
+    categories: Dict[str, List[str]] = {}
+    for name in INT_FIELDS:
+        arrays[name] = np.array([-1 if v is None else v for v in values[name]], dtype=np.int64)
+        kinds[name] = INT
+    for name in FLOAT_FIELDS:
+        arrays[name] = np.array(values[name], dtype=np.float64)
+        kinds[name] = FLOAT
+    columns = [(name, values[name], DICTIONARY) for name in DICTIONARY_FIELDS]
+    columns += [(f"meta.{key}", column, _kind_of(column)) for key, column in meta_values.items()]
+    for name, column, kind in columns:
+        if kind == DICTIONARY:
+            arrays[name], categories[name] = _encode(column)
+            kinds[name] = DICTIONARY
+        else:
+            arrays[name], kinds[name] = _typed(column, kind)
+    return Columns(arrays, kinds, categories)
+
+
+def _column_file(index: int, name: str) -> str:
+    # Unique by index, since sanitizing can map different names (meta.a/b and
+    # meta.a_b) to the same file; the real name is kept in the schema.
+    return f"{index:04d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}.npy"
+
+
+def export_columnar(path: str, events: Iterable[Any] = None, format: str = None, **options) -> str:
+    """
+    Write events as columns to ``path``: a directory of ``.npy`` files plus
+    ``schema.json`` (``format="npy"``), or a Parquet file (``format="parquet"``,
+    requires pyarrow). The default is Parquet when pyarrow is installed.
+    ``options`` are passed to ``to_columns``.
+    """
+    columns = events if isinstance(events, Columns) else to_columns(events, **options)
+    format = format or ("parquet" if pq is not None else "npy")
+    if format == "parquet":
+        if pq is None:
+            raise ImportError("pyarrow not installed. Install it to export Parquet.")
+        table = pa.table({
+            name: (
+                pa.DictionaryArray.from_arrays(
+                    pa.array(array, mask=array < 0), pa.array(columns.categories[name], type=pa.string())
+                )
+                if columns.kinds[name] == DICTIONARY else pa.array(array)
+            )
+            for name, array in columns.arrays.items()
+        })
+        pq.write_table(table, path)
+        return path
+    if format != "npy":
+        raise ValueError(f"Unknown columnar format {format!r}")
+    os.makedirs(path, exist_ok=True)
+    schema = {"length": len(columns), "columns": {}}
+    for index, (name, array) in enumerate(columns.arrays.items()):
+        file = _column_file(index, name)
+        np.save(os.path.join(path, file), array, allow_pickle=False)
+        schema["columns"][name] = {"kind": columns.kinds[name], "file": file}
+        if name in columns.categories:
+            schema["columns"][name]["categories"] = columns.categories[name]
+    with _open(os.path.join(path, SCHEMA_FILE), "w", encoding="utf-8") as f:
+        json.dump(schema, f)
+    return path
+
+
+def load_columnar(path: str, mmap: bool = True) -> Columns:
+    """
+    Load columns written by ``export_columnar``. ``.npy`` columns are memory
+    mapped by default; Parquet files are read with pyarrow.
+    """
+    _require_numpy()
+    if os.path.isdir(path):
+        with _open(os.path.join(path, SCHEMA_FILE), encoding="utf-8") as f:
+            schema = json.load(f)
+        arrays, kinds, categories = {}, {}, {}
+        for name, column in schema["columns"].items():
+            arrays[name] = np.load(os.path.join(path, column["file"]), mmap_mode="r" if mmap else None)
+            kinds[name] = column["kind"]
+            if "categories" in column:
+                categories[name] = column["categories"]
+        return Columns(arrays, kinds, categories)
+    if pq is None:
+        raise ImportError("pyarrow not installed. Install it to read Parquet.")
+    table = pq.read_table(path)
+    arrays, kinds, categories = {}, {}, {}
+    for name in table.column_names:
+        column = table.column(name).combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            arrays[name] = column.indices.fill_null(-1).to_numpy().astype(np.int32)
+            categories[name] = column.dictionary.to_pylist()
+            kinds[name] = DICTIONARY
+        else:
+            arrays[name] = column.to_numpy(zero_copy_only=False)
+            kinds[name] = str(arrays[name].dtype)
+    return Columns(arrays, kinds, categories)
+
+
+def latency_percentiles(
+    columns: Columns,
+    by: Sequence[str] = ("event_type", "function_name"),
+    percentiles: Sequence[float] = (50, 95, 99),
+    value: str = "duration",
+) -> Dict[str, Any]:
+    """
+    Group rows by the dictionary-encoded columns in ``by`` and compute count,
+    mean and the given percentiles (linear interpolation, like
+    ``numpy.percentile``) of ``value`` per group, without a Python loop over
+    rows or groups.
+
+    Returns a dict of equal-length columns: one per grouping column (decoded
+    strings), ``count``, ``mean`` and ``p<N>`` for each percentile.
+    """
+    _require_numpy()
+    values = np.asarray(columns[value], dtype=np.float64)
+    key = np.zeros(len(values), dtype=np.int64)
+    for name in by:
+        codes = np.asarray(columns[name], dtype=np.int64) + 1  # missing (-1) becomes 0
+        key = key * (len(columns.categories[name]) + 1) + codes
+
+    order = np.lexsort((values, key))
+    key = key[order]
+    values = values[order]
+    if not len(values):
+        starts = np.empty(0, dtype=np.intp)
+    else:
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(key)) + 1))
+    counts = np.diff(np.append(starts, len(values)))
+
+    result: Dict[str, Any] = {}
+    group_keys = key[starts]
+    for name in reversed(by):
+        size = len(columns.categories[name]) + 1
+        codes = group_keys % size - 1
+        group_keys = group_keys // size
+        names = columns.categories[name]
+        result[name] = [names[code] if code >= 0 else None for code in codes.tolist()]
+    result = {name: result[name] for name in by}
+    result["count"] = counts
+    sums = np.add.reduceat(values, starts) if len(values) else np.empty(0)
+    result["mean"] = sums / np.maximum(counts, 1)
+    for percentile in percentiles:
+        position = starts + (counts - 1) * (percentile / 100.0)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.minimum(lower + 1, starts + counts - 1)
+        fraction = position - lower
+        result[f"p{percentile:g}"] = values[lower] + (values[upper] - values[lower]) * fraction
+    return result
@@ -6,6 +6,8 @@ Global defaults for PyTraceX. These can be customized by the user.
 
 import logging
 import os
+import tempfile
+import warnings
 
 LOGGER_NAME = "pytracex"
 LOGGER = logging.getLogger(LOGGER_NAME)
@@ -14,8 +16,73 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 )
 
-# In-memory default storage (could be replaced by DB or external store)
-TRACE_STORAGE = []
+# In-memory default storage: a fixed-capacity ring buffer (could be replaced by DB or external store).
+# When full, "overwrite_oldest" evicts the oldest event and "drop_newest" rejects the new one.
+TRACE_STORAGE_CAPACITY = 100_000
+TRACE_STORAGE_OVERFLOW = "overwrite_oldest"
+
+# Storage backend used by TraceManager: "memory" (the ring buffer above),
+# "segmented" (an append-only log of rolling segment files on disk) or
+# "sqlite" (an indexed SQLite database written in batches).
+TRACE_STORAGE_BACKEND = os.environ.get("PYTRACEX_STORAGE_BACKEND", "memory")
+TRACE_SEGMENT_DIR = os.environ.get("PYTRACEX_SEGMENT_DIR", "pytracex-traces")
+TRACE_SEGMENT_SIZE = 16 * 1024 * 1024
+# Sealed segments older than this many seconds, or beyond this total size, are deleted.
+TRACE_RETENTION_MAX_AGE = 7 * 24 * 3600
+TRACE_RETENTION_MAX_BYTES = 1024 * 1024 * 1024
+TRACE_SQLITE_PATH = os.environ.get("PYTRACEX_SQLITE_PATH", "pytracex-traces.db")
+
+
+def __getattr__(name):
+    # TRACE_STORAGE, the list events used to be appended to, is deprecated.
+    if name == "TRACE_STORAGE":
+        warnings.warn(
+            "pytracex.config.TRACE_STORAGE is deprecated: events are kept by the storage backend "
+            "chosen with TRACE_STORAGE_BACKEND. It now returns a snapshot of the stored events; "
+            "use TraceManager().get_events() instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        from .trace_manager import TraceManager
+        return TraceManager()._storage.snapshot()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Background export pipeline (see exporters.BatchExportProcessor).
+# When the queue is full, "drop_newest" discards the event and "block" applies backpressure.
+EXPORT_QUEUE_SIZE = 10_000
+EXPORT_BATCH_SIZE = 512
+EXPORT_FLUSH_INTERVAL = 1.0
+EXPORT_OVERFLOW = "drop_newest"
+
+# Live event subscriptions (e.g. the dashboard WebSocket feed). A subscriber with more
+# than SUBSCRIPTION_MAX_PENDING undelivered events either loses the oldest ones
+# ("drop_oldest") or is disconnected ("disconnect").
+SUBSCRIPTION_MAX_PENDING = 10_000
+SUBSCRIPTION_OVERFLOW = "drop_oldest"
+# Stored events read per query when a subscriber resumes from a cursor; pages are
+# read off the event loop, one at a time as the subscriber drains them.
+SUBSCRIPTION_BACKFILL_PAGE_SIZE = 500
+# How long the dashboard waits to coalesce a burst of events into one WebSocket message.
+DASHBOARD_COALESCE_INTERVAL = 0.1
+
+# Global tracing switch and head-based sampling (see sampling.py).
+# TRACE_SAMPLE_RATES maps function names to their own rate. With
+# TRACE_SAMPLE_ON_ERROR, sampled-out calls are still recorded if they raise.
+TRACING_ENABLED = True
+TRACE_SAMPLE_RATE = 1.0
+TRACE_SAMPLE_RATES = {}
+TRACE_SAMPLE_ON_ERROR = True
+# Inside a request, sample by a hash of the correlation ID so that all of a
+# request's calls, in every service, are kept or dropped together.
+TRACE_SAMPLE_BY_CORRELATION_ID = True
+# Tail-based sampling: requests dropped by the head decision are buffered (at
+# most TRACE_TAIL_BUFFER_SIZE events each, TRACE_TAIL_MAX_REQUESTS requests)
+# and kept after all if an event errors or takes TRACE_TAIL_LATENCY_THRESHOLD
+# seconds or more.
+TRACE_TAIL_SAMPLING = False
+TRACE_TAIL_LATENCY_THRESHOLD = 1.0
+TRACE_TAIL_BUFFER_SIZE = 1_000
+TRACE_TAIL_MAX_REQUESTS = 10_000
 
 # Default PII masking rules
 PII_PATTERNS = {
@@ -26,6 +93,89 @@ PII_REPLACEMENTS = {
     "email": "[EMAIL REDACTED]",
     "ssn": "[SSN REDACTED]"
 }
+# Strings/bytes longer than this are replaced by a placeholder instead of being scanned.
+PII_MAX_SCAN_LENGTH = 64 * 1024
+# Number of distinct strings whose masked form is cached. Only strings of at most
+# PII_CACHE_MAX_LENGTH characters are cached; longer ones are scanned on every call.
+PII_CACHE_SIZE = 4096
+PII_CACHE_MAX_LENGTH = 256
+# Per-function allowlists of parameter names that are never scanned, e.g.
+# {"transfer": {"amount", "currency"}}.
+PII_SAFE_FIELDS = {}
+
+# File I/O tracing (see io_tracing.py). "events" records every call, "aggregate"
+# keeps per-handle counters and records one summary event on close. Paths are
+# traced if they match IO_TRACE_INCLUDE (empty = everything) and not IO_TRACE_EXCLUDE.
+IO_TRACE_MODE = "events"
+IO_TRACE_INCLUDE = []
+IO_TRACE_EXCLUDE = ["*/site-packages/*", "*/dist-packages/*", "*.log"]
+
+# Header used by TracingMiddleware to read and echo correlation IDs.
+CORRELATION_ID_HEADER = "X-Correlation-ID"
+
+# Multi-process collection: workers ship batches of events over this Unix
+# domain socket to one aggregator process (see collector.py). Frames larger
+# than COLLECTOR_MAX_FRAME bytes are rejected. The default lives in the
+# user's private $XDG_RUNTIME_DIR or, failing that, in a per-user 0700
+# directory under the temp dir, never directly in a shared /tmp.
+COLLECTOR_SOCKET_PATH = os.environ.get("PYTRACEX_COLLECTOR_SOCKET") or (
+    os.path.join(os.environ["XDG_RUNTIME_DIR"], "pytracex-collector.sock")
+    if os.environ.get("XDG_RUNTIME_DIR")
+    else os.path.join(tempfile.gettempdir(), f"pytracex-{getattr(os, 'getuid', lambda: 'user')()}", "collector.sock")
+)
+COLLECTOR_MAX_FRAME = 64 * 1024 * 1024
+
+# Per-(event_type, function_name) latency aggregates kept by TraceManager.
+# Histograms split each power of two of nanoseconds into
+# 2 ** (PRECISION_BITS - 1) buckets (about 3% error at 6 bits) up to
+# 2 ** MAX_BITS ns. With METRICS_ONLY, @trace updates only the aggregates and
+# stores no events.
+METRICS_ENABLED = True
+METRICS_ONLY = os.environ.get("PYTRACEX_METRICS_ONLY", "").lower() in ("1", "true", "yes")
+METRICS_HISTOGRAM_PRECISION_BITS = 6
+METRICS_HISTOGRAM_MAX_BITS = 42
+
+# Exceptions raised by decorated calls are counted per fingerprint (type plus
+# code locations). The failed call's own event carries the fingerprint and, the
+# first time it is seen, an "error_stack" of its innermost ERRORS_STACK_DEPTH
+# frames; no separate event is recorded.
+ERRORS_MAX_FINGERPRINTS = 1000
+ERRORS_STACK_DEPTH = 16
+ERRORS_MAX_MESSAGE = 500
+
+# Sampling profiler (see profiler.py): stacks of all threads are sampled
+# PROFILER_HZ times per second, keeping at most PROFILER_MAX_DEPTH frames and
+# PROFILER_MAX_STACKS distinct (context, stack) keys.
+PROFILER_HZ = 100
+PROFILER_MAX_DEPTH = 64
+PROFILER_MAX_STACKS = 100_000
+
+# ml_step records summaries of its inputs and output (see summaries.py)
+# instead of repr(). Each summary is capped at ML_SUMMARY_MAX_BYTES of JSON;
+# containers show their first ML_SUMMARY_MAX_ITEMS items (or DataFrame
+# columns), nested at most ML_SUMMARY_MAX_DEPTH deep; array statistics use at
+# most ML_SUMMARY_SAMPLE_SIZE elements.
+ML_SUMMARY_MAX_BYTES = 4096
+ML_SUMMARY_MAX_ITEMS = 16
+ML_SUMMARY_MAX_DEPTH = 3
+ML_SUMMARY_MAX_REPR = 120
+ML_SUMMARY_SAMPLE_SIZE = 10_000
+ML_SUMMARY_CACHE_SIZE = 256
+
+# Disk cache used by ml_step(cache=True); see step_cache.py. Least recently
+# used entries are evicted beyond ML_CACHE_MAX_BYTES or ML_CACHE_MAX_ENTRIES.
+ML_CACHE_DIR = os.environ.get("PYTRACEX_ML_CACHE_DIR", ".pytracex-cache")
+ML_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+ML_CACHE_MAX_ENTRIES = 1000
 
 # Default secret key for tamper-proof hashing. (User should override in production!)
 DEFAULT_SECRET_KEY = os.environ.get("PYTRACEX_SECRET_KEY", "CHANGEME")
+
+# @audit events are signed and stored by a background signer in batches.
+# With AUDIT_DURABLE (or @audit(durable=True)) the call does not return until
+# its signed event has been written by the storage backend. Waiting blocks the
+# calling thread, so this only applies to plain functions and generators.
+AUDIT_DURABLE = False
+AUDIT_QUEUE_SIZE = 10_000
+AUDIT_BATCH_SIZE = 256
+AUDIT_FLUSH_INTERVAL = 0.1
@@ -1,22 +1,158 @@
 """
 context.py
 ----------
-Holds context variables such as correlation IDs for microservices.
+Holds context variables such as correlation IDs and the active span for microservices.
 """
 
+import asyncio
 import contextvars
+import threading
+from typing import Any, Dict, Optional, Tuple
+from .utils.ids import next_id
 
 # A context variable for correlation IDs in microservices
 _correlation_id_var = contextvars.ContextVar("correlation_id", default=None)
 
-def set_correlation_id(corr_id: str):
+# The innermost active span. Entering a span is a single ContextVar.set and
+# leaving it a single reset, so nesting costs O(1) per call.
+_span_var = contextvars.ContextVar("span", default=None)
+
+# Other threads' context variables can't be read, so while a sampling profiler
+# runs, every change of correlation ID or span also publishes the pair here,
+# keyed by thread ident, along with the asyncio task that changed it (if any).
+_thread_context: Dict[int, Tuple[Optional[str], Optional["SpanContext"], Any]] = {}
+_track_threads = False
+
+def _current_task():
+    loop = asyncio._get_running_loop()
+    return None if loop is None else asyncio.current_task(loop)
+
+def _publish():
+    correlation_id, span = _correlation_id_var.get(), _span_var.get()
+    if correlation_id is None and span is None:
+        # Same as having no entry; don't keep one per idle or finished thread.
+        _thread_context.pop(threading.get_ident(), None)
+    else:
+        _thread_context[threading.get_ident()] = (correlation_id, span, _current_task())
+
+def prune_thread_context(live_idents):
+    """
+    Forget published context of threads that are no longer in ``live_idents``.
+    """
+    for ident in list(_thread_context):
+        if ident not in live_idents:
+            _thread_context.pop(ident, None)
+
+def set_thread_tracking(enabled: bool):
+    """
+    Start or stop publishing each thread's correlation ID and span for
+    ``thread_context``. Used by the sampling profiler.
+    """
+    global _track_threads
+    _track_threads = bool(enabled)
+    if not enabled:
+        _thread_context.clear()
+
+def running_tasks() -> Dict[int, Any]:
+    """
+    The asyncio task each thread is running right now, keyed by thread ident.
+    """
+    tasks = {}
+    for loop, task in list(getattr(asyncio.tasks, "_current_tasks", {}).items()):
+        ident = getattr(loop, "_thread_id", None)
+        if ident is not None:
+            tasks[ident] = task
+    return tasks
+
+def thread_context(ident: int, task=None) -> Tuple[Optional[str], Optional["SpanContext"]]:
+    """
+    The (correlation ID, span) of the thread ``ident``, which is running the
+    asyncio task ``task`` (see ``running_tasks``), if any.
+
+    A task's own context is read where Python exposes it (3.12+). Otherwise
+    the thread's last published context is used only if the same task (or
+    no task) published it and is still running; context published by another
+    task is reported as none rather than attributed to the wrong request.
+    """
+    if task is not None and hasattr(task, "get_context"):
+        task_context = task.get_context()
+        return task_context.get(_correlation_id_var), task_context.get(_span_var)
+    correlation_id, span, publisher = _thread_context.get(ident, (None, None, None))
+    if publisher is not task:
+        return None, None
+    return correlation_id, span
+
+def set_correlation_id(corr_id: str) -> contextvars.Token:
     """
     Set a correlation ID in the context. Typically set at the start of each request.
+    Returns a token that ``reset_correlation_id`` accepts.
+    """
+    token = _correlation_id_var.set(corr_id)
+    if _track_threads:
+        _publish()
+    return token
+
+def reset_correlation_id(token: contextvars.Token):
+    """
+    Restore the correlation ID that was set before the matching ``set_correlation_id``.
     """
-    _correlation_id_var.set(corr_id)
+    _correlation_id_var.reset(token)
+    if _track_threads:
+        _publish()
 
 def get_correlation_id() -> str:
     """
     Retrieve the current correlation ID from the context.
     """
     return _correlation_id_var.get()
+
+
+class SpanContext:
+    """
+    Identifies one span: the trace it belongs to, its own ID and its parent's ID.
+    """
+
+    __slots__ = ("trace_id", "span_id", "parent_span_id")
+
+    def __init__(self, trace_id: int, span_id: int, parent_span_id: Optional[int] = None):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_span_id = parent_span_id
+
+    def __repr__(self):
+        return f"<SpanContext trace={self.trace_id:016x} span={self.span_id:016x}>"
+
+
+def new_span() -> SpanContext:
+    """
+    Create a child of the active span (or a new root span) without activating it.
+    """
+    parent = _span_var.get()
+    span_id = next_id()
+    if parent is None:
+        return SpanContext(span_id, span_id, None)
+    return SpanContext(parent.trace_id, span_id, parent.span_id)
+
+def start_span() -> Tuple[SpanContext, contextvars.Token]:
+    """
+    Create a span and make it the active one. Pass the token to ``end_span``.
+    """
+    span = new_span()
+    token = _span_var.set(span)
+    if _track_threads:
+        _publish()
+    return span, token
+
+def end_span(token: contextvars.Token):
+    """
+    Restore the span that was active before the matching ``start_span``.
+    """
+    _span_var.reset(token)
+    if _track_threads:
+        _publish()
+
+def get_current_span() -> Optional[SpanContext]:
+    """
+    Retrieve the active span, if any.
+    """
+    return _span_var.get()
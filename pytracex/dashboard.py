@@ -6,46 +6,202 @@ Includes a basic WebSocket endpoint for advanced visualization if installed.
 """
 
 try:
-    from fastapi import FastAPI, WebSocket
-    from fastapi.responses import JSONResponse
+    from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
+    from fastapi.responses import Response, StreamingResponse
     import uvicorn
 except ImportError:
     FastAPI = None
     uvicorn = None
 
 import asyncio
+import json
+from typing import Optional
+from .config import DASHBOARD_COALESCE_INTERVAL
+from .subscriptions import SubscriptionClosed
 from .trace_manager import TraceManager
+from .collector import serve_collector
 
-def run_dashboard(host: str = "127.0.0.1", port: int = 8000):
+# Upper bound for the page size of GET /traces.
+MAX_PAGE_SIZE = 1000
+
+def _dumps(value) -> str:
+    # Traced args can hold arbitrary objects; fall back to repr() for those.
+    return json.dumps(value, separators=(",", ":"), default=repr)
+
+def _ndjson(events):
+    for event in events:
+        yield _dumps(event) + "\n"
+
+def create_app(manager: TraceManager = None) -> "FastAPI":
     """
-    Run the PyTraceX dashboard with optional real-time WebSocket streaming.
+    Build the dashboard application without starting a server.
     """
-    if not FastAPI or not uvicorn:
+    if not FastAPI:
         raise ImportError("FastAPI/Uvicorn not installed. Install with 'poetry install --extras dashboard'.")
 
     app = FastAPI(title="PyTraceX Dashboard")
-    manager = TraceManager()
+    manager = manager or TraceManager()
 
     @app.get("/traces")
-    def get_traces():
-        return JSONResponse(content=manager.get_events())
+    def get_traces(
+        limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[int] = None,
+        event_type: Optional[str] = None,
+        function_name: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ):
+        """
+        One page of events, oldest first. Pass ``next_cursor`` back as ``cursor``
+        to fetch the following page.
+        """
+        events, next_cursor = manager.query(
+            event_type=event_type,
+            function_name=function_name,
+            correlation_id=correlation_id,
+            since=since,
+            until=until,
+            cursor=cursor,
+            limit=limit,
+        )
+        return Response(
+            content=_dumps({"events": events, "next_cursor": next_cursor}),
+            media_type="application/json",
+        )
+
+    @app.get("/traces/stream")
+    def stream_traces(
+        cursor: Optional[int] = None,
+        event_type: Optional[str] = None,
+        function_name: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ):
+        """
+        All matching events as newline-delimited JSON, produced page by page.
+        """
+        events = manager.iter_events(
+            event_type=event_type,
+            function_name=function_name,
+            correlation_id=correlation_id,
+            since=since,
+            until=until,
+            cursor=cursor,
+        )
+        return StreamingResponse(_ndjson(events), media_type="application/x-ndjson")
 
     @app.delete("/traces")
     def clear_traces():
         manager.clear_events()
         return {"message": "All trace events cleared."}
 
+    @app.get("/metrics")
+    def get_metrics():
+        """
+        Streaming latency aggregates per (event_type, function_name).
+        """
+        return {"metrics": manager.get_metrics()}
+
+    @app.get("/errors")
+    def get_errors():
+        """
+        Distinct errors by fingerprint with their occurrence counts.
+        """
+        return {"errors": manager.get_errors()}
+
+    @app.get("/profile")
+    def get_profile(correlation_id: Optional[str] = None, trace_id: Optional[int] = None):
+        """
+        Folded stacks from the sampling profiler (flame graph input), if one
+        has been started.
+        """
+        if manager.profiler is None:
+            return Response(content="", media_type="text/plain")
+        text = manager.profiler.to_folded(correlation_id=correlation_id, trace_id=trace_id)
+        return Response(content=text, media_type="text/plain")
+
+    @app.get("/metrics/prometheus")
+    def get_metrics_prometheus():
+        return Response(
+            content=manager.metrics_to_prometheus(),
+            media_type="text/plain; version=0.0.4",
+        )
+
     # Optional real-time WebSocket endpoint
     @app.websocket("/ws/traces")
-    async def websocket_traces(websocket: WebSocket):
+    async def websocket_traces(
+        websocket: WebSocket,
+        cursor: Optional[int] = None,
+        event_type: Optional[str] = None,
+        function_name: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+    ):
+        """
+        Pushes only new events, as ``{"events": [...], "cursor": ..., "dropped": ...}``
+        messages. Reconnect with the last ``cursor`` to resume without gaps.
+        Clients that fall too far behind lose the oldest events (or are
+        disconnected, depending on ``SUBSCRIPTION_OVERFLOW``).
+        """
         await websocket.accept()
-        # In a real scenario, you'd push events as they come in (e.g., hooking record_event).
-        # For simplicity, let's just periodically send the entire event list.
+        subscription = manager.subscribe(
+            cursor=cursor,
+            event_type=event_type,
+            function_name=function_name,
+            correlation_id=correlation_id,
+        )
+        # Wait for the client as well as for events, so a disconnect ends the
+        # subscription even while no events arrive.
+        receive = asyncio.ensure_future(websocket.receive())
+        batch = None
         try:
             while True:
-                await websocket.send_json(manager.get_events())
-                await asyncio.sleep(2)  # Send every 2 seconds
-        except Exception:
+                if batch is None:
+                    batch = asyncio.ensure_future(subscription.next_batch(
+                        coalesce=DASHBOARD_COALESCE_INTERVAL,
+                        max_items=MAX_PAGE_SIZE,
+                    ))
+                done, _ = await asyncio.wait((receive, batch), return_when=asyncio.FIRST_COMPLETED)
+                if receive in done:
+                    if receive.result()["type"] == "websocket.disconnect":
+                        return
+                    # Clients have nothing to say; ignore what they send.
+                    receive = asyncio.ensure_future(websocket.receive())
+                if batch in done:
+                    events, cursor = batch.result()
+                    batch = None
+                    await websocket.send_text(_dumps({
+                        "events": events,
+                        "cursor": cursor,
+                        "dropped": subscription.dropped,
+                    }))
+        except SubscriptionClosed as exc:
+            # 1013: "try again later"; the client can resume from its last cursor.
+            await websocket.close(code=1013, reason=str(exc))
+        except WebSocketDisconnect:
             pass
+        finally:
+            for task in (receive, batch):
+                if task is not None:
+                    task.cancel()
+            manager.unsubscribe(subscription)
+
+    return app
+
+def run_dashboard(host: str = "127.0.0.1", port: int = 8000, collector_path: Optional[str] = None):
+    """
+    Run the PyTraceX dashboard with optional real-time WebSocket streaming.
+
+    With ``collector_path``, the dashboard also aggregates events shipped by
+    other processes over that Unix socket (see ``collector.connect_collector``).
+    """
+    if not FastAPI or not uvicorn:
+        raise ImportError("FastAPI/Uvicorn not installed. Install with 'poetry install --extras dashboard'.")
 
-    uvicorn.run(app, host=host, port=port)
+    server = serve_collector(collector_path) if collector_path else None
+    try:
+        uvicorn.run(create_app(), host=host, port=port)
+    finally:
+        if server is not None:
+            server.stop()
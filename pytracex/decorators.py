@@ -5,94 +5,307 @@ Provides decorators for function tracing, auditing, etc., with optional PII mask
 tamper-proof hashing, correlation IDs, etc.
 """
 
-import time
-import re
-from functools import wraps
-from typing import Any
+import copy
+import inspect
+import json
+import threading
+from typing import Dict, Iterable, List, Optional
 from .trace_manager import TraceManager, TraceEvent
-from .config import PII_PATTERNS, PII_REPLACEMENTS
-from .config import LOGGER
-from .utils.hashing import sign_event
+from .exporters import Exporter, BatchExportProcessor
+from .config import LOGGER, METRICS_ONLY, AUDIT_DURABLE, AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL
+from .masking import mask_pii, mask_arguments, positional_parameter_names, resolve_safe_fields
+from .utils.hashing import AuditChain, canonical_bytes, content_digest
 from .config import DEFAULT_SECRET_KEY
+from .instrumentation import instrument, SKIP, ERRORS_ONLY, RECORD
+from . import sampling
 
-def mask_pii(value: Any):
-    """
-    Basic PII masking. Extend as needed for complex data structures.
-    """
-    if isinstance(value, str):
-        for k, pattern in PII_PATTERNS.items():
-            replacement = PII_REPLACEMENTS.get(k, "[REDACTED]")
-            value = re.sub(pattern, replacement, value)
-        return value
-    elif isinstance(value, (list, tuple)):
-        return [mask_pii(v) for v in value]
-    elif isinstance(value, dict):
-        return {k: mask_pii(v) for k, v in value.items()}
-    return value
-
-def trace(func):
+# The hash chain shared by all @audit functions in this process.
+audit_chain = AuditChain(DEFAULT_SECRET_KEY)
+
+def trace(
+    func=None,
+    *,
+    sample_rate: float = None,
+    safe_fields: Iterable[str] = None,
+    metrics_only: bool = None
+):
     """
     A simple decorator that traces function calls (with optional PII masking).
+
+    Works on plain functions, coroutine functions, generators and async
+    generators. Can be used bare (``@trace``) or with options: a fixed
+    per-function ``sample_rate`` and ``safe_fields``, parameter names that are
+    never scanned for PII. Calls are not recorded at all when tracing is
+    disabled, and calls that are sampled out are only recorded if they raise.
+
+    With ``metrics_only=True`` (default: METRICS_ONLY) every call updates the
+    function's latency aggregate in ``TraceManager().metrics`` and no event is
+    stored, so hot functions can be measured without sampling. Passing both
+    ``metrics_only=True`` and a ``sample_rate`` raises ``ValueError``; with
+    METRICS_ONLY set globally, per-function sample rates are ignored.
     """
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
+    if func is None:
+        return lambda f: trace(f, sample_rate=sample_rate, safe_fields=safe_fields, metrics_only=metrics_only)
+    if metrics_only and sample_rate is not None:
+        raise ValueError("metrics_only=True measures every call; it can't be combined with sample_rate")
+    if sample_rate is not None:
+        sample_rate = sampling._check_rate(sample_rate)
+    func_name = func.__name__
+    if metrics_only is None:
+        metrics_only = METRICS_ONLY
+    if metrics_only:
+        return _trace_metrics(func, func_name)
+    arg_names = positional_parameter_names(func)
+    safe_fields = resolve_safe_fields(func_name, safe_fields)
 
-        masked_args = mask_pii(args)
-        masked_kwargs = mask_pii(kwargs)
+    def decide():
+        if not sampling.enabled:
+            return SKIP
+        if sampling.should_sample(func_name, sample_rate):
+            return RECORD
+        return ERRORS_ONLY if sampling.sample_on_error else SKIP
 
-        event = TraceEvent(
+    def record(start_time, end_time, args, kwargs, result, error, span):
+        masked_args, masked_kwargs = mask_arguments(args, kwargs, arg_names, safe_fields)
+        meta = {
+            "args": masked_args,
+            "kwargs": masked_kwargs
+        }
+        if error is not None:
+            meta.update(TraceManager().capture_exception(error, func_name))
+        TraceManager().record_event(TraceEvent(
             event_type="function_call",
-            function_name=func.__name__,
+            function_name=func_name,
             timestamp=start_time,
             duration=end_time - start_time,
-            meta={
-                "args": masked_args,
-                "kwargs": masked_kwargs
-            }
-        )
-        TraceManager().record_event(event)
-        return result
-    return wrapper
+            meta=meta,
+            span=span
+        ))
+
+    return instrument(func, record, decide)
+
+def _trace_metrics(func, func_name: str):
+    # Looked up once; the registry never replaces an aggregate.
+    aggregate = TraceManager().metrics.aggregate("function_call", func_name)
+
+    def decide():
+        return RECORD if sampling.enabled else SKIP
 
-def audit(func):
+    def record(start_time, end_time, args, kwargs, result, error, span):
+        aggregate.record(end_time - start_time, error is not None)
+
+    return instrument(func, record, decide)
+
+class _Unsealed:
+    """
+    An audit event queued for the signer with its content digest, which is
+    computed on the calling thread.
+    """
+
+    __slots__ = ("event", "digest")
+
+    def __init__(self, event: TraceEvent, digest: bytes):
+        self.event = event
+        self.digest = digest
+
+    def to_dict(self):
+        return self.event.to_dict()
+
+class AuditSigner(Exporter):
+    """
+    Runs on the audit signer's background thread: seals each batch of audit
+    events into ``audit_chain`` and records them. If a batch can't be sealed,
+    its events are sealed one by one, so only the events that fail are lost.
+
+    Sealed events that fail to record are kept in ``unrecorded`` and retried
+    with the next batch and at shutdown, since dropping them would leave a gap
+    in the chain. The failure is re-raised so the processor counts it in
+    ``export_errors``, and handed to durable callers waiting on the event.
+    """
+
+    def __init__(self):
+        self.unrecorded: List[TraceEvent] = []
+        # event_id -> the error that kept the event from being stored, or None
+        self._waiting: Dict[int, Optional[BaseException]] = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, item: _Unsealed) -> _Unsealed:
+        return item
+
+    def wait_for(self, event: TraceEvent):
+        """
+        Keep the outcome of ``event`` for ``outcome``; call before submitting it.
+        """
+        with self._lock:
+            self._waiting[event.event_id] = None
+
+    def outcome(self, event: TraceEvent) -> Optional[BaseException]:
+        """
+        The error that kept a waited-for event from being stored, if any.
+        """
+        with self._lock:
+            return self._waiting.pop(event.event_id, None)
+
+    def _fail(self, events: List[TraceEvent], error: BaseException):
+        with self._lock:
+            for event in events:
+                if event.event_id in self._waiting:
+                    self._waiting[event.event_id] = error
+
+    def export(self, batch: List[_Unsealed]):
+        sealed, errors = self._seal(batch)
+        with self._lock:
+            events, self.unrecorded = self.unrecorded + sealed, []
+        self._record(events)
+        if errors:
+            raise RuntimeError(f"{len(errors)} audit events could not be sealed and were dropped") from errors[-1]
+
+    def _seal(self, batch: List[_Unsealed]):
+        events = [item.event for item in batch]
+        try:
+            audit_chain.seal_batch(events, [item.digest for item in batch])
+            return events, []
+        except Exception:
+            pass
+        sealed, errors = [], []
+        for item in batch:
+            try:
+                audit_chain.seal(item.event, item.digest)
+            except Exception as exc:
+                errors.append(exc)
+                self._fail([item.event], exc)
+            else:
+                sealed.append(item.event)
+        return sealed, errors
+
+    def _record(self, events: List[TraceEvent]):
+        manager = TraceManager()
+        failed, error = [], None
+        for event in events:
+            try:
+                manager.record_event(event)
+            except Exception as exc:
+                failed.append(event)
+                error = exc
+                self._fail([event], exc)
+        if failed:
+            with self._lock:
+                self.unrecorded[:0] = failed
+            raise RuntimeError(f"{len(failed)} sealed audit events could not be recorded; will retry") from error
+
+    def shutdown(self):
+        with self._lock:
+            events, self.unrecorded = self.unrecorded, []
+        if events:
+            try:
+                self._record(events)
+            except RuntimeError:
+                LOGGER.exception("Sealed audit events were lost at shutdown.")
+
+    def after_fork(self):
+        # The parent still owns its unrecorded events and waiting callers.
+        self.unrecorded = []
+        self._waiting = {}
+        self._lock = threading.Lock()
+
+def _snapshot(value):
+    """
+    A copy of audit arguments that the caller can no longer change: they are
+    signed later, on the signer thread, after the call has returned.
+    """
+    try:
+        return copy.deepcopy(value)
+    except Exception:
+        # Not copyable: keep the form that would be signed and stored anyway.
+        return json.loads(canonical_bytes(value))
+
+_signer = None
+_signer_lock = threading.Lock()
+
+def get_audit_signer() -> BatchExportProcessor:
+    """
+    The processor that signs @audit events, started on first use. It blocks
+    rather than drops when full, so no audit event is ever lost.
+    """
+    global _signer
+    if _signer is None:
+        with _signer_lock:
+            if _signer is None:
+                signer = BatchExportProcessor(
+                    AuditSigner(),
+                    max_queue_size=AUDIT_QUEUE_SIZE,
+                    max_batch_size=AUDIT_BATCH_SIZE,
+                    flush_interval=AUDIT_FLUSH_INTERVAL,
+                    overflow="block",
+                )
+                TraceManager().add_stage(signer)
+                _signer = signer
+    return _signer
+
+def audit(func=None, *, safe_fields: Iterable[str] = None, durable: bool = None):
     """
     A specialized decorator for auditing critical functions.
-    Automatically signs the event data for tamper-proof logs.
+    Every event is signed as the next link of ``audit_chain``, so the stored
+    log can be checked for tampering with ``utils.hashing.verify_log``.
+
+    The call path only captures a copy of the masked arguments in a
+    ``TraceEvent``, so mutating them after the call can't change what is
+    signed; signing and storing happen on a background signer in batches (call
+    ``TraceManager().flush()`` to wait for them). With ``durable=True``
+    (default: AUDIT_DURABLE) the call does not return until its signed event
+    has been written by the storage backend, and raises the backend's error if
+    it could not be (the sealed event is kept and retried).
+
+    Works on plain functions, coroutine functions, generators and async
+    generators. ``safe_fields`` names parameters that are never scanned for PII.
+    Durable mode is sync-only: waiting for the signer would stall the event
+    loop, so ``durable=True`` on coroutine functions and async generators
+    raises ``TypeError`` and AUDIT_DURABLE does not apply to them.
     """
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-
-        masked_args = mask_pii(args)
-        masked_kwargs = mask_pii(kwargs)
-
-        event_data = {
-            "event_type": "audit_call",
-            "function_name": func.__name__,
-            "timestamp": start_time,
-            "duration": end_time - start_time,
-            "args": masked_args,
-            "kwargs": masked_kwargs
-        }
-        # Sign the event:
-        signature = sign_event(event_data, DEFAULT_SECRET_KEY)
+    if func is None:
+        return lambda f: audit(f, safe_fields=safe_fields, durable=durable)
+    func_name = func.__name__
+    arg_names = positional_parameter_names(func)
+    safe_fields = resolve_safe_fields(func_name, safe_fields)
+    is_async = inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func)
+    if durable and is_async:
+        raise TypeError(f"@audit(durable=True) would block the event loop in {func_name}; durable mode is sync-only")
+    if durable is None:
+        durable = AUDIT_DURABLE and not is_async
 
+    def record(start_time, end_time, args, kwargs, result, error, span):
+        masked_args, masked_kwargs = mask_arguments(args, kwargs, arg_names, safe_fields)
+        meta = {
+            "args": _snapshot(masked_args),
+            "kwargs": _snapshot(masked_kwargs)
+        }
+        if error is not None:
+            meta.update(TraceManager().capture_exception(error, func_name))
         event = TraceEvent(
             event_type="audit_call",
-            function_name=func.__name__,
+            function_name=func_name,
             timestamp=start_time,
             duration=end_time - start_time,
-            meta={
-                "args": masked_args,
-                "kwargs": masked_kwargs,
-                "signature": signature
-            }
+            meta=meta,
+            span=span
         )
-        TraceManager().record_event(event)
-        return result
-    return wrapper
+        # Digested here so that an event that can't be serialized fails its
+        # own call rather than the signer's batch.
+        digest = content_digest(event.to_dict())
+        signer = get_audit_signer()
+        if durable:
+            signer.exporter.wait_for(event)
+        if not signer.submit(_Unsealed(event, digest)):
+            # The signer has shut down (e.g. at exit): sign in the caller.
+            signer.exporter.outcome(event)
+            audit_chain.seal(event, digest)
+            TraceManager().record_event(event)
+        elif durable:
+            signer.flush()
+            failure = signer.exporter.outcome(event)
+            if failure is not None:
+                raise failure
+        if durable:
+            TraceManager().flush_storage()
+
+    return instrument(func, record)
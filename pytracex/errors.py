@@ -0,0 +1,166 @@
+"""
+errors.py
+---------
+Exception capture for failed calls: each exception is reduced to a
+fingerprint of its type and the code locations in its traceback, and counted
+per fingerprint.
+
+Computing the fingerprint only walks the traceback's code objects and line
+numbers. File names, function names and the formatted stack summary are
+resolved once per fingerprint, so a hot loop that keeps raising the same error
+costs a dictionary lookup and a counter increment per failure.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from .config import ERRORS_MAX_FINGERPRINTS, ERRORS_STACK_DEPTH, ERRORS_MAX_MESSAGE
+
+# Frames inside the package (the decorator wrappers) are left out of fingerprints.
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+def _message(exc: BaseException) -> str:
+    try:
+        text = str(exc)
+    except Exception:
+        text = "<unprintable>"
+    if len(text) > ERRORS_MAX_MESSAGE:
+        return text[:ERRORS_MAX_MESSAGE] + "..."
+    return text
+
+
+def describe(exc: BaseException) -> str:
+    """
+    The ``"Type: message"`` string stored in an event's ``error`` meta.
+    """
+    return f"{type(exc).__name__}: {_message(exc)}"
+
+
+def _locations(exc: BaseException) -> Tuple[Tuple[Any, int], ...]:
+    locations = []
+    tb = exc.__traceback__
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        if not code.co_filename.startswith(_PACKAGE_DIR):
+            locations.append((code, tb.tb_lineno))
+        tb = tb.tb_next
+    return tuple(locations)
+
+
+class ErrorRecord:
+    """
+    One distinct error (exception type plus code locations) and how often it
+    has occurred. ``stack`` is formatted on first access.
+    """
+
+    __slots__ = (
+        "fingerprint", "type", "function_name", "message", "count",
+        "first_seen", "last_seen", "_locations", "_stack",
+    )
+
+    def __init__(self, exc_type: type, locations, function_name: str, message: str, now: float):
+        self.type = f"{exc_type.__module__}.{exc_type.__qualname__}"
+        if exc_type.__module__ == "builtins":
+            self.type = exc_type.__qualname__
+        self.function_name = function_name
+        self.message = message
+        self.count = 0
+        self.first_seen = now
+        self.last_seen = now
+        self._locations = locations
+        self._stack = None
+        hasher = hashlib.blake2b(self.type.encode(), digest_size=8)
+        for code, lineno in locations:
+            hasher.update(f"|{code.co_filename}:{code.co_qualname}:{lineno}".encode())
+        self.fingerprint = hasher.hexdigest()
+
+    @property
+    def stack(self) -> List[str]:
+        """
+        Up to ERRORS_STACK_DEPTH innermost frames as ``"file:line in function"``.
+        """
+        if self._stack is None:
+            self._stack = [
+                f"{code.co_filename}:{lineno} in {code.co_qualname}"
+                for code, lineno in self._locations[-ERRORS_STACK_DEPTH:]
+            ]
+        return self._stack
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "type": self.type,
+            "function_name": self.function_name,
+            "message": self.message,
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "stack": self.stack,
+        }
+
+
+class ErrorRegistry:
+    """
+    Counts exceptions per fingerprint. At most ``max_fingerprints`` distinct
+    errors are kept; the least recently seen one is forgotten beyond that.
+    """
+
+    def __init__(self, max_fingerprints: int = ERRORS_MAX_FINGERPRINTS):
+        self.max_fingerprints = max_fingerprints
+        self._records: "OrderedDict[tuple, ErrorRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def capture(self, exc: BaseException, function_name: str = "") -> Tuple[ErrorRecord, bool]:
+        """
+        Count ``exc`` and return its record and whether this is the first
+        time its fingerprint was seen.
+        """
+        key = (type(exc), _locations(exc))
+        now = time.time()
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None:
+                record.count += 1
+                record.last_seen = now
+                self._records.move_to_end(key)
+                return record, False
+        record = ErrorRecord(type(exc), key[1], function_name, _message(exc), now)
+        with self._lock:
+            existing = self._records.get(key)
+            if existing is not None:
+                # Another thread registered it in the meantime.
+                record = existing
+            else:
+                self._records[key] = record
+                while len(self._records) > self.max_fingerprints:
+                    self._records.popitem(last=False)
+            record.count += 1
+            record.last_seen = now
+            return record, existing is None
+
+    def get(self, fingerprint: str) -> Optional[ErrorRecord]:
+        with self._lock:
+            for record in self._records.values():
+                if record.fingerprint == fingerprint:
+                    return record
+        return None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """
+        One dict per distinct error, most frequent first.
+        """
+        with self._lock:
+            records = list(self._records.values())
+        return sorted((r.to_dict() for r in records), key=lambda r: r["count"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._records.clear()
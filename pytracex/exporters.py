@@ -0,0 +1,309 @@
+"""
+exporters.py
+------------
+Pluggable exporters and a background batching pipeline that ships trace events
+off the caller's thread.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+from .config import (
+    LOGGER,
+    EXPORT_QUEUE_SIZE,
+    EXPORT_BATCH_SIZE,
+    EXPORT_FLUSH_INTERVAL,
+    EXPORT_OVERFLOW,
+)
+from .storage import sqlite as sqlite_storage
+
+# Bound at import time, like logging does, so exporters never trace their own
+# writes when file I/O tracing patches open().
+_open = open
+
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+OVERFLOW_POLICIES = (DROP_NEWEST, BLOCK)
+
+
+def _dumps(value: Any) -> str:
+    """
+    Compact JSON that never fails on arbitrary traced arguments.
+    """
+    return json.dumps(value, separators=(",", ":"), default=repr)
+
+
+class Exporter:
+    """
+    Base class for exporters. ``export`` receives a batch of event dicts and is
+    only ever called from the exporter's background thread.
+    """
+
+    def export(self, batch: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def prepare(self, event) -> Any:
+        """
+        Convert a queued event into what ``export`` receives; runs on the
+        background thread. Defaults to the event's dict form.
+        """
+        return event.to_dict()
+
+    def shutdown(self):
+        """
+        Release any resources held by the exporter.
+        """
+
+    def after_fork(self):
+        """
+        Called in a forked child before its export thread starts. Drop
+        handles inherited from the parent (sockets, connections) here.
+        """
+
+
+class InMemoryExporter(Exporter):
+    """
+    Collects exported events in a list. Mostly useful for tests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: List[Dict[str, Any]] = []
+
+    def export(self, batch: List[Dict[str, Any]]):
+        with self._lock:
+            self._events.extend(batch)
+
+    def get_events(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._events)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+
+class JSONLFileExporter(Exporter):
+    """
+    Appends one JSON document per event to a file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def export(self, batch: List[Dict[str, Any]]):
+        if self._file is None:
+            self._file = _open(self.path, "a", encoding="utf-8")
+        self._file.write("".join(_dumps(event) + "\n" for event in batch))
+        self._file.flush()
+
+    def after_fork(self):
+        # Reopen lazily; the inherited file object stays with the parent.
+        self._file = None
+
+    def shutdown(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SQLiteExporter(Exporter):
+    """
+    Inserts batches of events into a SQLite table with a single ``executemany``.
+    Uses the same schema as ``storage.SQLiteStorage``, so an exported database
+    can be opened directly as a storage backend.
+    """
+
+    def __init__(self, path: str, table: str = sqlite_storage.TABLE):
+        self.path = path
+        self.table = table
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def export(self, batch: List[Dict[str, Any]]):
+        # Created lazily on the exporter thread; shutdown() may close it from another thread.
+        if self._conn is None:
+            self._conn = sqlite_storage.connect(self.path, self.table)
+        with self._conn:
+            self._conn.executemany(
+                sqlite_storage.INSERT.format(table=self.table),
+                [sqlite_storage.event_to_row(event) for event in batch],
+            )
+
+    def after_fork(self):
+        # SQLite connections must not be used across fork.
+        self._conn = None
+
+    def shutdown(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class _FlushRequest:
+    __slots__ = ("done",)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+# Processors that have not been shut down, restarted in forked children.
+_live_processors: "weakref.WeakSet[BatchExportProcessor]" = weakref.WeakSet()
+
+
+def _restart_processors_after_fork():
+    for processor in list(_live_processors):
+        processor._restart_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_processors_after_fork)
+
+
+class BatchExportProcessor:
+    """
+    Feeds events to an exporter from a background thread.
+
+    Events are queued on a bounded queue and exported in batches of up to
+    ``max_batch_size``, or ``flush_interval`` seconds after the oldest queued
+    event, whichever comes first. When the queue is full,
+    ``overflow="drop_newest"`` discards the event (counted in ``dropped``) and
+    ``overflow="block"`` makes the caller wait for room.
+    """
+
+    def __init__(
+        self,
+        exporter: Exporter,
+        max_queue_size: int = EXPORT_QUEUE_SIZE,
+        max_batch_size: int = EXPORT_BATCH_SIZE,
+        flush_interval: float = EXPORT_FLUSH_INTERVAL,
+        overflow: str = EXPORT_OVERFLOW,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}; expected one of {OVERFLOW_POLICIES}")
+        self.exporter = exporter
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+        self.exported = 0
+        self.export_errors = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._shutdown = False
+        self._start()
+        _live_processors.add(self)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="pytracex-exporter", daemon=True)
+        self._thread.start()
+
+    def _restart_after_fork(self):
+        """
+        Threads don't survive ``fork``: give the child an empty queue (the
+        parent still exports what it had queued) and a new worker thread.
+        """
+        self.dropped = self.exported = self.export_errors = 0
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self.exporter.after_fork()
+        self._start()
+
+    def submit(self, event) -> bool:
+        """
+        Queue an event (anything with a ``to_dict()``) for export.
+        """
+        if self._shutdown:
+            return False
+        if self.overflow == BLOCK:
+            self._queue.put(event)
+            return True
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def pending(self) -> int:
+        """
+        Approximate number of queued items not yet taken by the worker.
+        """
+        return self._queue.qsize()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every event submitted so far has been exported. Returns
+        False if that did not happen within ``timeout`` seconds, including
+        time spent waiting for room in a full queue.
+        """
+        if not self._thread.is_alive():
+            return True
+        request = _FlushRequest()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(None if deadline is None else max(deadline - time.monotonic(), 0.0))
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """
+        Export whatever is still queued, stop the worker and close the exporter.
+        """
+        if self._shutdown:
+            return
+        self._shutdown = True
+        _live_processors.discard(self)
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self.exporter.shutdown()
+
+    def _run(self):
+        batch = []
+        deadline = 0.0
+        while True:
+            if batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._export(batch)
+                    batch = []
+                    continue
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+            else:
+                # Nothing pending: sleep until an item arrives rather than
+                # waking up every flush_interval.
+                item = self._queue.get()
+
+            if item is _STOP or isinstance(item, _FlushRequest):
+                self._export(batch)
+                batch = []
+                if item is _STOP:
+                    return
+                item.done.set()
+            else:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) >= self.max_batch_size:
+                    self._export(batch)
+                    batch = []
+
+    def _export(self, batch):
+        if not batch:
+            return
+        try:
+            prepare = self.exporter.prepare
+            self.exporter.export([prepare(event) for event in batch])
+            self.exported += len(batch)
+        except Exception:
+            self.export_errors += 1
+            LOGGER.exception("Exporter %r failed to export %d events.", self.exporter, len(batch))
@@ -0,0 +1,176 @@
+"""
+instrumentation.py
+------------------
+Shared wrapper used by the decorators. Detects coroutine functions, async
+generators and generators so that the recorded duration covers the real
+awaited/iterated lifetime rather than just the creation of the coroutine.
+
+Recorded plain and coroutine calls run inside their own span, so nested
+decorated calls become its children.
+"""
+
+import inspect
+import time
+from functools import wraps
+from typing import Any, Callable, Optional
+from .context import SpanContext, new_span, start_span, end_span
+
+# Decisions returned by a decorator's ``decide`` callable.
+SKIP = 0            # call the function directly, record nothing
+ERRORS_ONLY = 1     # only record the call if it raises
+RECORD = 2          # record the call
+
+# record(start_time, end_time, args, kwargs, result, error, span)
+RecordCallback = Callable[[float, float, tuple, dict, Any, Optional[BaseException], SpanContext], None]
+
+
+def _always_record() -> int:
+    return RECORD
+
+
+def instrument(
+    func: Callable,
+    record: RecordCallback,
+    decide: Callable[[], int] = _always_record,
+    record_errors: bool = True,
+) -> Callable:
+    """
+    Wrap ``func`` so that ``record`` runs once its work has finished.
+
+    ``decide`` is called once per invocation, before any timing, and returns
+    SKIP, ERRORS_ONLY or RECORD. Generators report a ``None`` result; they are
+    timed from their first iteration until exhaustion or close. Their span is
+    not made active, since it would leak into the consumer between yields.
+    """
+    if inspect.isasyncgenfunction(func):
+        return _wrap_async_generator(func, record, decide, record_errors)
+    if inspect.iscoroutinefunction(func):
+        return _wrap_coroutine(func, record, decide, record_errors)
+    if inspect.isgeneratorfunction(func):
+        return _wrap_generator(func, record, decide, record_errors)
+    return _wrap_function(func, record, decide, record_errors)
+
+
+def _wrap_function(func, record, decide, record_errors):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        mode = decide()
+        if mode == SKIP:
+            return func(*args, **kwargs)
+        if mode == ERRORS_ONLY:
+            start_time = time.time()
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                if record_errors:
+                    record(start_time, time.time(), args, kwargs, None, exc, new_span())
+                raise
+        span, token = start_span()
+        start_time = time.time()
+        try:
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                # Also on cancellation, KeyboardInterrupt, SystemExit, ...
+                end_time = time.time()
+                end_span(token)
+        except Exception as exc:
+            if record_errors:
+                record(start_time, end_time, args, kwargs, None, exc, span)
+            raise
+        record(start_time, end_time, args, kwargs, result, None, span)
+        return result
+    return wrapper
+
+
+def _wrap_coroutine(func, record, decide, record_errors):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        mode = decide()
+        if mode == SKIP:
+            return await func(*args, **kwargs)
+        if mode == ERRORS_ONLY:
+            start_time = time.time()
+            try:
+                return await func(*args, **kwargs)
+            except Exception as exc:
+                if record_errors:
+                    record(start_time, time.time(), args, kwargs, None, exc, new_span())
+                raise
+        span, token = start_span()
+        start_time = time.time()
+        try:
+            try:
+                result = await func(*args, **kwargs)
+            finally:
+                # Also on cancellation, KeyboardInterrupt, SystemExit, ...
+                end_time = time.time()
+                end_span(token)
+        except Exception as exc:
+            if record_errors:
+                record(start_time, end_time, args, kwargs, None, exc, span)
+            raise
+        record(start_time, end_time, args, kwargs, result, None, span)
+        return result
+    return wrapper
+
+
+def _wrap_generator(func, record, decide, record_errors):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        mode = decide()
+        if mode == SKIP:
+            return (yield from func(*args, **kwargs))
+        span = new_span()
+        start_time = time.time()
+        try:
+            result = yield from func(*args, **kwargs)
+        except Exception as exc:
+            if record_errors:
+                record(start_time, time.time(), args, kwargs, None, exc, span)
+            raise
+        except GeneratorExit:
+            # Closed early by the consumer: still a normal end of its lifetime.
+            if mode == RECORD:
+                record(start_time, time.time(), args, kwargs, None, None, span)
+            raise
+        if mode == RECORD:
+            record(start_time, time.time(), args, kwargs, None, None, span)
+        return result
+    return wrapper
+
+
+def _wrap_async_generator(func, record, decide, record_errors):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        mode = decide()
+        span = new_span() if mode != SKIP else None
+        start_time = time.time()
+        agen = func(*args, **kwargs)
+        try:
+            # There is no async "yield from", so asend/athrow/aclose are forwarded by hand.
+            try:
+                value = await agen.__anext__()
+                while True:
+                    try:
+                        sent = yield value
+                    except GeneratorExit:
+                        await agen.aclose()
+                        raise
+                    except BaseException as exc:
+                        value = await agen.athrow(exc)
+                    else:
+                        value = await agen.asend(sent)
+            except StopAsyncIteration:
+                pass
+        except Exception as exc:
+            if mode != SKIP and record_errors:
+                record(start_time, time.time(), args, kwargs, None, exc, span)
+            raise
+        except GeneratorExit:
+            if mode == RECORD:
+                record(start_time, time.time(), args, kwargs, None, None, span)
+            raise
+        if mode == RECORD:
+            record(start_time, time.time(), args, kwargs, None, None, span)
+    return wrapper
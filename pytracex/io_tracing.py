@@ -4,132 +4,414 @@
 io_tracing.py
 -------------
 Provides a function to trace file I/O (open, read, write) using only the standard library.
+
+Two modes are available:
+ - "events": one trace event per open/read/write/close call.
+ - "aggregate": per-handle counters, emitted as a single summary event on close.
+
+Tracing is either scoped with ``with traced_io(...):`` (per block, thread or
+asyncio task, via contextvars) or process-wide with ``trace_file_ops()``.
+The patches on ``builtins.open``, ``io.open`` and ``os.open`` are reference
+counted and only installed while some scope is active. ``pathlib.Path``
+methods and ``os.fdopen`` go through ``io.open`` and are covered by it.
 """
 
 import builtins
+import contextvars
+import fnmatch
+import io
+import os
+import re
+import threading
 import time
-from typing import Callable
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
 from .trace_manager import TraceManager, TraceEvent
+from .config import IO_TRACE_MODE, IO_TRACE_INCLUDE, IO_TRACE_EXCLUDE
 
 _original_open = builtins.open
+_original_os_open = os.open
+
+EVENTS = "events"
+AGGREGATE = "aggregate"
+IO_TRACE_MODES = (EVENTS, AGGREGATE)
+
+
+def _compile_globs(patterns: Iterable[str]) -> Optional[re.Pattern]:
+    patterns = list(patterns or ())
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(p) for p in patterns))
+
+
+class IOTraceOptions:
+    """
+    Which files are traced and how. Glob patterns are matched against the
+    absolute path; a file is traced if it matches ``include`` and not ``exclude``.
+    """
+
+    __slots__ = ("mode", "_include", "_exclude")
+
+    def __init__(
+        self,
+        mode: str = IO_TRACE_MODE,
+        include: Iterable[str] = IO_TRACE_INCLUDE,
+        exclude: Iterable[str] = IO_TRACE_EXCLUDE,
+    ):
+        if mode not in IO_TRACE_MODES:
+            raise ValueError(f"Unknown I/O trace mode {mode!r}; expected one of {IO_TRACE_MODES}")
+        self.mode = mode
+        self._include = _compile_globs(include)
+        self._exclude = _compile_globs(exclude)
+
+    def should_trace(self, file) -> bool:
+        if isinstance(file, int):
+            # Raw file descriptors have no path to filter on.
+            return self._include is None
+        path = os.path.abspath(os.fsdecode(file))
+        if self._include is not None and not self._include.match(path):
+            return False
+        return self._exclude is None or not self._exclude.match(path)
+
+
+# Options for the current block/thread/task, and for process-wide tracing.
+_scope_var = contextvars.ContextVar("io_trace_scope", default=None)
+_global_options: Optional[IOTraceOptions] = None
+
+# Number of active scopes (plus one while trace_file_ops() is on). The open()
+# patches are installed while it is non-zero.
+_patch_lock = threading.Lock()
+_patch_count = 0
+
+
+def _reset_lock_after_fork():
+    # Another thread may have held the lock at fork time; the patches themselves are inherited.
+    global _patch_lock
+    _patch_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_lock_after_fork)
+
+
+class FileStats:
+    """
+    Counters for one traced file handle in aggregate mode.
+    """
+
+    __slots__ = (
+        "opened_at", "reads", "bytes_read", "read_time",
+        "writes", "bytes_written", "write_time", "max_latency",
+    )
+
+    def __init__(self):
+        self.opened_at = time.time()
+        self.reads = 0
+        self.bytes_read = 0
+        self.read_time = 0.0
+        self.writes = 0
+        self.bytes_written = 0
+        self.write_time = 0.0
+        self.max_latency = 0.0
+
+    def to_meta(self):
+        return {
+            "reads": self.reads,
+            "bytes_read": self.bytes_read,
+            "read_time": self.read_time,
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "write_time": self.write_time,
+            "max_latency": self.max_latency,
+        }
+
+
+def _size(data) -> int:
+    return len(data) if data else 0
+
+
+class TracedFile:
+    """
+    Wraps a file object to trace read, write and close calls, including
+    line-by-line reads through ``readline`` and iteration.
+    """
+
+    __slots__ = ("_f", "_filename", "_mode", "_stats", "_closed")
+
+    def __init__(self, original_file, filename, mode, aggregate: bool = False):
+        self._f = original_file
+        self._filename = filename
+        self._mode = mode
+        self._stats = FileStats() if aggregate else None
+        self._closed = False
+
+    def _record(self, event_type, function_name, start_time, latency, size_key, size):
+        stats = self._stats
+        if stats is not None:
+            if event_type == "file_read":
+                stats.reads += 1
+                stats.bytes_read += size
+                stats.read_time += latency
+            else:
+                stats.writes += 1
+                stats.bytes_written += size
+                stats.write_time += latency
+            if latency > stats.max_latency:
+                stats.max_latency = latency
+            return
+        TraceManager().record_event(TraceEvent(
+            event_type=event_type,
+            function_name=function_name,
+            timestamp=start_time,
+            duration=latency,
+            meta={
+                "filename": self._filename,
+                "mode": self._mode,
+                size_key: size
+            }
+        ))
+
+    def _read_op(self, function_name, method, *args, **kwargs):
+        start_time = time.time()
+        start = time.perf_counter()
+        data = method(*args, **kwargs)
+        latency = time.perf_counter() - start
+        size = data if isinstance(data, int) else _size(data)
+        self._record("file_read", function_name, start_time, latency, "bytes_returned", size)
+        return data
+
+    def read(self, *args, **kwargs):
+        return self._read_op("read", self._f.read, *args, **kwargs)
+
+    def readline(self, *args, **kwargs):
+        return self._read_op("readline", self._f.readline, *args, **kwargs)
+
+    def readinto(self, buffer):
+        # Returns the number of bytes read, which _read_op uses as the size.
+        return self._read_op("readinto", self._f.readinto, buffer)
+
+    def readlines(self, *args, **kwargs):
+        start_time = time.time()
+        start = time.perf_counter()
+        lines = self._f.readlines(*args, **kwargs)
+        latency = time.perf_counter() - start
+        self._record("file_read", "readlines", start_time, latency, "bytes_returned", sum(map(len, lines)))
+        return lines
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start_time = time.time()
+        start = time.perf_counter()
+        line = next(self._f)
+        latency = time.perf_counter() - start
+        self._record("file_read", "readline", start_time, latency, "bytes_returned", len(line))
+        return line
+
+    def write(self, content, *args, **kwargs):
+        start_time = time.time()
+        start = time.perf_counter()
+        result = self._f.write(content, *args, **kwargs)
+        latency = time.perf_counter() - start
+        self._record("file_write", "write", start_time, latency, "bytes_written", _size(content))
+        return result
+
+    def writelines(self, lines):
+        lines = list(lines)
+        start_time = time.time()
+        start = time.perf_counter()
+        self._f.writelines(lines)
+        latency = time.perf_counter() - start
+        self._record("file_write", "writelines", start_time, latency, "bytes_written", sum(map(len, lines)))
+
+    def close(self):
+        if self._closed:
+            return self._f.close()
+        self._closed = True
+        start_time = time.time()
+        self._f.close()
+        end_time = time.time()
+
+        stats = self._stats
+        if stats is not None:
+            meta = stats.to_meta()
+            meta["filename"] = self._filename
+            meta["mode"] = self._mode
+            TraceManager().record_event(TraceEvent(
+                event_type="file_io_summary",
+                function_name="file",
+                timestamp=stats.opened_at,
+                duration=end_time - stats.opened_at,
+                meta=meta
+            ))
+            return
+
+        TraceManager().record_event(TraceEvent(
+            event_type="file_close",
+            function_name="close",
+            timestamp=start_time,
+            duration=end_time - start_time,
+            meta={
+                "filename": self._filename,
+                "mode": self._mode
+            }
+        ))
+
+    def __enter__(self):
+        """
+        Make this object compatible with the 'with' statement.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Automatically close the file on exiting the 'with' block.
+        """
+        self.close()
+
+    # Forward any other attributes to the underlying file object
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
 
 def traced_open(file, mode='r', *args, **kwargs):
     """
     A monkey-patched version of open() that logs file open operations.
-    Returns a wrapped file object that can trace read/write calls if desired.
+    Returns a wrapped file object that traces read/write calls.
+    Opens outside any tracing scope, or filtered out by the include/exclude
+    globs, go straight to the original open().
     """
+    options = _scope_var.get() or _global_options
+    if options is None or not options.should_trace(file):
+        return _original_open(file, mode, *args, **kwargs)
+
     start_time = time.time()
     f = _original_open(file, mode, *args, **kwargs)
     end_time = time.time()
 
-    # Log the open event
-    manager = TraceManager()
-    event = TraceEvent(
-        event_type="file_open",
-        function_name="open",
-        timestamp=start_time,
-        duration=end_time - start_time,
-        meta={
-            "filename": file,
-            "mode": mode
-        }
-    )
-    manager.record_event(event)
+    if options.mode == EVENTS:
+        # Log the open event
+        TraceManager().record_event(TraceEvent(
+            event_type="file_open",
+            function_name="open",
+            timestamp=start_time,
+            duration=end_time - start_time,
+            meta={
+                "filename": file,
+                "mode": mode
+            }
+        ))
+
+    return TracedFile(f, file, mode, aggregate=options.mode == AGGREGATE)
 
-    # Optionally wrap the file object to intercept read/write
-    return _wrap_file_object(f, file, mode)
 
-def _wrap_file_object(f, file, mode):
+def traced_os_open(path, flags, mode=0o777, *, dir_fd=None):
     """
-    Wrap the file object to trace read, write, close calls, etc.
+    A patched os.open(). It returns a bare file descriptor, so only the open
+    itself is recorded (in "events" mode).
     """
-    class TracedFile:
-        def __init__(self, original_file):
-            self._f = original_file
+    options = _scope_var.get() or _global_options
+    if options is None or options.mode != EVENTS or not options.should_trace(path):
+        return _original_os_open(path, flags, mode, dir_fd=dir_fd)
 
-        def read(self, *args, **kwargs):
-            start_time = time.time()
-            data = self._f.read(*args, **kwargs)
-            end_time = time.time()
-
-            TraceManager().record_event(TraceEvent(
-                event_type="file_read",
-                function_name="read",
-                timestamp=start_time,
-                duration=end_time - start_time,
-                meta={
-                    "filename": file,
-                    "mode": mode,
-                    "bytes_returned": len(data) if data else 0
-                }
-            ))
-            return data
+    start_time = time.time()
+    fd = _original_os_open(path, flags, mode, dir_fd=dir_fd)
+    end_time = time.time()
+    TraceManager().record_event(TraceEvent(
+        event_type="file_open",
+        function_name="os.open",
+        timestamp=start_time,
+        duration=end_time - start_time,
+        meta={
+            "filename": path,
+            "flags": flags
+        }
+    ))
+    return fd
 
-        def write(self, content, *args, **kwargs):
-            start_time = time.time()
-            result = self._f.write(content, *args, **kwargs)
-            end_time = time.time()
 
-            TraceManager().record_event(TraceEvent(
-                event_type="file_write",
-                function_name="write",
-                timestamp=start_time,
-                duration=end_time - start_time,
-                meta={
-                    "filename": file,
-                    "mode": mode,
-                    "bytes_written": len(content) if content else 0
-                }
-            ))
-            return result
+def _acquire_patches():
+    global _patch_count
+    with _patch_lock:
+        _patch_count += 1
+        if _patch_count == 1:
+            builtins.open = traced_open
+            io.open = traced_open
+            os.open = traced_os_open
 
-        def close(self):
-            start_time = time.time()
-            self._f.close()
-            end_time = time.time()
 
-            TraceManager().record_event(TraceEvent(
-                event_type="file_close",
-                function_name="close",
-                timestamp=start_time,
-                duration=end_time - start_time,
-                meta={
-                    "filename": file,
-                    "mode": mode
-                }
-            ))
+def _release_patches():
+    global _patch_count
+    with _patch_lock:
+        if _patch_count == 0:
+            return
+        _patch_count -= 1
+        if _patch_count == 0:
+            # Leave alone anything someone else patched on top of us.
+            if builtins.open is traced_open:
+                builtins.open = _original_open
+            if io.open is traced_open:
+                io.open = _original_open
+            if os.open is traced_os_open:
+                os.open = _original_os_open
 
-        def __enter__(self):
-            """
-            Make this object compatible with the 'with' statement.
-            """
-            return self
 
-        def __exit__(self, exc_type, exc_val, exc_tb):
-            """
-            Automatically close the file on exiting the 'with' block.
-            """
-            self.close()
+def _make_options(mode, include, exclude) -> IOTraceOptions:
+    return IOTraceOptions(
+        mode=mode or IO_TRACE_MODE,
+        include=IO_TRACE_INCLUDE if include is None else include,
+        exclude=IO_TRACE_EXCLUDE if exclude is None else exclude,
+    )
 
-        # Forward any other attributes to the underlying file object
-        def __getattr__(self, name):
-            return getattr(self._f, name)
 
-    return TracedFile(f)
+@contextmanager
+def traced_io(
+    mode: str = None,
+    include: Iterable[str] = None,
+    exclude: Iterable[str] = None
+) -> Iterator[IOTraceOptions]:
+    """
+    Trace file I/O inside a ``with`` block.
 
+    The scope is stored in a context variable, so it covers the current thread
+    or asyncio task (and tasks it creates) but not other threads. Arguments
+    are the same as for ``trace_file_ops``.
+    """
+    options = _make_options(mode, include, exclude)
+    _acquire_patches()
+    token = _scope_var.set(options)
+    try:
+        yield options
+    finally:
+        _scope_var.reset(token)
+        _release_patches()
 
 
-def trace_file_ops():
+def trace_file_ops(mode: str = None, include: Iterable[str] = None, exclude: Iterable[str] = None):
     """
-    Monkey-patch Python's built-in open() with traced_open().
+    Trace file I/O process-wide, in every thread.
 
+    ``mode`` is "events" or "aggregate"; ``include``/``exclude`` are path globs.
+    Unset arguments fall back to the IO_TRACE_* settings in config.
     Call `untrace_file_ops()` if you need to revert back to the original open().
     """
-    builtins.open = traced_open
+    global _global_options
+    options = _make_options(mode, include, exclude)
+    with _patch_lock:
+        already_enabled = _global_options is not None
+        _global_options = options
+    if not already_enabled:
+        _acquire_patches()
 
 
 def untrace_file_ops():
     """
-    Restore the original built-in open() function.
+    Stop process-wide file I/O tracing. Active ``traced_io`` scopes keep working.
     """
-    builtins.open = _original_open
+    global _global_options
+    with _patch_lock:
+        was_enabled = _global_options is not None
+        _global_options = None
+    if was_enabled:
+        _release_patches()
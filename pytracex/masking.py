@@ -0,0 +1,149 @@
+"""
+masking.py
+----------
+PII masking engine used by the decorators. All patterns are compiled into a
+single alternation so each string is scanned once, and results for repeated
+short strings are cached.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Sequence, Tuple
+from .config import (
+    PII_PATTERNS, PII_REPLACEMENTS, PII_MAX_SCAN_LENGTH, PII_CACHE_SIZE, PII_CACHE_MAX_LENGTH, PII_SAFE_FIELDS
+)
+
+DEFAULT_REPLACEMENT = "[REDACTED]"
+
+# Leaves that can never contain PII and are returned untouched.
+_ATOMIC_TYPES = frozenset({int, float, complex, bool, type(None)})
+_BINARY_TYPES = (bytes, bytearray, memoryview)
+
+
+class PIIMasker:
+    """
+    Masks PII in strings and (recursively) in lists, tuples, sets and dicts.
+
+    Container types are preserved. Strings and binary values longer than
+    ``max_scan_length`` are not scanned; they are replaced by a short
+    placeholder instead so large blobs neither cost CPU nor leak unmasked.
+    Only strings of at most ``cache_max_length`` characters are cached, which
+    bounds the cache to ``cache_size`` short strings.
+    """
+
+    def __init__(
+        self,
+        patterns: Dict[str, str] = PII_PATTERNS,
+        replacements: Dict[str, str] = PII_REPLACEMENTS,
+        max_scan_length: int = PII_MAX_SCAN_LENGTH,
+        cache_size: int = PII_CACHE_SIZE,
+        cache_max_length: int = PII_CACHE_MAX_LENGTH,
+    ):
+        self.max_scan_length = max_scan_length
+        self.cache_max_length = cache_max_length
+        # Group names are generated because pattern names need not be identifiers.
+        self._replacements = {
+            f"_pii{i}": replacements.get(name, DEFAULT_REPLACEMENT)
+            for i, name in enumerate(patterns)
+        }
+        self._regex = re.compile("|".join(
+            f"(?P<_pii{i}>{pattern})" for i, pattern in enumerate(patterns.values())
+        )) if patterns else None
+        self.mask_string = lru_cache(maxsize=cache_size)(self._mask_string)
+
+    def _replace(self, match: re.Match) -> str:
+        return self._replacements[match.lastgroup]
+
+    def _mask_string(self, value: str) -> str:
+        if self._regex is None:
+            return value
+        return self._regex.sub(self._replace, value)
+
+    def mask(self, value: Any) -> Any:
+        value_type = type(value)
+        if value_type in _ATOMIC_TYPES:
+            return value
+        if isinstance(value, str):
+            if len(value) > self.max_scan_length:
+                return f"[STRING OF {len(value)} CHARS NOT SCANNED]"
+            if len(value) > self.cache_max_length:
+                return self._mask_string(value)
+            return self.mask_string(value)
+        if isinstance(value, _BINARY_TYPES):
+            if len(value) > self.max_scan_length:
+                return f"[BINARY OF {len(value)} BYTES NOT SCANNED]"
+            return value
+        if value_type is tuple:
+            return tuple([self.mask(v) for v in value])
+        if isinstance(value, tuple) and hasattr(value, "_fields"):
+            return value_type(*[self.mask(v) for v in value])
+        if isinstance(value, list):
+            return [self.mask(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.mask(v) for k, v in value.items()}
+        if isinstance(value, (set, frozenset)):
+            return value_type(self.mask(v) for v in value)
+        return value
+
+    def mask_arguments(
+        self,
+        args: tuple,
+        kwargs: Dict[str, Any],
+        positional_names: Sequence[str] = (),
+        safe_fields: FrozenSet[str] = frozenset(),
+    ) -> Tuple[tuple, Dict[str, Any]]:
+        """
+        Mask call arguments, leaving parameters named in ``safe_fields`` unscanned.
+        ``positional_names`` maps positional arguments to parameter names.
+        """
+        if not safe_fields:
+            return self.mask(args), self.mask(kwargs)
+        masked_args = tuple([
+            v if i < len(positional_names) and positional_names[i] in safe_fields else self.mask(v)
+            for i, v in enumerate(args)
+        ])
+        masked_kwargs = {k: v if k in safe_fields else self.mask(v) for k, v in kwargs.items()}
+        return masked_args, masked_kwargs
+
+
+_masker = PIIMasker()
+
+
+def get_masker() -> PIIMasker:
+    return _masker
+
+
+def set_masker(masker: PIIMasker):
+    """
+    Replace the masker used by the decorators, e.g. after changing PII patterns.
+    """
+    global _masker
+    _masker = masker
+
+
+def mask_pii(value: Any) -> Any:
+    """
+    Mask PII in ``value`` using the current masker.
+    """
+    return _masker.mask(value)
+
+
+def mask_arguments(args, kwargs, positional_names=(), safe_fields=frozenset()):
+    return _masker.mask_arguments(args, kwargs, positional_names, safe_fields)
+
+
+def positional_parameter_names(func) -> Tuple[str, ...]:
+    """
+    Names of the positional parameters of ``func``, used to apply field allowlists.
+    """
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return ()
+    return code.co_varnames[:code.co_argcount]
+
+
+def resolve_safe_fields(func_name: str, safe_fields: Iterable[str] = None) -> FrozenSet[str]:
+    """
+    Combine a decorator's ``safe_fields`` with the ones configured in ``PII_SAFE_FIELDS``.
+    """
+    return frozenset(safe_fields or ()) | frozenset(PII_SAFE_FIELDS.get(func_name, ()))
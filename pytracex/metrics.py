@@ -0,0 +1,261 @@
+"""
+metrics.py
+----------
+Streaming per-(event_type, function_name) aggregates: count, errors, sum,
+min/max and a log-bucketed latency histogram for percentiles.
+
+Histograms use HDR-style log-linear buckets over integer nanoseconds in a
+preallocated list, so recording is a few integer operations and one list
+increment, and two histograms merge by adding their bucket counts.
+"""
+
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+from .config import METRICS_HISTOGRAM_PRECISION_BITS, METRICS_HISTOGRAM_MAX_BITS
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LogHistogram:
+    """
+    Log-linear histogram of non-negative durations in seconds.
+
+    Values below ``2 ** precision_bits`` ns each get their own bucket; above
+    that, every power of two is split into ``2 ** (precision_bits - 1)``
+    buckets, bounding the relative error of any quantile by
+    ``2 ** -(precision_bits - 1)``. Values of ``2 ** max_bits`` ns or more land
+    in the last bucket.
+    """
+
+    __slots__ = ("precision_bits", "max_bits", "_half", "_limit", "counts")
+
+    def __init__(
+        self,
+        precision_bits: int = METRICS_HISTOGRAM_PRECISION_BITS,
+        max_bits: int = METRICS_HISTOGRAM_MAX_BITS,
+    ):
+        if not 1 < precision_bits < max_bits:
+            raise ValueError("precision_bits must be between 2 and max_bits - 1")
+        self.precision_bits = precision_bits
+        self.max_bits = max_bits
+        self._half = 1 << (precision_bits - 1)
+        self._limit = (1 << max_bits) - 1
+        # A list rather than an array: in-place increments are much cheaper.
+        self.counts = [0] * (self._index(self._limit) + 1)
+
+    def _index(self, value: int) -> int:
+        shift = value.bit_length() - self.precision_bits
+        if shift <= 0:
+            return value
+        return shift * self._half + (value >> shift)
+
+    def _lower_bound(self, index: int) -> int:
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        return (index - shift * self._half) << shift
+
+    def record(self, seconds: float):
+        value = int(seconds * 1e9)
+        if value > self._limit:
+            value = self._limit
+        elif value < 0:
+            value = 0
+        # Inlined _index().
+        shift = value.bit_length() - self.precision_bits
+        self.counts[value if shift <= 0 else shift * self._half + (value >> shift)] += 1
+
+    def merge(self, other: "LogHistogram"):
+        if (other.precision_bits, other.max_bits) != (self.precision_bits, self.max_bits):
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+
+    def reset(self):
+        self.counts[:] = [0] * len(self.counts)
+
+    def quantiles(self, quantiles: Iterable[float] = QUANTILES) -> List[float]:
+        """
+        Estimate each quantile as the midpoint of the bucket that holds it.
+        """
+        quantiles = list(quantiles)
+        total = sum(self.counts)
+        if not total:
+            return [0.0] * len(quantiles)
+        # The rank of each quantile, visited in increasing order.
+        targets = sorted((max(1, math.ceil(q * total)), i) for i, q in enumerate(quantiles))
+        results = [0.0] * len(targets)
+        seen = 0
+        position = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while position < len(targets) and targets[position][0] <= seen:
+                lower = self._lower_bound(index)
+                upper = self._lower_bound(index + 1)
+                results[targets[position][1]] = (lower + upper) / 2 / 1e9
+                position += 1
+            if position == len(targets):
+                break
+        return results
+
+
+class Aggregate:
+    """
+    Running statistics for one (event_type, function_name). Updated under its
+    own short lock so concurrent callers never lose counts.
+    """
+
+    __slots__ = ("event_type", "function_name", "count", "errors", "total", "min", "max", "histogram", "_lock")
+
+    def __init__(self, event_type: str, function_name: str, **histogram_options):
+        self.event_type = event_type
+        self.function_name = function_name
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.histogram = LogHistogram(**histogram_options)
+        self._lock = threading.Lock()
+
+    def record(self, duration: float, error: bool = False):
+        with self._lock:
+            self.count += 1
+            if error:
+                self.errors += 1
+            self.total += duration
+            if duration < self.min:
+                self.min = duration
+            if duration > self.max:
+                self.max = duration
+            self.histogram.record(duration)
+
+    def merge(self, other: "Aggregate"):
+        with self._lock:
+            self.count += other.count
+            self.errors += other.errors
+            self.total += other.total
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self.histogram.merge(other.histogram)
+
+    def reset(self):
+        with self._lock:
+            self.count = self.errors = 0
+            self.total = 0.0
+            self.min = float("inf")
+            self.max = 0.0
+            self.histogram.reset()
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            p50, p95, p99 = self.histogram.quantiles(QUANTILES)
+            count = self.count
+            return {
+                "event_type": self.event_type,
+                "function_name": self.function_name,
+                "count": count,
+                "errors": self.errors,
+                "sum": self.total,
+                "min": self.min if count else 0.0,
+                "max": self.max,
+                "mean": self.total / count if count else 0.0,
+                # Bucket midpoints can fall slightly outside the observed range.
+                "p50": min(max(p50, self.min), self.max) if count else 0.0,
+                "p95": min(max(p95, self.min), self.max) if count else 0.0,
+                "p99": min(max(p99, self.min), self.max) if count else 0.0,
+            }
+
+
+class MetricsRegistry:
+    """
+    Aggregates keyed by event type, then function name. Hot paths should look
+    up their ``Aggregate`` once with ``aggregate()`` and keep it: ``reset``
+    zeroes aggregates in place, so held references stay valid.
+    """
+
+    def __init__(self):
+        self._aggregates: Dict[str, Dict[str, Aggregate]] = {}
+        self._lock = threading.Lock()
+
+    def aggregate(self, event_type: str, function_name: str) -> Aggregate:
+        by_function = self._aggregates.get(event_type)
+        if by_function is not None:
+            aggregate = by_function.get(function_name)
+            if aggregate is not None:
+                return aggregate
+        with self._lock:
+            by_function = self._aggregates.setdefault(event_type, {})
+            aggregate = by_function.get(function_name)
+            if aggregate is None:
+                aggregate = by_function[function_name] = Aggregate(event_type, function_name)
+            return aggregate
+
+    def record(self, event_type: str, function_name: str, duration: float, error: bool = False):
+        self.aggregate(event_type, function_name).record(duration, error)
+
+    def aggregates(self) -> List[Aggregate]:
+        with self._lock:
+            return [a for by_function in self._aggregates.values() for a in by_function.values()]
+
+    def merge(self, other: "MetricsRegistry"):
+        for aggregate in other.aggregates():
+            self.aggregate(aggregate.event_type, aggregate.function_name).merge(aggregate)
+
+    def reset(self):
+        for aggregate in self.aggregates():
+            aggregate.reset()
+
+    def _reset_after_fork(self):
+        """
+        Zero every aggregate in a forked child (so a collector doesn't count
+        the parent's calls twice) and replace locks other threads may hold.
+        """
+        self._lock = threading.Lock()
+        for aggregate in self.aggregates():
+            aggregate._reset_after_fork()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """
+        One dict per aggregate that has recorded anything.
+        """
+        return [a.to_dict() for a in self.aggregates() if a.count]
+
+    def to_prometheus(self, prefix: str = "pytracex") -> str:
+        """
+        Render the aggregates in the Prometheus text exposition format: a
+        summary of durations with p50/p95/p99 quantiles plus error counters.
+        """
+        lines = [
+            f"# HELP {prefix}_duration_seconds Duration of traced calls.",
+            f"# TYPE {prefix}_duration_seconds summary",
+        ]
+        errors = [
+            f"# HELP {prefix}_errors_total Traced calls that raised.",
+            f"# TYPE {prefix}_errors_total counter",
+        ]
+        for stats in self.snapshot():
+            labels = _labels((("event_type", stats["event_type"]), ("function_name", stats["function_name"])))
+            for quantile in QUANTILES:
+                key = f"p{round(quantile * 100)}"
+                lines.append(f'{prefix}_duration_seconds{{{labels},quantile="{quantile}"}} {stats[key]!r}')
+            lines.append(f"{prefix}_duration_seconds_sum{{{labels}}} {stats['sum']!r}")
+            lines.append(f"{prefix}_duration_seconds_count{{{labels}}} {stats['count']}")
+            errors.append(f"{prefix}_errors_total{{{labels}}} {stats['errors']}")
+        return "\n".join(lines + errors) + "\n"
+
+
+def _labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return ",".join(f'{name}="{escape(str(value))}"' for name, value in pairs)
@@ -1,48 +1,124 @@
 """
 middlewares.py
 --------------
-Example: Integrate with a microservice web framework (FastAPI, Flask, or Django)
-to trace inbound/outbound requests automatically.
+Integrate with a microservice web framework (FastAPI, Starlette or any ASGI app)
+to trace inbound requests automatically.
 """
 
-from .trace_manager import TraceManager, TraceEvent
 import time
+import uuid
+from .trace_manager import TraceManager, TraceEvent
+from .context import set_correlation_id, reset_correlation_id, start_span, end_span
+from .config import CORRELATION_ID_HEADER
+from . import sampling
+
+# Longest incoming correlation ID that is trusted; longer ones are replaced.
+MAX_CORRELATION_ID_LENGTH = 128
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware that traces every inbound HTTP request.
+
+    The request is timed until the last body chunk has been sent, so streaming
+    responses are measured in full. The correlation ID is read from
+    ``header_name`` (or generated) and echoed back on the response. Events are
+    named after the route template (e.g. ``/items/{item_id}``) rather than the
+    raw path to keep cardinality bounded; requests that match no route use
+    ``unmatched_route``.
+
+    Each request is sampled as a whole with ``sampling.begin_request``: a
+    request that is not kept records no event unless it fails (and
+    ``sample_on_error`` is set). With tail sampling on, the request's events
+    are buffered until it ends.
+
+    Usage with FastAPI: ``app.add_middleware(TracingMiddleware)``.
+    """
+
+    def __init__(
+        self,
+        app,
+        header_name: str = CORRELATION_ID_HEADER,
+        unmatched_route: str = "<unmatched>",
+        **options
+    ):
+        self.app = app
+        self.header_name = header_name.lower().encode("latin-1")
+        self.unmatched_route = unmatched_route
+        self.options = options
+
+    def _correlation_id(self, scope) -> str:
+        for name, value in scope.get("headers", ()):
+            if name == self.header_name:
+                if 0 < len(value) <= MAX_CORRELATION_ID_LENGTH:
+                    return value.decode("latin-1")
+                break
+        return uuid.uuid4().hex
+
+    def _route_template(self, scope) -> str:
+        route = scope.get("route")
+        template = getattr(route, "path_format", None) or getattr(route, "path", None)
+        return template or self.unmatched_route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        correlation_id = self._correlation_id(scope)
+        correlation_header = (self.header_name, correlation_id.encode("latin-1"))
+        corr_token = set_correlation_id(correlation_id)
+        sampled = sampling.begin_request(correlation_id)
+        span, span_token = start_span()
+        state = {"status_code": None, "response_size": 0, "end_time": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status_code"] = message["status"]
+                message = dict(message)
+                message["headers"] = list(message.get("headers", ())) + [correlation_header]
+                await send(message)
+            elif message["type"] == "http.response.body":
+                state["response_size"] += len(message.get("body", b""))
+                await send(message)
+                if not message.get("more_body", False):
+                    state["end_time"] = time.time()
+            else:
+                await send(message)
+
+        start_time = time.time()
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            end_time = state["end_time"] or time.time()
+            end_span(span_token)
+            if sampled or (error is not None and sampling.enabled and sampling.sample_on_error):
+                self._record(scope, state, span, start_time, end_time, error)
+            sampling.end_request(correlation_id)
+            reset_correlation_id(corr_token)
 
-# Example for FastAPI
-try:
-    from fastapi import Request, Response
-    from starlette.middleware.base import BaseHTTPMiddleware
-    from starlette.types import ASGIApp
-
-    class TracingMiddleware(BaseHTTPMiddleware):
-        """
-        Middleware that traces every inbound/outbound HTTP request.
-        """
-        def __init__(self, app: ASGIApp, **options):
-            super().__init__(app)
-            self.options = options
-
-        async def dispatch(self, request: Request, call_next):
-            start_time = time.time()
-            response: Response = await call_next(request)
-            end_time = time.time()
-
-            event = TraceEvent(
-                event_type="api_request",
-                function_name="HTTP " + request.url.path,
-                timestamp=start_time,
-                duration=(end_time - start_time),
-                meta={
-                    "method": request.method,
-                    "url": str(request.url),
-                    "status_code": response.status_code,
-                }
-            )
-            TraceManager().record_event(event)
-            return response
-
-except ImportError:
-    # If fastapi/starlette not installed
-    TracingMiddleware = None
+    def _record(self, scope, state, span, start_time, end_time, error):
+        route = self._route_template(scope)
+        meta = {
+            "method": scope["method"],
+            "route": route,
+            "path": scope["path"],
+            "status_code": state["status_code"] or (500 if error is not None else None),
+            "response_size": state["response_size"],
+        }
+        if error is not None:
+            meta.update(TraceManager().capture_exception(error, "HTTP " + route))
+        TraceManager().record_event(TraceEvent(
+            event_type="api_request",
+            function_name="HTTP " + route,
+            timestamp=start_time,
+            duration=end_time - start_time,
+            meta=meta,
+            span=span
+        ))
 
 # For Flask or Django, you'd implement a similar approach with their middleware system.
@@ -5,34 +5,128 @@ A simple module for tracking ML pipeline steps (preprocessing, training, etc.).
 Users can optionally install "ml" extra if they want to group ML features.
 """
 
+import inspect
 import time
 from functools import wraps
+from typing import Any, Callable, Union
 from .trace_manager import TraceManager, TraceEvent
+from .instrumentation import instrument
+from .summaries import summarize
+from .step_cache import StepCache, Unfingerprintable, bound_state, code_version, fingerprint
 
-def ml_step(step_name: str = None):
+def ml_step(
+    step_name: str = None,
+    summarizer: Callable[[Any], Any] = summarize,
+    cache: Union[bool, str, StepCache] = None,
+    version: Any = None
+):
     """
-    Decorator for ML pipeline steps. Records input/output shapes, data, or metadata.
+    Decorator for ML pipeline steps. Records summaries of the inputs and output
+    (shape, dtype, nbytes, null counts, sampled statistics; see ``summaries``)
+    rather than their full ``repr()``. Pass ``summarizer`` to replace it.
+    Failed steps are recorded too, with the error in place of the output.
+    Works on plain functions, coroutine functions, generators and async generators.
+
+    With ``cache`` (True for the default ``StepCache``, a directory, or a
+    ``StepCache``), plain and coroutine steps return the stored result when
+    their code, ``version``, defaults, closure values and input fingerprints
+    match a previous call (steps closing over values that can't be
+    fingerprinted run uncached), and an ``ml_cache`` event records each hit or
+    miss.
     """
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            start_time = time.time()
-            result = func(*args, **kwargs)
-            end_time = time.time()
+        name = step_name or func.__name__
 
+        def record(start_time, end_time, args, kwargs, result, error, span):
+            meta = {
+                "args": [summarizer(arg) for arg in args],
+                "kwargs": {key: summarizer(value) for key, value in kwargs.items()},
+            }
+            if error is not None:
+                meta.update(TraceManager().capture_exception(error, name))
+            else:
+                meta["output"] = summarizer(result)
             TraceManager().record_event(
                 TraceEvent(
                     event_type="ml_step",
-                    function_name=step_name or func.__name__,
+                    function_name=name,
                     timestamp=start_time,
                     duration=end_time - start_time,
-                    meta={
-                        "args_repr": repr(args),
-                        "kwargs_repr": repr(kwargs),
-                        "output_repr": repr(result),
-                    }
+                    meta=meta,
+                    span=span
                 )
             )
-            return result
-        return wrapper
+        target = func if not cache else _cached(func, name, _resolve_cache(cache), version)
+        return instrument(target, record)
     return decorator
+
+def _resolve_cache(cache: Union[bool, str, StepCache]) -> StepCache:
+    if isinstance(cache, StepCache):
+        return cache
+    return StepCache() if cache is True else StepCache(cache)
+
+def _record_cache_event(name, start_time, overhead, hit, key, meta):
+    meta.update(hit=hit, key=key)
+    TraceManager().record_event(TraceEvent(
+        event_type="ml_cache",
+        function_name=name,
+        timestamp=start_time,
+        duration=overhead,
+        meta=meta
+    ))
+
+def _cached(func, name: str, cache: StepCache, version: Any):
+    """
+    Wrap ``func`` so calls are served from ``cache``. The ``ml_cache`` event's
+    duration is the caching overhead (fingerprinting, loading or storing).
+    """
+    if inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func):
+        raise TypeError("ml_step(cache=...) does not support generator functions")
+    code = code_version(func, version)
+
+    def lookup(args, kwargs):
+        start_time = time.time()
+        try:
+            key = fingerprint(code, bound_state(func), args, kwargs)
+        except Unfingerprintable as exc:
+            _record_cache_event(name, start_time, time.time() - start_time, False, None, {"error": str(exc)})
+            return None, False, None, None
+        found, result, entry = cache.get(key)
+        if found:
+            meta = {"saved_seconds": entry["compute_seconds"]}
+            _record_cache_event(name, start_time, time.time() - start_time, True, key, meta)
+        return key, found, result, (start_time, time.time() - start_time)
+
+    def store(key, result, compute_seconds, lookup_timing):
+        start_time, lookup_seconds = lookup_timing
+        store_start = time.time()
+        nbytes = cache.put(key, result, compute_seconds)
+        overhead = lookup_seconds + time.time() - store_start
+        _record_cache_event(name, start_time, overhead, False, key, {"stored_bytes": nbytes})
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            key, found, result, timing = lookup(args, kwargs)
+            if found:
+                return result
+            if key is None:
+                return await func(*args, **kwargs)
+            compute_start = time.time()
+            result = await func(*args, **kwargs)
+            store(key, result, time.time() - compute_start, timing)
+            return result
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key, found, result, timing = lookup(args, kwargs)
+        if found:
+            return result
+        if key is None:
+            return func(*args, **kwargs)
+        compute_start = time.time()
+        result = func(*args, **kwargs)
+        store(key, result, time.time() - compute_start, timing)
+        return result
+    return wrapper
@@ -0,0 +1,215 @@
+"""
+profiler.py
+-----------
+A statistical sampling profiler: a background thread reads every thread's
+stack with ``sys._current_frames()`` at a fixed rate, tags each sample with
+that thread's correlation ID and span (or those of the asyncio task it is
+running), and counts identical stacks.
+
+Nothing runs on the profiled threads apart from publishing their context on
+span and correlation ID changes (see ``context.set_thread_tracking``).
+Stacks are kept as tuples of code objects and only turned into names when
+exported as folded stacks, the input format of flame graph tools.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+from .config import LOGGER, PROFILER_HZ, PROFILER_MAX_DEPTH, PROFILER_MAX_STACKS
+from . import context
+
+# Bound at import time so file I/O tracing never traces the export itself.
+_open = open
+
+# (correlation_id, trace_id, span_id, thread name, stack of code objects, root first)
+SampleKey = Tuple[Optional[str], Optional[int], Optional[int], str, Tuple[Any, ...]]
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples all other threads ``hz`` times per second until stopped.
+
+    With ``traced_only``, threads that have neither a correlation ID nor an
+    active span are skipped. At most ``max_stacks`` distinct (context, stack)
+    keys are counted; later new keys are counted in ``dropped``.
+    """
+
+    def __init__(
+        self,
+        hz: float = PROFILER_HZ,
+        max_depth: int = PROFILER_MAX_DEPTH,
+        max_stacks: int = PROFILER_MAX_STACKS,
+        traced_only: bool = False,
+    ):
+        if hz <= 0:
+            raise ValueError("hz must be positive")
+        self.interval = 1.0 / hz
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.traced_only = traced_only
+        self.samples = 0
+        self.dropped = 0
+        self._counts: Dict[SampleKey, int] = defaultdict(int)
+        self._labels: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "SamplingProfiler":
+        if self.running:
+            return self
+        self._stop.clear()
+        context.set_thread_tracking(True)
+        self._thread = threading.Thread(target=self._run, name="pytracex-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        context.set_thread_tracking(False)
+
+    def __enter__(self) -> "SamplingProfiler":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        names_refreshed = 0.0
+        next_sample = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now - names_refreshed >= 1.0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                names_refreshed = now
+            try:
+                self._sample(own, names)
+            except Exception:
+                LOGGER.exception("Profiler sample failed.")
+            next_sample += self.interval
+            # Don't try to catch up after a stall (e.g. a long GIL hold).
+            next_sample = max(next_sample, time.monotonic())
+            self._stop.wait(next_sample - time.monotonic())
+
+    def _sample(self, own: int, names: Dict[int, str]):
+        max_depth = self.max_depth
+        keys = []
+        frames = sys._current_frames()
+        tasks = context.running_tasks()
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            correlation_id, span = context.thread_context(ident, tasks.get(ident))
+            if self.traced_only and correlation_id is None and span is None:
+                continue
+            name = names.get(ident, "")
+            if name.startswith("pytracex-"):
+                continue
+            stack = []
+            while frame is not None and len(stack) < max_depth:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            if span is not None:
+                keys.append((correlation_id, span.trace_id, span.span_id, name, tuple(stack)))
+            else:
+                keys.append((correlation_id, None, None, name, tuple(stack)))
+        # Threads that exited while holding a span or correlation ID.
+        context.prune_thread_context(frames)
+        frame = frames = None  # don't keep the frames alive until the next sample
+        with self._lock:
+            self.samples += 1
+            counts = self._counts
+            for key in keys:
+                if key in counts or len(counts) < self.max_stacks:
+                    counts[key] += 1
+                else:
+                    self.dropped += 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(code)
+        return label
+
+    def folded(
+        self,
+        correlation_id: str = None,
+        trace_id: int = None,
+        span_id: int = None,
+        by_thread: bool = False,
+        by_request: bool = False,
+    ) -> Dict[str, int]:
+        """
+        Sample counts per folded stack (``"outer;inner;innermost"``), limited
+        to the given correlation ID, trace or span. ``by_thread`` and
+        ``by_request`` add the thread name or correlation ID as root frames.
+        """
+        with self._lock:
+            items = list(self._counts.items())
+        result: Dict[str, int] = defaultdict(int)
+        for (key_correlation_id, key_trace_id, key_span_id, thread_name, stack), count in items:
+            if correlation_id is not None and key_correlation_id != correlation_id:
+                continue
+            if trace_id is not None and key_trace_id != trace_id:
+                continue
+            if span_id is not None and key_span_id != span_id:
+                continue
+            frames = [self._label(code) for code in stack]
+            if by_thread:
+                frames.insert(0, f"thread:{thread_name}")
+            if by_request:
+                frames.insert(0, f"request:{key_correlation_id}")
+            result[";".join(frames)] += count
+        return dict(result)
+
+    def to_folded(self, path: str = None, **filters) -> str:
+        """
+        The folded stacks as text, one ``"stack count"`` line each, ready for
+        ``flamegraph.pl`` or speedscope. Also written to ``path`` if given.
+        Accepts the same filters as ``folded``.
+        """
+        lines = sorted(f"{stack} {count}" for stack, count in self.folded(**filters).items())
+        text = "\n".join(lines) + ("\n" if lines else "")
+        if path is not None:
+            with _open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"samples": self.samples, "stacks": len(self._counts), "dropped": self.dropped}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self.samples = self.dropped = 0
+
+    def _reset_after_fork(self):
+        """
+        The sampling thread doesn't survive ``fork``: the child starts stopped,
+        with no samples.
+        """
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._counts.clear()
+        self.samples = self.dropped = 0
+        context.set_thread_tracking(False)
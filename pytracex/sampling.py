@@ -0,0 +1,280 @@
+"""
+sampling.py
+-----------
+The global tracing switch and sampling decisions used by the decorators and
+the middleware.
+
+Inside a request (a correlation ID is set) the head-based decision is a hash
+of the correlation ID compared with the sample rate, so every decorator and
+every service keeps or drops the same requests without coordinating. With
+tail sampling on, requests the head decision dropped are still recorded into
+a bounded per-request buffer, which is stored if any of their events errors
+or is slow and discarded when the request ends otherwise.
+"""
+
+import os
+import random
+import threading
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+from .config import (
+    TRACING_ENABLED,
+    TRACE_SAMPLE_RATE,
+    TRACE_SAMPLE_RATES,
+    TRACE_SAMPLE_ON_ERROR,
+    TRACE_SAMPLE_BY_CORRELATION_ID,
+    TRACE_TAIL_SAMPLING,
+    TRACE_TAIL_LATENCY_THRESHOLD,
+    TRACE_TAIL_BUFFER_SIZE,
+    TRACE_TAIL_MAX_REQUESTS,
+)
+from .context import get_correlation_id
+
+# Module-level state is read directly by the decorator wrappers on every call,
+# so it is kept as plain globals rather than behind accessors.
+enabled = TRACING_ENABLED
+sample_on_error = TRACE_SAMPLE_ON_ERROR
+by_correlation_id = TRACE_SAMPLE_BY_CORRELATION_ID
+tail_sampling = TRACE_TAIL_SAMPLING
+tail_latency_threshold = TRACE_TAIL_LATENCY_THRESHOLD
+_default_rate = TRACE_SAMPLE_RATE
+_rates = dict(TRACE_SAMPLE_RATES)
+_random = random.random
+
+_HASH_SPACE = 1 << 32
+# (correlation_id, hash) of the last lookup: calls within a request share it.
+_last_hash = (None, 0)
+
+
+def _check_rate(rate: float) -> float:
+    if not 0.0 <= rate <= 1.0:
+        raise ValueError("sample rate must be between 0.0 and 1.0")
+    return float(rate)
+
+
+def set_tracing_enabled(value: bool):
+    """
+    Turn tracing on or off globally. When off, traced functions are called directly.
+    """
+    global enabled
+    enabled = bool(value)
+
+
+def is_tracing_enabled() -> bool:
+    return enabled
+
+
+def set_sample_on_error(value: bool):
+    """
+    Whether calls that were sampled out are still recorded when they raise.
+    """
+    global sample_on_error
+    sample_on_error = bool(value)
+
+
+def set_sample_rate(rate: float, function_name: Optional[str] = None):
+    """
+    Set the default sample rate, or the rate for a single function name.
+    """
+    global _default_rate
+    if function_name is None:
+        _default_rate = _check_rate(rate)
+    else:
+        _rates[function_name] = _check_rate(rate)
+
+
+def clear_sample_rate(function_name: str):
+    """
+    Make a function fall back to the default sample rate again.
+    """
+    _rates.pop(function_name, None)
+
+
+def get_sample_rate(function_name: Optional[str] = None) -> float:
+    if function_name is None:
+        return _default_rate
+    return _rates.get(function_name, _default_rate)
+
+
+def set_sample_by_correlation_id(value: bool):
+    """
+    Whether calls inside a request are sampled by hashing its correlation ID
+    (the default) rather than independently at random.
+    """
+    global by_correlation_id
+    by_correlation_id = bool(value)
+
+
+def _correlation_hash(correlation_id: str) -> int:
+    global _last_hash
+    last_id, value = _last_hash
+    if last_id != correlation_id:
+        value = zlib.crc32(correlation_id.encode("utf-8", "surrogatepass"))
+        _last_hash = (correlation_id, value)
+    return value
+
+
+def sample_correlation_id(correlation_id: str, rate: Optional[float] = None) -> bool:
+    """
+    The deterministic keep/drop decision for a request: the CRC-32 of its
+    correlation ID against ``rate`` (default: the default sample rate). A
+    request kept at some rate is kept at every higher rate.
+    """
+    if rate is None:
+        rate = _default_rate
+    return _correlation_hash(correlation_id) < rate * _HASH_SPACE
+
+
+def should_sample(function_name: str, rate: Optional[float] = None) -> bool:
+    """
+    Head-based sampling decision for one call. ``rate`` overrides the configured rates.
+    """
+    if rate is None:
+        rate = _rates.get(function_name, _default_rate)
+    if rate >= 1.0:
+        return True
+    # Calls of a request held for tail sampling are buffered whatever their rate.
+    if _pending and get_correlation_id() in _pending:
+        return True
+    if rate <= 0.0:
+        return False
+    if by_correlation_id:
+        correlation_id = get_correlation_id()
+        if correlation_id is not None:
+            return _correlation_hash(correlation_id) < rate * _HASH_SPACE
+    return _random() < rate
+
+
+# Tail-based sampling. Requests dropped by the head decision are pending until
+# they end; record_event hands their events to offer() instead of storing them.
+
+class _PendingRequest:
+    __slots__ = ("events", "depth", "kept")
+
+    def __init__(self):
+        self.events = deque(maxlen=TRACE_TAIL_BUFFER_SIZE)
+        self.depth = 1
+        self.kept = False
+
+
+_pending: "OrderedDict[str, _PendingRequest]" = OrderedDict()
+_tail_lock = threading.Lock()
+_tail_stats = {"kept": 0, "discarded": 0, "dropped_events": 0}
+
+
+def _reset_tail_after_fork():
+    global _tail_lock
+    _tail_lock = threading.Lock()
+    _pending.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_tail_after_fork)
+
+
+def set_tail_sampling(value: bool, latency_threshold: Optional[float] = None):
+    """
+    Turn tail-based upgrades on or off. Requests the head decision dropped are
+    then kept if any of their events errors (or is an HTTP 5xx response) or
+    takes at least ``latency_threshold`` seconds.
+    """
+    global tail_sampling, tail_latency_threshold
+    tail_sampling = bool(value)
+    if latency_threshold is not None:
+        tail_latency_threshold = float(latency_threshold)
+
+
+def begin_request(correlation_id: str) -> bool:
+    """
+    Make the sampling decision for a request that is starting; returns whether
+    its events should be recorded at all. Requests the head decision dropped
+    are buffered until ``end_request`` when tail sampling is on.
+    """
+    if not enabled:
+        return False
+    if _default_rate >= 1.0 or (
+        sample_correlation_id(correlation_id) if by_correlation_id else _random() < _default_rate
+    ):
+        return True
+    if not tail_sampling:
+        return False
+    with _tail_lock:
+        request = _pending.get(correlation_id)
+        if request is not None:
+            request.depth += 1
+            return True
+        _pending[correlation_id] = _PendingRequest()
+        while len(_pending) > TRACE_TAIL_MAX_REQUESTS:
+            _, evicted = _pending.popitem(last=False)
+            _tail_stats["discarded"] += 1
+            _tail_stats["dropped_events"] += len(evicted.events)
+    return True
+
+
+def end_request(correlation_id: str):
+    """
+    Close a request started with ``begin_request``; the buffered events of a
+    request that was not kept are discarded.
+    """
+    if not _pending:
+        return
+    with _tail_lock:
+        request = _pending.get(correlation_id)
+        if request is None:
+            return
+        request.depth -= 1
+        if request.depth > 0:
+            return
+        del _pending[correlation_id]
+        if not request.kept:
+            _tail_stats["discarded"] += 1
+            _tail_stats["dropped_events"] += len(request.events)
+
+
+def _is_interesting(event) -> bool:
+    meta = event.meta
+    if meta:
+        if "error" in meta:
+            return True
+        status = meta.get("status_code")
+        if isinstance(status, int) and status >= 500:
+            return True
+    return event.duration >= tail_latency_threshold
+
+
+def offer(event, record: Callable[[Any], None]) -> bool:
+    """
+    Buffer ``event`` if it belongs to a pending request and return True. When
+    the event upgrades its request, the buffered events and the event itself
+    are passed to ``record`` and later events of the request are recorded
+    directly. Returns False for events that should be recorded as usual,
+    which always includes audit events.
+    """
+    request = _pending.get(event.correlation_id)
+    if request is None or request.kept:
+        return False
+    if event.event_type == "audit_call" or (event.meta and "signature" in event.meta):
+        # Sealed into a hash chain already: dropping it would break the chain.
+        return False
+    with _tail_lock:
+        if request.kept:
+            return False
+        if not _is_interesting(event):
+            if len(request.events) == request.events.maxlen:
+                _tail_stats["dropped_events"] += 1
+            request.events.append(event)
+            return True
+        request.kept = True
+        _tail_stats["kept"] += 1
+        buffered = list(request.events)
+        request.events.clear()
+    for buffered_event in buffered:
+        record(buffered_event)
+    record(event)
+    return True
+
+
+def tail_stats() -> Dict[str, int]:
+    with _tail_lock:
+        return dict(_tail_stats, pending=len(_pending))
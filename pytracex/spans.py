@@ -0,0 +1,107 @@
+"""
+spans.py
+--------
+Rebuilds span trees from recorded events so nested calls can be inspected as a
+call tree with total and self time per span.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class SpanNode:
+    """
+    One span in a rebuilt tree. ``total_time`` is the span's duration and
+    ``self_time`` the part of it not covered by its children.
+    """
+
+    __slots__ = ("event", "children", "self_time")
+
+    def __init__(self, event: Dict[str, Any]):
+        self.event = event
+        self.children: List["SpanNode"] = []
+        self.self_time = 0.0
+
+    @property
+    def span_id(self) -> int:
+        return self.event["span_id"]
+
+    @property
+    def name(self) -> str:
+        return self.event["function_name"]
+
+    @property
+    def total_time(self) -> float:
+        return self.event["duration"] or 0.0
+
+    def walk(self) -> Iterator[Tuple[int, "SpanNode"]]:
+        """
+        Depth-first iteration yielding ``(depth, node)`` pairs.
+        """
+        stack = [(0, self)]
+        while stack:
+            depth, node = stack.pop()
+            yield depth, node
+            stack.extend((depth + 1, child) for child in reversed(node.children))
+
+    def critical_path(self) -> List["SpanNode"]:
+        """
+        Follow the slowest child at each level, from this span down to a leaf.
+        """
+        path = [self]
+        node = self
+        while node.children:
+            node = max(node.children, key=lambda child: child.total_time)
+            path.append(node)
+        return path
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "event_type": self.event["event_type"],
+            "function_name": self.name,
+            "total_time": self.total_time,
+            "self_time": self.self_time,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+    def __repr__(self):
+        return f"<SpanNode {self.name} total={self.total_time:.6f} self={self.self_time:.6f}>"
+
+
+def build_span_trees(events: Iterable[Dict[str, Any]]) -> Dict[int, List[SpanNode]]:
+    """
+    Group events by trace ID and link them into trees through ``parent_span_id``.
+
+    Returns the root spans of each trace. Spans whose parent is not part of
+    ``events`` (e.g. it was sampled out or evicted) are treated as roots.
+    """
+    nodes = {event["span_id"]: SpanNode(event) for event in events}
+    trees: Dict[int, List[SpanNode]] = {}
+    for node in nodes.values():
+        parent = nodes.get(node.event["parent_span_id"])
+        if parent is None or parent is node:
+            trees.setdefault(node.event["trace_id"], []).append(node)
+        else:
+            parent.children.append(node)
+
+    for node in nodes.values():
+        node.children.sort(key=lambda child: child.event["timestamp"])
+        # Concurrent children (e.g. gathered tasks) can overlap, so clamp at zero.
+        node.self_time = max(node.total_time - sum(child.total_time for child in node.children), 0.0)
+    for roots in trees.values():
+        roots.sort(key=lambda root: root.event["timestamp"])
+    return trees
+
+
+def summarize_time(roots: Iterable[SpanNode]) -> Dict[str, Dict[str, float]]:
+    """
+    Per-function call count, total time and self time across the given trees.
+    """
+    summary: Dict[str, Dict[str, float]] = {}
+    for root in roots:
+        for _, node in root.walk():
+            entry = summary.setdefault(node.name, {"count": 0, "total_time": 0.0, "self_time": 0.0})
+            entry["count"] += 1
+            entry["total_time"] += node.total_time
+            entry["self_time"] += node.self_time
+    return summary
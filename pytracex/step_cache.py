@@ -0,0 +1,329 @@
+"""
+step_cache.py
+-------------
+Disk cache for ``ml_step(cache=...)``: a step whose code version and input
+fingerprints are unchanged returns its stored result instead of recomputing.
+
+Fingerprints are streaming BLAKE2b hashes that read array data through the
+buffer protocol without copying it. Results are pickled, except NumPy arrays,
+which are saved as ``.npy`` files next to the pickle and come back as
+copy-on-write memory maps: writable like a freshly computed result, while
+writes stay private to the process and never reach the cache. Entries are
+evicted least recently used first once the cache exceeds its size or entry
+limits.
+
+The cache directory is trusted: entries are unpickled when loaded.
+"""
+
+import hashlib
+import io
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from .config import LOGGER, ML_CACHE_DIR, ML_CACHE_MAX_BYTES, ML_CACHE_MAX_ENTRIES
+
+# Bound at import time so file I/O tracing never traces the cache itself.
+_open = open
+
+_RESULT_FILE = "result.pkl"
+_META_FILE = "meta.json"
+
+
+class Unfingerprintable(TypeError):
+    """
+    Raised for inputs the cache can't hash reliably; the step then runs uncached.
+    """
+
+
+def _numpy():
+    # Only arrays that already exist are handled, so NumPy is never imported here.
+    return sys.modules.get("numpy")
+
+
+def _update_array(hasher, array):
+    hasher.update(f"ndarray:{array.dtype.str}:{array.shape}".encode())
+    if array.dtype.hasobject:
+        for item in array.flat:
+            _update(hasher, item)
+    elif array.flags.c_contiguous:
+        # A uint8 view exports a buffer for every dtype (datetime64 included).
+        hasher.update(array.reshape(-1).view(_numpy().uint8))
+    elif array.ndim > 1:
+        # Rows of a non-contiguous array are often contiguous themselves.
+        for row in array:
+            _update_array(hasher, row)
+    else:
+        hasher.update(array.tobytes())
+
+
+def _update(hasher, value: Any):
+    value_type = type(value)
+    if value is None or value_type in (bool, int, float, complex):
+        hasher.update(f"{value_type.__name__}:{value!r};".encode())
+    elif value_type is str:
+        data = value.encode("utf-8", "surrogatepass")
+        hasher.update(f"str:{len(data)}:".encode())
+        hasher.update(data)
+    elif value_type in (bytes, bytearray, memoryview):
+        view = memoryview(value)
+        hasher.update(f"bytes:{view.nbytes}:".encode())
+        hasher.update(view.cast("B") if view.c_contiguous else view.tobytes())
+    elif value_type in (list, tuple):
+        hasher.update(f"{value_type.__name__}:{len(value)}:".encode())
+        for item in value:
+            _update(hasher, item)
+    elif value_type is dict:
+        hasher.update(f"dict:{len(value)}:".encode())
+        for key in sorted(value, key=repr):
+            _update(hasher, key)
+            _update(hasher, value[key])
+    elif _numpy() is not None and isinstance(value, _numpy().ndarray):
+        _update_array(hasher, value)
+    elif value_type.__module__.startswith("pandas") and hasattr(value, "to_numpy"):
+        hasher.update(f"{value_type.__name__}:{value.shape}:".encode())
+        _update(hasher, [str(name) for name in getattr(value, "columns", [getattr(value, "name", None)])])
+        _update_array(hasher, value.to_numpy())
+        _update_array(hasher, value.index.to_numpy())
+    else:
+        raise Unfingerprintable(f"Cannot fingerprint {value_type.__qualname__}")
+
+
+def fingerprint(*values: Any) -> str:
+    """
+    Hex digest over ``values``, reading array buffers in place.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    for value in values:
+        _update(hasher, value)
+    return hasher.hexdigest()
+
+
+def code_version(func: Callable, version: Any = None) -> str:
+    """
+    Digest of the function's qualified name, bytecode, constants and the
+    names the bytecode refers to (nested functions included) plus an explicit
+    ``version``. Changes to globals or
+    called helpers are not seen; bump ``version`` for those. Defaults and
+    closure values are covered separately by ``bound_state``.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    hasher.update(f"{func.__module__}.{func.__qualname__}:{version!r}".encode())
+
+    def add_code(code):
+        hasher.update(code.co_code)
+        # Bytecode refers to attributes, globals and locals by index only.
+        for names in (code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars):
+            hasher.update(repr(names).encode())
+        for const in code.co_consts:
+            if hasattr(const, "co_code"):
+                add_code(const)
+            else:
+                hasher.update(repr(const).encode())
+
+    add_code(func.__code__)
+    return hasher.hexdigest()
+
+
+def bound_state(func: Callable) -> tuple:
+    """
+    The values a call depends on besides its arguments and code: defaults,
+    keyword-only defaults and closure cell contents. Read on every call, since
+    cells can be rebound; fingerprinting raises ``Unfingerprintable`` for
+    values the cache can't hash.
+    """
+    cells = []
+    for cell in func.__closure__ or ():
+        try:
+            cells.append(cell.cell_contents)
+        except ValueError:  # an empty cell
+            cells.append(None)
+    return (func.__defaults__, func.__kwdefaults__, cells)
+
+
+class _ResultPickler(pickle.Pickler):
+    """
+    Writes each plain NumPy array to its own ``.npy`` file instead of the pickle.
+    """
+
+    def __init__(self, file, directory: str):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.arrays = 0
+        self.nbytes = 0
+
+    def persistent_id(self, obj):
+        np = _numpy()
+        if np is None or type(obj) is not np.ndarray or obj.dtype.hasobject:
+            return None
+        name = f"{self.arrays}.npy"
+        np.save(os.path.join(self.directory, name), obj, allow_pickle=False)
+        self.arrays += 1
+        self.nbytes += obj.nbytes
+        return ("npy", name)
+
+
+class _ResultUnpickler(pickle.Unpickler):
+    def __init__(self, file, directory: str, mmap: bool):
+        super().__init__(file)
+        self.directory = directory
+        self.mmap = mmap
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if kind != "npy":
+            raise pickle.UnpicklingError(f"Unknown persistent id {pid!r}")
+        import numpy as np  # arrays were stored, so NumPy is installed
+
+        return np.load(os.path.join(self.directory, name), mmap_mode="c" if self.mmap else None)
+
+
+class StepCache:
+    """
+    A directory of cached step results, one subdirectory per key.
+
+    ``max_bytes`` and ``max_entries`` bound the cache; the least recently used
+    entries (by directory mtime, touched on every hit) are removed first.
+    ``mmap=False`` loads arrays into memory instead of mapping them.
+    """
+
+    def __init__(
+        self,
+        directory: str = ML_CACHE_DIR,
+        max_bytes: int = ML_CACHE_MAX_BYTES,
+        max_entries: int = ML_CACHE_MAX_ENTRIES,
+        mmap: bool = True,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.mmap = mmap
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> (nbytes, last_used), loaded lazily from disk.
+        self._index: Optional[Dict[str, Tuple[int, float]]] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _load_index(self) -> Dict[str, Tuple[int, float]]:
+        if self._index is None:
+            index = {}
+            for key in os.listdir(self.directory):
+                if key.startswith(".tmp-"):
+                    continue
+                meta_path = os.path.join(self._entry_dir(key), _META_FILE)
+                try:
+                    with _open(meta_path, encoding="utf-8") as f:
+                        nbytes = json.load(f)["nbytes"]
+                    index[key] = (nbytes, os.stat(self._entry_dir(key)).st_mtime)
+                except (OSError, ValueError, KeyError):
+                    continue
+            self._index = index
+        return self._index
+
+    def get(self, key: str) -> Tuple[bool, Any, Optional[Dict[str, Any]]]:
+        """
+        Return ``(found, result, entry metadata)``.
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            with _open(os.path.join(entry_dir, _META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+            with _open(os.path.join(entry_dir, _RESULT_FILE), "rb") as f:
+                result = _ResultUnpickler(f, entry_dir, self.mmap).load()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False, None, None
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            LOGGER.warning("Discarding unreadable cached step result %s.", key)
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return False, None, None
+        now = time.time()
+        try:
+            os.utime(entry_dir, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            index = self._load_index()
+            if key in index:
+                index[key] = (index[key][0], now)
+        return True, result, meta
+
+    def put(self, key: str, result: Any, compute_seconds: float) -> int:
+        """
+        Store ``result`` and return its size in bytes. The entry is written to
+        a temporary directory and renamed into place, so readers never see a
+        partial entry.
+        """
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            buffer = io.BytesIO()
+            pickler = _ResultPickler(buffer, staging)
+            pickler.dump(result)
+            with _open(os.path.join(staging, _RESULT_FILE), "wb") as f:
+                f.write(buffer.getvalue())
+            nbytes = pickler.nbytes + buffer.tell()
+            meta = {"created": time.time(), "compute_seconds": compute_seconds, "nbytes": nbytes}
+            with _open(os.path.join(staging, _META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            try:
+                os.rename(staging, self._entry_dir(key))
+            except OSError:
+                # Another process stored the same key first.
+                shutil.rmtree(staging, ignore_errors=True)
+                return nbytes
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        with self._lock:
+            self._load_index()[key] = (nbytes, time.time())
+            self._evict()
+        return nbytes
+
+    def _evict(self):
+        index = self._index
+        total = sum(nbytes for nbytes, _ in index.values())
+        if total <= self.max_bytes and len(index) <= self.max_entries:
+            return
+        for key, (nbytes, _) in sorted(index.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes and len(index) <= self.max_entries:
+                break
+            # Memory-mapped arrays stay valid after their files are unlinked.
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            del index[key]
+            total -= nbytes
+            LOGGER.debug("Evicted cached step result %s (%d bytes).", key, nbytes)
+
+    def _remove(self, key: str):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        with self._lock:
+            if self._index is not None:
+                self._index.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            index = self._load_index()
+            return {
+                "entries": len(index),
+                "bytes": sum(nbytes for nbytes, _ in index.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._load_index()):
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            self._index = {}
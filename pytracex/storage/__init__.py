@@ -0,0 +1,20 @@
+"""
+storage
+-------
+Storage backends for recorded trace events.
+"""
+
+from .base import BaseStorage, as_event_dict
+from .memory import RingBufferStorage, OVERWRITE_OLDEST, DROP_NEWEST
+from .segmented import SegmentedLogStorage
+from .sqlite import SQLiteStorage
+
+__all__ = [
+    "BaseStorage",
+    "as_event_dict",
+    "RingBufferStorage",
+    "SegmentedLogStorage",
+    "SQLiteStorage",
+    "OVERWRITE_OLDEST",
+    "DROP_NEWEST",
+]
@@ -0,0 +1,78 @@
+"""
+base.py
+-------
+The interface shared by all trace event storage backends.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def event_field(event: Dict[str, Any], name: str) -> Any:
+    """
+    Read a queryable field from an event dict. The correlation ID lives in ``meta``.
+    """
+    if name == "correlation_id":
+        return (event.get("meta") or {}).get("correlation_id")
+    return event.get(name)
+
+
+def as_event_dict(item) -> Dict[str, Any]:
+    """
+    Backends may hand back ``TraceEvent`` objects (in-memory) or event dicts
+    (persistent backends); this normalizes both to dicts.
+    """
+    return item if isinstance(item, dict) else item.to_dict()
+
+
+class BaseStorage:
+    """
+    Storage backends receive ``TraceEvent`` objects and assign each one an
+    increasing sequence number, which doubles as the pagination cursor.
+    Query filters are ``event_type``, ``function_name`` and ``correlation_id``.
+    """
+
+    def append(self, event) -> Optional[int]:
+        """
+        Store an event and return its sequence number, or None if it was dropped.
+        """
+        raise NotImplementedError
+
+    def snapshot(self) -> List[Any]:
+        """
+        Return all stored events, oldest first.
+        """
+        raise NotImplementedError
+
+    def query(
+        self,
+        filters: Dict[str, Any] = None,
+        since: float = None,
+        until: float = None,
+        cursor: int = None,
+        limit: int = 100,
+    ) -> Tuple[List[Tuple[int, Any]], Optional[int]]:
+        """
+        Return up to ``limit`` ``(seq, event)`` pairs after ``cursor`` and the
+        cursor for the next page, or None when there are no further matches.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def flush(self, timeout: float = None):
+        """
+        Block until appended events are visible to queries. Backends that
+        write synchronously need not override this.
+        """
+
+    def close(self):
+        """
+        Release files, connections or threads held by the backend.
+        """
+
+    def __len__(self) -> int:
+        raise NotImplementedError
@@ -0,0 +1,245 @@
+"""
+memory.py
+---------
+A bounded, in-memory ring buffer used as the default trace event store.
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from .base import BaseStorage
+
+OVERWRITE_OLDEST = "overwrite_oldest"
+DROP_NEWEST = "drop_newest"
+OVERFLOW_POLICIES = (OVERWRITE_OLDEST, DROP_NEWEST)
+
+# Queries copy at most this many candidates per lock acquisition.
+QUERY_CHUNK_SIZE = 1024
+
+
+class _Postings:
+    """
+    The sequence numbers indexed under one key, oldest first: a list with a
+    moving head, so evictions pop from the front in amortized O(1) and
+    lookups can bisect.
+    """
+
+    __slots__ = ("seqs", "head")
+
+    def __init__(self, seq: int):
+        self.seqs = [seq]
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.seqs) - self.head
+
+    def append(self, seq: int):
+        self.seqs.append(seq)
+
+    def popleft(self):
+        self.head += 1
+        if self.head * 2 >= len(self.seqs):
+            del self.seqs[:self.head]
+            self.head = 0
+
+    def after(self, start: int, count: int) -> List[int]:
+        """
+        Up to ``count`` sequence numbers >= ``start``.
+        """
+        i = bisect_left(self.seqs, start, self.head)
+        return self.seqs[i:i + count]
+
+
+class RingBufferStorage(BaseStorage):
+    """
+    Fixed-capacity event store backed by a preallocated list of slots.
+
+    When the buffer is full, ``overflow`` decides what happens to a new event:
+    ``"overwrite_oldest"`` evicts the oldest stored event, ``"drop_newest"``
+    rejects the incoming one. Both cases are counted in ``stats()``.
+
+    Every stored item gets a sequence number, which ``query`` uses as a
+    pagination cursor. ``indexes`` maps a field name to a key function; for each
+    field the store keeps, per key, the sequence numbers of matching items so
+    filtered queries only visit candidates. With ``timestamp_key``, a running
+    maximum of timestamps lets ``since`` filters skip older items by binary
+    search. Indexes are updated in O(1) on append and eviction.
+
+    Writers only hold the lock for a few index updates and never await, so the
+    store is safe to use from threads and from asyncio code alike.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        overflow: str = OVERWRITE_OLDEST,
+        indexes: Dict[str, Callable[[Any], Any]] = None,
+        timestamp_key: Callable[[Any], float] = None,
+    ):
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}; expected one of {OVERFLOW_POLICIES}")
+        self.capacity = capacity
+        self.overflow = overflow
+        self._slots: List[Any] = [None] * capacity
+        self._lock = threading.Lock()
+        # Sequence numbers: [_first_seq, _next_seq) are currently stored.
+        self._first_seq = 0
+        self._next_seq = 0
+        self._dropped = 0
+        self._overwritten = 0
+        self._index_keys = dict(indexes or {})
+        self._indexes: Dict[str, Dict[Any, _Postings]] = {name: {} for name in self._index_keys}
+        self._timestamp_key = timestamp_key
+        self._max_timestamps: List[float] = [0.0] * capacity if timestamp_key else None
+        self._max_timestamp = float("-inf")
+
+    def append(self, item: Any) -> Optional[int]:
+        """
+        Store an item and return its sequence number, or None if it was
+        rejected by the drop-newest policy.
+        """
+        with self._lock:
+            if self._next_seq - self._first_seq == self.capacity:
+                if self.overflow == DROP_NEWEST:
+                    self._dropped += 1
+                    return None
+                self._evict_oldest()
+                self._overwritten += 1
+            seq = self._next_seq
+            slot = seq % self.capacity
+            self._slots[slot] = item
+            for name, key in self._index_keys.items():
+                index = self._indexes[name]
+                value = key(item)
+                seqs = index.get(value)
+                if seqs is None:
+                    index[value] = _Postings(seq)
+                else:
+                    seqs.append(seq)
+            if self._max_timestamps is not None:
+                timestamp = self._timestamp_key(item)
+                if timestamp > self._max_timestamp:
+                    self._max_timestamp = timestamp
+                self._max_timestamps[slot] = self._max_timestamp
+            self._next_seq = seq + 1
+        return seq
+
+    def _evict_oldest(self):
+        # The evicted item is the oldest one, so it is at the front of its postings.
+        item = self._slots[self._first_seq % self.capacity]
+        for name, key in self._index_keys.items():
+            index = self._indexes[name]
+            value = key(item)
+            seqs = index[value]
+            seqs.popleft()
+            if not seqs:
+                del index[value]
+        self._first_seq += 1
+
+    def snapshot(self) -> List[Any]:
+        """
+        Return a copy of the stored items, oldest first.
+        """
+        with self._lock:
+            start = self._first_seq % self.capacity
+            size = self._next_seq - self._first_seq
+            if start + size <= self.capacity:
+                return self._slots[start:start + size]
+            return self._slots[start:] + self._slots[:(start + size) - self.capacity]
+
+    def query(
+        self,
+        filters: Dict[str, Any] = None,
+        since: float = None,
+        until: float = None,
+        cursor: int = None,
+        limit: int = 100,
+    ) -> Tuple[List[Tuple[int, Any]], Optional[int]]:
+        """
+        Return up to ``limit`` ``(seq, item)`` pairs with a sequence number
+        greater than ``cursor``, oldest first, matching every indexed field in
+        ``filters`` and the ``[since, until]`` timestamp range.
+
+        The second value is the cursor for the next page, or None when there
+        are no further matches right now.
+        """
+        filters = {name: value for name, value in (filters or {}).items() if value is not None}
+        unknown = set(filters) - set(self._index_keys)
+        if unknown:
+            raise ValueError(f"No index for {sorted(unknown)}")
+        if (since is not None or until is not None) and self._timestamp_key is None:
+            raise ValueError("Time range queries need a timestamp_key")
+
+        # Candidates are copied in chunks under the lock (slots may be
+        # overwritten once it is released) and filtered outside it.
+        checks = [(self._index_keys[name], value) for name, value in filters.items()]
+        start = -1 if cursor is None else cursor + 1
+        results = []
+        while True:
+            with self._lock:
+                start = max(start, self._first_seq)
+                if since is not None:
+                    start = max(start, self._first_seq_since(since))
+                chunk = [(seq, self._slots[seq % self.capacity]) for seq in self._candidates(filters, start)]
+            for seq, item in chunk:
+                if any(key(item) != value for key, value in checks):
+                    continue
+                if since is not None or until is not None:
+                    timestamp = self._timestamp_key(item)
+                    if (since is not None and timestamp < since) or (until is not None and timestamp > until):
+                        continue
+                if len(results) == limit:
+                    return results, results[-1][0]
+                results.append((seq, item))
+            if len(chunk) < QUERY_CHUNK_SIZE:
+                return results, None
+            start = chunk[-1][0] + 1
+
+    def _candidates(self, filters: Dict[str, Any], start: int) -> Sequence[int]:
+        if not filters:
+            return range(start, min(self._next_seq, start + QUERY_CHUNK_SIZE))
+        # Walk the most selective index; the others are checked per item.
+        smallest = None
+        for name, value in filters.items():
+            seqs = self._indexes[name].get(value)
+            if not seqs:
+                return []
+            if smallest is None or len(seqs) < len(smallest):
+                smallest = seqs
+        return smallest.after(start, QUERY_CHUNK_SIZE)
+
+    def _first_seq_since(self, since: float) -> int:
+        # Running maxima are non-decreasing, and nothing before the first
+        # maximum >= since can have a timestamp >= since.
+        lo, hi = 0, self._next_seq - self._first_seq
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._max_timestamps[(self._first_seq + mid) % self.capacity] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self._first_seq + lo
+
+    def clear(self):
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._first_seq = self._next_seq
+            self._indexes = {name: {} for name in self._index_keys}
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters describing the buffer's fill level and how many events were lost.
+        """
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "size": self._next_seq - self._first_seq,
+                "recorded": self._next_seq,
+                "dropped": self._dropped,
+                "overwritten": self._overwritten,
+            }
+
+    def __len__(self) -> int:
+        return self._next_seq - self._first_seq
@@ -0,0 +1,344 @@
+"""
+segmented.py
+------------
+A persistent, append-only trace log split into rolling segment files.
+
+Each record is a 4-byte little-endian length followed by the compact JSON form
+of the event. A record's sequence number is implied by its position: segment
+files are named after the sequence number of their first record. Every
+``index_interval`` records a sparse index entry stores the record's offset and
+the running maximum timestamp of the records before it, so time-range and
+cursor queries can seek into a segment instead of scanning it. Reads go
+through ``mmap`` so querying old segments does not load them into memory.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .base import BaseStorage, event_field, as_event_dict
+
+# Bound at import time so the log never traces its own writes when file I/O
+# tracing patches open().
+_open = open
+
+_LENGTH = struct.Struct("<I")
+SEGMENT_SUFFIX = ".log"
+INDEX_SUFFIX = ".idx"
+
+
+def _dumps(event: Dict[str, Any]) -> bytes:
+    return json.dumps(event, separators=(",", ":"), default=repr).encode("utf-8")
+
+
+class Segment:
+    """
+    Metadata for one segment file: its sequence range, size and sparse index.
+    """
+
+    __slots__ = ("path", "first_seq", "count", "size", "max_timestamp", "index")
+
+    def __init__(self, path: str, first_seq: int):
+        self.path = path
+        self.first_seq = first_seq
+        self.count = 0
+        self.size = 0
+        self.max_timestamp = float("-inf")
+        # (seq, offset, max timestamp of all earlier records in this segment)
+        self.index: List[Tuple[int, int, float]] = []
+
+    @property
+    def last_seq(self) -> int:
+        return self.first_seq + self.count - 1
+
+    def add(self, offset: int, length: int, timestamp: float, index_interval: int):
+        if self.count % index_interval == 0:
+            self.index.append((self.first_seq + self.count, offset, self.max_timestamp))
+        self.count += 1
+        self.size = offset + _LENGTH.size + length
+        if timestamp > self.max_timestamp:
+            self.max_timestamp = timestamp
+
+    def seek(self, since: Optional[float], cursor: Optional[int]) -> Tuple[int, int]:
+        """
+        Return the ``(seq, offset)`` of the furthest index entry before which
+        no record can match ``since``/``cursor``.
+        """
+        best = 0
+        if cursor is not None:
+            best = max(best, bisect_right(self.index, cursor + 1, key=lambda entry: entry[0]) - 1)
+        if since is not None:
+            best = max(best, bisect_left(self.index, since, key=lambda entry: entry[2]) - 1)
+        if not self.index:
+            return self.first_seq, 0
+        seq, offset, _ = self.index[max(best, 0)]
+        return seq, offset
+
+    def records(self, seq: int, offset: int, size: int) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yield ``(seq, payload)`` for records between ``offset`` and ``size``.
+        Each call maps the file on its own, so concurrent readers never share
+        a mapping that a writer or another reader might close.
+        """
+        if size == 0:
+            return
+        try:
+            f = _open(self.path, "rb")
+        except FileNotFoundError:
+            # Removed by retention or clear() after the reader listed it. Once
+            # open, the file stays readable even if it is removed.
+            return
+        with f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+            while offset < size:
+                (length,) = _LENGTH.unpack_from(data, offset)
+                start = offset + _LENGTH.size
+                yield seq, data[start:start + length]
+                offset = start + length
+                seq += 1
+
+    def save_index(self):
+        with _open(self.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, "w") as f:
+            json.dump({
+                "count": self.count,
+                "size": self.size,
+                "max_timestamp": self.max_timestamp,
+                "index": self.index,
+            }, f)
+
+    def load_index(self) -> bool:
+        index_path = self.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        try:
+            with _open(index_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data["size"] != os.path.getsize(self.path):
+            return False
+        self.count = data["count"]
+        self.size = data["size"]
+        self.max_timestamp = data["max_timestamp"]
+        self.index = [tuple(entry) for entry in data["index"]]
+        return True
+
+    def remove(self):
+        for path in (self.path, self.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class SegmentedLogStorage(BaseStorage):
+    """
+    Append-only event log stored as fixed-size rolling segment files in
+    ``directory``.
+
+    A new segment is started once the active one reaches ``segment_size``
+    bytes. When a segment is sealed and on startup, sealed segments older
+    than ``max_age`` seconds are deleted, then the oldest ones until the log
+    fits in ``max_bytes``; age retention also runs on every read. Existing
+    segments are picked up again on startup.
+
+    Readers list segments under the lock but read them outside it; a segment
+    deleted in between is skipped.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 16 * 1024 * 1024,
+        max_age: float = None,
+        max_bytes: int = None,
+        index_interval: int = 64,
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.index_interval = index_interval
+        self._lock = threading.Lock()
+        self._segments: List[Segment] = []
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # -- writing ---------------------------------------------------------------
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"segment-{first_seq:020d}{SEGMENT_SUFFIX}")
+
+    def _recover(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("segment-") and n.endswith(SEGMENT_SUFFIX))
+        for name in names:
+            first_seq = int(name[len("segment-"):-len(SEGMENT_SUFFIX)])
+            segment = Segment(os.path.join(self.directory, name), first_seq)
+            if not segment.load_index():
+                self._scan(segment)
+            self._segments.append(segment)
+        next_seq = self._segments[-1].last_seq + 1 if self._segments else 0
+        if self._segments and self._segments[-1].size < self.segment_size:
+            active = self._segments[-1]
+            self._file = _open(active.path, "ab")
+        else:
+            self._start_segment(next_seq)
+        self._enforce_retention()
+
+    def _scan(self, segment: Segment):
+        """
+        Rebuild a segment's metadata from its records, dropping a torn last write.
+        """
+        file_size = os.path.getsize(segment.path)
+        offset = 0
+        if file_size:
+            with _open(segment.path, "rb") as f, mmap.mmap(f.fileno(), file_size, access=mmap.ACCESS_READ) as data:
+                while offset + _LENGTH.size <= file_size:
+                    (length,) = _LENGTH.unpack_from(data, offset)
+                    end = offset + _LENGTH.size + length
+                    if end > file_size:
+                        break
+                    try:
+                        timestamp = json.loads(data[offset + _LENGTH.size:end])["timestamp"]
+                    except ValueError:
+                        break
+                    segment.add(offset, length, timestamp, self.index_interval)
+                    offset = end
+        if offset != file_size:
+            with _open(segment.path, "r+b") as f:
+                f.truncate(offset)
+        segment.size = offset
+
+    def _start_segment(self, first_seq: int):
+        segment = Segment(self._segment_path(first_seq), first_seq)
+        self._segments.append(segment)
+        self._file = _open(segment.path, "ab")
+
+    def _roll(self):
+        sealed = self._segments[-1]
+        self._file.close()
+        sealed.save_index()
+        self._start_segment(sealed.last_seq + 1)
+        self._enforce_retention()
+
+    def _expire(self):
+        """
+        Delete sealed segments last written more than ``max_age`` seconds ago.
+        """
+        if self.max_age is None:
+            return
+        cutoff = time.time() - self.max_age
+        while len(self._segments) > 1 and os.path.getmtime(self._segments[0].path) < cutoff:
+            self._segments.pop(0).remove()
+
+    def _enforce_retention(self):
+        self._expire()
+        sealed = self._segments[:-1]
+        if self.max_bytes is not None:
+            total = sum(segment.size for segment in self._segments)
+            while sealed and total > self.max_bytes:
+                segment = sealed.pop(0)
+                total -= segment.size
+                segment.remove()
+                self._segments.pop(0)
+
+    def append(self, event) -> Optional[int]:
+        event = as_event_dict(event)
+        payload = _dumps(event)
+        with self._lock:
+            segment = self._segments[-1]
+            seq = segment.first_seq + segment.count
+            offset = segment.size
+            self._file.write(_LENGTH.pack(len(payload)))
+            self._file.write(payload)
+            segment.add(offset, len(payload), event["timestamp"], self.index_interval)
+            if segment.size >= self.segment_size:
+                self._roll()
+        return seq
+
+    def flush(self, timeout: float = None):
+        """
+        Write buffered records to the active segment and ``fsync`` it, so
+        they survive a crash of the process or the machine.
+        """
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    # -- reading ---------------------------------------------------------------
+
+    def _readable_segments(self) -> List[Tuple[Segment, int]]:
+        with self._lock:
+            # A quiet log may not roll for a long time; expire on reads too.
+            self._expire()
+            self._file.flush()
+            return [(segment, segment.size) for segment in self._segments]
+
+    def query(
+        self,
+        filters: Dict[str, Any] = None,
+        since: float = None,
+        until: float = None,
+        cursor: int = None,
+        limit: int = 100,
+    ) -> Tuple[List[Tuple[int, Dict[str, Any]]], Optional[int]]:
+        filters = [(name, value) for name, value in (filters or {}).items() if value is not None]
+        results = []
+        for segment, size in self._readable_segments():
+            if segment.count == 0:
+                continue
+            if cursor is not None and segment.last_seq <= cursor:
+                continue
+            if since is not None and segment.max_timestamp < since:
+                continue
+            seq, offset = segment.seek(since, cursor)
+            for seq, payload in segment.records(seq, offset, size):
+                if cursor is not None and seq <= cursor:
+                    continue
+                event = json.loads(payload)
+                timestamp = event["timestamp"]
+                if (since is not None and timestamp < since) or (until is not None and timestamp > until):
+                    continue
+                if any(event_field(event, name) != value for name, value in filters):
+                    continue
+                if len(results) == limit:
+                    return results, results[-1][0]
+                results.append((seq, event))
+        return results, None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        events = []
+        for segment, size in self._readable_segments():
+            events.extend(json.loads(payload) for _, payload in segment.records(segment.first_seq, 0, size))
+        return events
+
+    # -- maintenance -----------------------------------------------------------
+
+    def clear(self):
+        with self._lock:
+            next_seq = self._segments[-1].last_seq + 1
+            self._file.close()
+            for segment in self._segments:
+                segment.remove()
+            self._segments = []
+            self._start_segment(next_seq)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "bytes": sum(segment.size for segment in self._segments),
+                "size": sum(segment.count for segment in self._segments),
+                "recorded": self._segments[-1].last_seq + 1,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(segment.count for segment in self._segments)
@@ -0,0 +1,266 @@
+"""
+sqlite.py
+---------
+An embedded SQLite storage backend (stdlib ``sqlite3``, WAL mode).
+
+Events are written by a background thread in batches with ``executemany``;
+the caller only assigns a sequence number and queues the event. Queries push
+filters, time ranges and cursors down into indexed SQL.
+"""
+
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from .base import BaseStorage
+
+TABLE = "trace_events"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    seq INTEGER PRIMARY KEY,
+    event_id INTEGER,
+    event_type TEXT,
+    function_name TEXT,
+    timestamp REAL,
+    duration REAL,
+    trace_id INTEGER,
+    span_id INTEGER,
+    parent_span_id INTEGER,
+    correlation_id TEXT,
+    meta TEXT
+)
+"""
+
+# Filter columns are indexed together with seq so filtered, cursor-paginated
+# queries are a single index range scan.
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS {table}_timestamp ON {table} (timestamp)",
+    "CREATE INDEX IF NOT EXISTS {table}_event_type ON {table} (event_type, seq)",
+    "CREATE INDEX IF NOT EXISTS {table}_function_name ON {table} (function_name, seq)",
+    "CREATE INDEX IF NOT EXISTS {table}_correlation_id ON {table} (correlation_id, seq)",
+)
+
+COLUMNS = (
+    "seq", "event_id", "event_type", "function_name", "timestamp", "duration",
+    "trace_id", "span_id", "parent_span_id", "correlation_id", "meta",
+)
+
+INSERT = "INSERT INTO {table} (" + ", ".join(COLUMNS) + ") VALUES (" + ", ".join("?" * len(COLUMNS)) + ")"
+
+FILTER_COLUMNS = ("event_type", "function_name", "correlation_id")
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=repr)
+
+
+def connect(path: str, table: str = TABLE) -> sqlite3.Connection:
+    """
+    Open a connection in WAL mode and make sure the table and indexes exist.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        conn.execute(SCHEMA.format(table=table))
+        for statement in INDEXES:
+            conn.execute(statement.format(table=table))
+    return conn
+
+
+def event_to_row(event: Dict[str, Any], seq: Optional[int] = None) -> tuple:
+    """
+    Flatten an event dict into a row matching ``COLUMNS``. A ``None`` seq lets
+    SQLite assign one.
+    """
+    meta = event.get("meta") or {}
+    return (
+        seq,
+        event["event_id"],
+        event["event_type"],
+        event["function_name"],
+        event["timestamp"],
+        event["duration"],
+        event.get("trace_id"),
+        event.get("span_id"),
+        event.get("parent_span_id"),
+        meta.get("correlation_id"),
+        _dumps(meta),
+    )
+
+
+def row_to_event(row: tuple) -> Tuple[int, Dict[str, Any]]:
+    """
+    Inverse of ``event_to_row``: returns ``(seq, event dict)``.
+    """
+    seq, event_id, event_type, function_name, timestamp, duration, trace_id, span_id, parent_span_id, _, meta = row
+    return seq, {
+        "event_id": event_id,
+        "event_type": event_type,
+        "function_name": function_name,
+        "timestamp": timestamp,
+        "duration": duration,
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_span_id": parent_span_id,
+        "meta": json.loads(meta),
+    }
+
+
+class _SequencedEvent:
+    """
+    Pairs a queued event with the sequence number it was assigned on append.
+    """
+
+    __slots__ = ("seq", "event")
+
+    def __init__(self, seq, event):
+        self.seq = seq
+        self.event = event
+
+
+class _SQLiteWriter:
+    """
+    Exporter used by the storage's writer thread: one transaction per batch.
+    """
+
+    def __init__(self, path: str, table: str):
+        self.path = path
+        self.table = table
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def prepare(self, item: _SequencedEvent) -> tuple:
+        event = item.event if isinstance(item.event, dict) else item.event.to_dict()
+        return event_to_row(event, item.seq)
+
+    def export(self, rows: List[tuple]):
+        if self._conn is None:
+            self._conn = connect(self.path, self.table)
+        with self._conn:
+            self._conn.executemany(INSERT.format(table=self.table), rows)
+
+    def after_fork(self):
+        self._conn = None
+
+    def shutdown(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Stores events in a SQLite database at ``path``.
+
+    ``append`` assigns the sequence number (the table's primary key) and hands
+    the event to a ``BatchExportProcessor`` whose thread inserts batches with
+    ``executemany``. Writes become visible to queries once their batch is
+    committed; ``flush()`` waits for that. Readers use one connection per
+    thread, which WAL mode lets run concurrently with the writer; those of
+    threads that have exited are closed when another thread opens one.
+    """
+
+    def __init__(self, path: str, table: str = TABLE, **writer_options):
+        # Imported here: exporters depends on the row helpers in this module.
+        from ..exporters import BatchExportProcessor
+
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+        conn = self._reader()
+        (max_seq,) = conn.execute(f"SELECT MAX(seq) FROM {table}").fetchone()
+        self._seq_lock = threading.Lock()
+        self._next_seq = 0 if max_seq is None else max_seq + 1
+        self._writer = BatchExportProcessor(_SQLiteWriter(path, table), **writer_options)
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, self.table)
+            self._local.conn = conn
+            with self._connections_lock:
+                # e.g. replaced thread-pool workers; nothing else uses their connections.
+                for thread in [t for t in self._connections if not t.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def append(self, event) -> Optional[int]:
+        # Submitted under the lock so the writer receives events in sequence
+        # order; a dropped event does not use up a sequence number.
+        with self._seq_lock:
+            seq = self._next_seq
+            if not self._writer.submit(_SequencedEvent(seq, event)):
+                return None
+            self._next_seq += 1
+        return seq
+
+    def flush(self, timeout: float = None):
+        self._writer.flush(timeout)
+
+    def query(
+        self,
+        filters: Dict[str, Any] = None,
+        since: float = None,
+        until: float = None,
+        cursor: int = None,
+        limit: int = 100,
+    ) -> Tuple[List[Tuple[int, Dict[str, Any]]], Optional[int]]:
+        clauses, params = [], []
+        for name, value in (filters or {}).items():
+            if value is None:
+                continue
+            if name not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter on {name!r}")
+            clauses.append(f"{name} = ?")
+            params.append(value)
+        if cursor is not None:
+            clauses.append("seq > ?")
+            params.append(cursor)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Fetch one extra row to know whether there is a next page.
+        rows = self._reader().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM {self.table} {where} ORDER BY seq LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+        results = [row_to_event(row) for row in rows[:limit]]
+        next_cursor = results[-1][0] if len(rows) > limit else None
+        return results, next_cursor
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        rows = self._reader().execute(f"SELECT {', '.join(COLUMNS)} FROM {self.table} ORDER BY seq").fetchall()
+        return [row_to_event(row)[1] for row in rows]
+
+    def clear(self):
+        self.flush()
+        conn = self._reader()
+        with conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> Dict[str, int]:
+        (size,) = self._reader().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        return {
+            "size": size,
+            "recorded": self._next_seq,
+            "dropped": self._writer.dropped,
+            "pending": self._writer.pending(),
+        }
+
+    def close(self):
+        self._writer.shutdown()
+        with self._connections_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+    def __len__(self) -> int:
+        return self.stats()["size"]
@@ -0,0 +1,231 @@
+"""
+subscriptions.py
+----------------
+Push-based fan-out of newly recorded events to live consumers such as the
+dashboard's WebSocket feed.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .config import SUBSCRIPTION_MAX_PENDING, SUBSCRIPTION_OVERFLOW
+from .storage import as_event_dict
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DISCONNECT)
+
+
+class SubscriptionClosed(Exception):
+    """
+    Raised by ``Subscription.next_batch`` once the subscription has been closed,
+    e.g. because the consumer fell too far behind.
+    """
+
+
+# Reads one page of stored (seq, event) rows after a cursor: (rows, next cursor).
+BackfillPage = Callable[[int], Tuple[List[Tuple[int, Any]], Optional[int]]]
+
+
+class Subscription:
+    """
+    A bounded queue of new events for one consumer running on an asyncio loop.
+
+    ``offer`` is called by ``TraceManager.record_event`` on the recording
+    thread; it checks the subscription's filters, queues the event and wakes
+    the consumer at most once per burst. When more than ``max_pending`` events
+    are waiting, ``overflow="drop_oldest"`` discards the oldest (counted in
+    ``dropped``) and ``overflow="disconnect"`` closes the subscription.
+    Backfilled events are queued separately and delivered first, outside
+    that limit.
+
+    With ``backfill_from``, stored events are read a page at a time, off the
+    loop, whenever the consumer has drained the previous page. Live events
+    wait until the backfill has caught up; if more than ``max_pending``
+    arrive meanwhile, the oldest are discarded and read from storage instead.
+    """
+
+    def __init__(
+        self,
+        filters: Dict[str, Any] = None,
+        max_pending: int = SUBSCRIPTION_MAX_PENDING,
+        overflow: str = SUBSCRIPTION_OVERFLOW,
+        loop: asyncio.AbstractEventLoop = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}; expected one of {OVERFLOW_POLICIES}")
+        self.filters = tuple((name, value) for name, value in (filters or {}).items() if value is not None)
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.dropped = 0
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        self._loop = loop or asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._pending: deque = deque()
+        self._backfill: deque = deque()
+        # Live events up to this sequence number were already backfilled.
+        self._backfill_until = -1
+        self._backfill_page: Optional[BackfillPage] = None
+        # Where the next page starts; None once the backfill has caught up.
+        self._backfill_cursor: Optional[int] = None
+        # Live events were discarded while backfilling; read past the last page.
+        self._backfill_lagging = False
+        self._lock = threading.Lock()
+        self._notified = False
+
+    def offer(self, seq: int, event) -> bool:
+        """
+        Queue an event if it matches the filters. Safe to call from any thread.
+        """
+        for name, value in self.filters:
+            if getattr(event, name) != value:
+                return False
+        return self.enqueue(seq, event)
+
+    def backfill(self, rows: List[Tuple[int, Any]]):
+        """
+        Queue already filtered ``(seq, event)`` rows read from storage on
+        subscribing. They don't count against ``max_pending``, so a backlog
+        larger than the limit is delivered in full instead of tripping the
+        overflow policy.
+        """
+        if not rows:
+            return
+        with self._lock:
+            if self.closed:
+                return
+            self._backfill.extend(rows)
+            self._backfill_until = max(self._backfill_until, rows[-1][0])
+            if self._notified:
+                return
+            self._notified = True
+        self._wake()
+
+    def backfill_from(self, page: BackfillPage, cursor: int):
+        """
+        Backfill stored events after ``cursor``, read with ``page`` from a
+        worker thread as the consumer drains them.
+        """
+        self._backfill_page = page
+        self._backfill_cursor = cursor
+
+    async def _read_backfill(self):
+        with self._lock:
+            self._backfill_lagging = False
+        rows, cursor = await asyncio.to_thread(self._backfill_page, self._backfill_cursor)
+        with self._lock:
+            if self.closed:
+                return
+            if rows:
+                self._backfill.extend(rows)
+                self._backfill_until = max(self._backfill_until, rows[-1][0])
+            if cursor is None and self._backfill_lagging:
+                # Live events were discarded during the read; keep reading after it.
+                cursor = max(self._backfill_until, self._backfill_cursor)
+            self._backfill_cursor = cursor
+            if cursor is None:
+                self._backfill_page = None
+            if self._notified or not (rows or (cursor is None and self._pending)):
+                return
+            self._notified = True
+        self._wake()
+
+    def enqueue(self, seq: int, event) -> bool:
+        """
+        Queue an event (a ``TraceEvent`` or an event dict) without checking
+        the filters.
+        """
+        with self._lock:
+            if self.closed:
+                return False
+            overflowed = len(self._pending) >= self.max_pending
+            if overflowed and self._backfill_cursor is not None:
+                # Still backfilling: the discarded event is read from storage later.
+                self._pending.popleft()
+                self._backfill_lagging = True
+                self._pending.append((seq, event))
+            elif overflowed and self.overflow == DISCONNECT:
+                self._close_locked("slow consumer: too many pending events")
+            else:
+                if overflowed:
+                    self._pending.popleft()
+                    self.dropped += 1
+                self._pending.append((seq, event))
+                if self._notified:
+                    return True
+                self._notified = True
+        self._wake()
+        return not self.closed
+
+    def _wake(self):
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # The consumer's loop is gone; nobody will read from us again.
+            with self._lock:
+                self._close_locked("event loop closed")
+
+    def _close_locked(self, reason: str):
+        self.closed = True
+        self.close_reason = reason
+        self._pending.clear()
+        self._backfill.clear()
+
+    def close(self, reason: str = "closed"):
+        with self._lock:
+            if not self.closed:
+                self._close_locked(reason)
+        self._wake()
+
+    def drain(self, max_items: int = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Remove up to ``max_items`` queued events without waiting. Returns the
+        events as dicts (oldest first) and the sequence number of the last one.
+        Must be called from the subscriber's event loop thread.
+        """
+        with self._lock:
+            backfill, pending = self._backfill, self._pending
+            if max_items is None:
+                max_items = len(backfill) + len(pending)
+            items = [backfill.popleft() for _ in range(min(max_items, len(backfill)))]
+            # Live events are held back until the backfill has caught up.
+            while pending and len(items) < max_items and self._backfill_cursor is None:
+                item = pending.popleft()
+                # Skip live events the backfill has delivered already.
+                if item[0] > self._backfill_until:
+                    items.append(item)
+            if not backfill and (not pending or self._backfill_cursor is not None):
+                self._notified = False
+                self._ready.clear()
+        if not items:
+            return [], None
+        # Backfilled and live events can overlap or interleave; order by sequence.
+        unique = dict(items)
+        last_seq = max(unique)
+        return [as_event_dict(unique[seq]) for seq in sorted(unique)], last_seq
+
+    async def next_batch(
+        self,
+        coalesce: float = 0.0,
+        max_items: int = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Wait for new events, then wait ``coalesce`` seconds more so a burst is
+        delivered as one batch. Raises ``SubscriptionClosed`` once closed.
+        """
+        while True:
+            if self.closed:
+                raise SubscriptionClosed(self.close_reason)
+            if self._backfill_cursor is not None and not self._backfill:
+                await self._read_backfill()
+                continue
+            await self._ready.wait()
+            if coalesce:
+                await asyncio.sleep(coalesce)
+            if self.closed:
+                raise SubscriptionClosed(self.close_reason)
+            events, last_seq = self.drain(max_items)
+            if events:
+                return events, last_seq
@@ -0,0 +1,377 @@
+"""
+summaries.py
+------------
+Cheap, size-capped summaries of values passed through ``ml_step``: shape,
+dtype, nbytes, null counts and sampled statistics instead of ``repr()``.
+
+Summarizers are looked up by type (walking the MRO), either by class or by
+qualified class name, so NumPy and pandas are never imported here; their
+summarizers only run on objects that already exist. Summaries of objects with
+a ``version`` function are memoized by identity and version.
+
+Containers are summarized within the byte budget as their items are added, so
+a huge or self-referencing structure is never summarized in full first.
+"""
+
+import json
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from .config import (
+    ML_SUMMARY_MAX_BYTES,
+    ML_SUMMARY_MAX_ITEMS,
+    ML_SUMMARY_MAX_DEPTH,
+    ML_SUMMARY_MAX_REPR,
+    ML_SUMMARY_SAMPLE_SIZE,
+    ML_SUMMARY_CACHE_SIZE,
+)
+
+Summarizer = Callable[[Any], Any]
+Version = Callable[[Any], Any]
+
+_ATOMIC_TYPES = (type(None), bool, int, float)
+
+# type or "module.QualName" -> (summarizer, version function or None)
+_summarizers: Dict[Union[type, str], Tuple[Summarizer, Optional[Version]]] = {}
+
+
+def register_summarizer(cls: Union[type, str], summarize: Summarizer, version: Version = None):
+    """
+    Use ``summarize`` for instances of ``cls`` (a class or a qualified name
+    such as ``"numpy.ndarray"``) and its subclasses. With ``version``, a
+    function returning a cheap token that changes when the object's content
+    does, summaries are memoized per object.
+    """
+    _summarizers[cls] = (summarize, version)
+
+
+def _lookup(value_type: type) -> Optional[Tuple[Summarizer, Optional[Version]]]:
+    for cls in value_type.__mro__:
+        entry = _summarizers.get(cls) or _summarizers.get(f"{cls.__module__}.{cls.__qualname__}")
+        if entry is not None:
+            return entry
+    return None
+
+
+def _short_repr(value: Any) -> str:
+    text = repr(value)
+    if len(text) > ML_SUMMARY_MAX_REPR:
+        return text[:ML_SUMMARY_MAX_REPR] + f"... [{len(text)} chars]"
+    return text
+
+
+class _SummaryCache:
+    """
+    LRU of summaries keyed by ``id()``. Entries hold a weak reference, so a
+    reused id never matches a dead object, and the version token it was
+    computed for.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, value: Any, version: Any):
+        with self._lock:
+            entry = self._entries.get(id(value))
+            if entry is not None and entry[0]() is value and entry[1] == version:
+                self._entries.move_to_end(id(value))
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def put(self, value: Any, version: Any, summary: Any):
+        try:
+            ref = weakref.ref(value)
+        except TypeError:
+            return
+        with self._lock:
+            self._entries[id(value)] = (ref, version, summary)
+            self._entries.move_to_end(id(value))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+_cache = _SummaryCache(ML_SUMMARY_CACHE_SIZE)
+
+
+def summary_cache_info() -> Dict[str, int]:
+    return {"hits": _cache.hits, "misses": _cache.misses, "size": len(_cache._entries)}
+
+
+def clear_summary_cache():
+    _cache.clear()
+
+
+# The summary being built on this thread: the ids of the containers it is
+# inside of, and the bytes left for the item being summarized.
+_active = threading.local()
+
+
+def summarize(value: Any, max_bytes: int = ML_SUMMARY_MAX_BYTES) -> Any:
+    """
+    Summarize ``value`` into a JSON-able structure of at most ``max_bytes``
+    (as compact JSON). Small scalars are kept as-is.
+    """
+    if getattr(_active, "path", None) is not None:
+        return _summarize(value, max_bytes)
+    _active.path = []
+    _active.budget = max_bytes
+    try:
+        return _summarize(value, max_bytes)
+    finally:
+        _active.path = None
+
+
+def _summarize(value: Any, max_bytes: int) -> Any:
+    value_type = type(value)
+    if value_type in _ATOMIC_TYPES:
+        return value
+    entry = _lookup(value_type)
+    if entry is None:
+        return _short_repr(value)
+    summarizer, version_of = entry
+    version = None
+    if version_of is not None:
+        version = version_of(value)
+        cached = _cache.get(value, version)
+        if cached is not None:
+            return cached
+    summary = summarizer(value)
+    size = _json_size(summary)
+    if size > max_bytes:
+        summary = {"type": value_type.__name__, "truncated_bytes": size}
+    if version_of is not None:
+        _cache.put(value, version, summary)
+    return summary
+
+
+def _json_size(summary: Any) -> int:
+    return len(json.dumps(summary, separators=(",", ":"), default=repr))
+
+
+def _add_items(summary: Dict[str, Any], value: Any, pairs, as_dict: bool) -> Dict[str, Any]:
+    """
+    Add summaries of a container's ``(key, item)`` pairs to ``summary`` as
+    ``items``, stopping once they would overflow the bytes left in the
+    budget (marked ``truncated``). Containers nested deeper than
+    ML_SUMMARY_MAX_DEPTH get no items, and one that contains itself is
+    marked ``cycle`` instead of being walked again.
+    """
+    path = _active.path
+    if id(value) in path:
+        summary["cycle"] = True
+        return summary
+    if len(path) >= ML_SUMMARY_MAX_DEPTH:
+        summary["truncated"] = True
+        return summary
+    # Room for the summary's other fields and the "items"/"truncated" keys.
+    budget = _active.budget - _json_size(summary) - 32
+    items = []
+    path.append(id(value))
+    try:
+        for key, item in pairs:
+            if len(items) == ML_SUMMARY_MAX_ITEMS:
+                break
+            _active.budget = budget
+            item_summary = summarize(item)
+            size = _json_size(item_summary) + (len(key) + 4 if as_dict else 1)
+            if size > budget:
+                summary["truncated"] = True
+                break
+            budget -= size
+            items.append((key, item_summary))
+    finally:
+        path.pop()
+    summary["items"] = dict(items) if as_dict else [item for _, item in items]
+    return summary
+
+
+def _summarize_str(value: Union[str, bytes]) -> Any:
+    if len(value) <= ML_SUMMARY_MAX_REPR:
+        return value if isinstance(value, str) else _short_repr(value)
+    return {"type": type(value).__name__, "len": len(value), "head": _short_repr(value[:ML_SUMMARY_MAX_REPR])}
+
+
+def _summarize_sequence(value) -> Dict[str, Any]:
+    summary = {"type": type(value).__name__, "len": len(value)}
+    return _add_items(summary, value, ((None, item) for item in value[:ML_SUMMARY_MAX_ITEMS]), as_dict=False)
+
+
+def _summarize_set(value) -> Dict[str, Any]:
+    return {"type": type(value).__name__, "len": len(value)}
+
+
+def _summarize_mapping(value: dict) -> Dict[str, Any]:
+    summary = {"type": type(value).__name__, "len": len(value)}
+    return _add_items(summary, value, ((str(key), item) for key, item in value.items()), as_dict=True)
+
+
+def _summarize_buffer(value) -> Dict[str, Any]:
+    return {"type": type(value).__name__, "nbytes": memoryview(value).nbytes}
+
+
+register_summarizer(str, _summarize_str)
+register_summarizer(bytes, _summarize_str)
+register_summarizer(list, _summarize_sequence)
+register_summarizer(tuple, _summarize_sequence)
+register_summarizer(set, _summarize_set)
+register_summarizer(frozenset, _summarize_set)
+register_summarizer(dict, _summarize_mapping)
+register_summarizer(bytearray, _summarize_buffer)
+register_summarizer(memoryview, _summarize_buffer)
+
+
+# NumPy and pandas. Their modules are taken from the values' own classes.
+#
+# Version tokens hash exactly the elements (or rows) the statistics are
+# computed from, so a memoized summary is always the one a fresh call would
+# produce: edits outside the sample can't change it.
+
+
+def _sample_indices(np, size: int):
+    if size <= ML_SUMMARY_SAMPLE_SIZE:
+        return None
+    return np.linspace(0, size - 1, ML_SUMMARY_SAMPLE_SIZE).astype(np.intp)
+
+
+def _ndarray_sample(np, array):
+    """
+    The flat elements summarized for ``array`` and the sample indices (None
+    when the whole array is used).
+    """
+    indices = _sample_indices(np, array.size)
+    sample = array.reshape(-1) if indices is None else array.flat[indices]
+    return np.asarray(sample).reshape(-1), indices
+
+
+def _array_stats(np, sample) -> Dict[str, Any]:
+    """
+    Vectorized null count and min/max/mean/std over a 1-d sample.
+    """
+    kind = sample.dtype.kind
+    stats: Dict[str, Any] = {}
+    if kind in "fc":
+        nulls = np.isnan(sample)
+        stats["nulls"] = int(nulls.sum())
+        sample = sample[~nulls]
+    elif kind == "O":
+        stats["nulls"] = int(sum(item is None for item in sample))
+        return stats
+    if kind in "biuf" and sample.size:
+        stats["min"] = sample.min().item()
+        stats["max"] = sample.max().item()
+        stats["mean"] = float(sample.mean())
+        stats["std"] = float(sample.std())
+    return stats
+
+
+def _summarize_ndarray(array) -> Dict[str, Any]:
+    import numpy as np  # already imported: we were given an ndarray
+
+    summary = {
+        "type": "ndarray",
+        "shape": list(array.shape),
+        "dtype": str(array.dtype),
+        "nbytes": int(array.nbytes),
+    }
+    if array.size:
+        sample, indices = _ndarray_sample(np, array)
+        if indices is not None:
+            summary["sampled"] = int(indices.size)
+        summary.update(_array_stats(np, sample))
+    return summary
+
+
+def _ndarray_version(array) -> tuple:
+    """
+    Layout plus, for writable arrays, a CRC of the sampled elements.
+    """
+    import numpy as np
+
+    pointer = array.__array_interface__["data"][0]
+    layout = (pointer, array.shape, array.strides, array.dtype.str)
+    if not array.flags.writeable or not array.size:
+        return layout
+    sample, _ = _ndarray_sample(np, array)
+    return layout + (zlib.crc32(np.ascontiguousarray(sample).tobytes()),)
+
+
+def _summarize_dataframe(frame) -> Dict[str, Any]:
+    import numpy as np
+
+    rows = len(frame)
+    indices = _sample_indices(np, rows)
+    sample = frame if indices is None else frame.iloc[indices]
+    columns = {}
+    for name in list(frame.columns)[:ML_SUMMARY_MAX_ITEMS]:
+        column = sample[name]
+        values = column.to_numpy()
+        stats = {"dtype": str(column.dtype)}
+        if values.dtype.kind == "O":
+            stats["nulls"] = int(column.isna().sum())
+        else:
+            stats.update(_array_stats(np, values))
+        columns[str(name)] = stats
+    summary = {
+        "type": type(frame).__name__,
+        "shape": list(frame.shape),
+        "nbytes": int(frame.memory_usage(index=True, deep=False).sum()),
+        "columns": columns,
+    }
+    if indices is not None:
+        summary["sampled"] = int(indices.size)
+    return summary
+
+
+def _summarize_series(series) -> Dict[str, Any]:
+    import numpy as np
+
+    indices = _sample_indices(np, len(series))
+    sample = series if indices is None else series.iloc[indices]
+    values = sample.to_numpy()
+    summary = {
+        "type": "Series",
+        "len": len(series),
+        "dtype": str(series.dtype),
+        "nbytes": int(series.memory_usage(index=True, deep=False)),
+    }
+    if values.dtype.kind == "O":
+        summary["nulls"] = int(sample.isna().sum())
+    else:
+        summary.update(_array_stats(np, values))
+    if indices is not None:
+        summary["sampled"] = int(indices.size)
+    return summary
+
+
+def _pandas_version(obj) -> tuple:
+    """
+    Shape, dtypes and a CRC of the hashed values of the sampled rows.
+    """
+    import numpy as np
+    import pandas as pd  # already imported: we were given a pandas object
+
+    indices = _sample_indices(np, len(obj))
+    sample = obj if indices is None else obj.iloc[indices]
+    try:
+        digest = zlib.crc32(pd.util.hash_pandas_object(sample, index=False).to_numpy().tobytes())
+    except TypeError:  # unhashable objects, e.g. lists, in an object column
+        digest = zlib.crc32(repr(sample.to_numpy().tolist()).encode())
+    return (obj.shape, str(getattr(obj, "dtypes", obj.dtype)), digest)
+
+
+register_summarizer("numpy.ndarray", _summarize_ndarray, version=_ndarray_version)
+register_summarizer("pandas.core.frame.DataFrame", _summarize_dataframe, version=_pandas_version)
+register_summarizer("pandas.core.series.Series", _summarize_series, version=_pandas_version)
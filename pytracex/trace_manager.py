@@ -4,47 +4,159 @@ trace_manager.py
 Manages trace/audit events. Supports correlation IDs, etc.
 """
 
+import os
+import sys
 import time
 import json
-import uuid
-from typing import Any, Dict, List
-from .config import TRACE_STORAGE, LOGGER
-from .context import get_correlation_id
+import atexit
+import threading
+from operator import attrgetter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .config import (
+    LOGGER,
+    TRACE_STORAGE_BACKEND,
+    TRACE_STORAGE_CAPACITY,
+    TRACE_STORAGE_OVERFLOW,
+    TRACE_SEGMENT_DIR,
+    TRACE_SEGMENT_SIZE,
+    TRACE_RETENTION_MAX_AGE,
+    TRACE_RETENTION_MAX_BYTES,
+    TRACE_SQLITE_PATH,
+    METRICS_ENABLED,
+    SUBSCRIPTION_BACKFILL_PAGE_SIZE,
+)
+from .context import get_correlation_id, get_current_span, SpanContext
+from .utils.ids import next_id as next_event_id
+from .storage import BaseStorage, RingBufferStorage, SegmentedLogStorage, SQLiteStorage, as_event_dict
+from .exporters import Exporter, BatchExportProcessor
+from .spans import SpanNode, build_span_trees
+from .subscriptions import Subscription
+from .metrics import MetricsRegistry
+from .errors import ErrorRegistry, describe
+from .profiler import SamplingProfiler
+from . import sampling
 
 class TraceEvent:
     """
     Represents a single trace or audit event.
+
+    Events are slotted and keep the correlation ID in its own attribute; the
+    dict form is only built when ``to_dict()`` is called by a consumer.
+
+    Every event is a node in a span tree. Decorated calls pass their own
+    ``span``; other events become leaf spans under the active span, reusing
+    their event ID as span ID.
     """
 
+    __slots__ = (
+        "event_id",
+        "event_type",
+        "function_name",
+        "timestamp",
+        "duration",
+        "meta",
+        "correlation_id",
+        "trace_id",
+        "span_id",
+        "parent_span_id",
+    )
+
     def __init__(
         self,
         event_type: str,
         function_name: str = "",
         timestamp: float = None,
         duration: float = 0.0,
-        meta: Dict[str, Any] = None
+        meta: Dict[str, Any] = None,
+        span: SpanContext = None
     ):
-        self.event_id = str(uuid.uuid4())
-        self.event_type = event_type
-        self.function_name = function_name
+        self.event_id = next_event_id()
+        self.event_type = sys.intern(event_type)
+        self.function_name = sys.intern(function_name)
         self.timestamp = timestamp or time.time()
         self.duration = duration
-        self.meta = meta or {}
+        self.meta = meta
         # Attach correlation ID automatically if present in context
-        self.meta["correlation_id"] = get_correlation_id()
+        self.correlation_id = get_correlation_id()
+        if span is not None:
+            self.trace_id = span.trace_id
+            self.span_id = span.span_id
+            self.parent_span_id = span.parent_span_id
+        else:
+            parent = get_current_span()
+            self.span_id = self.event_id
+            if parent is None:
+                self.trace_id = self.event_id
+                self.parent_span_id = None
+            else:
+                self.trace_id = parent.trace_id
+                self.parent_span_id = parent.span_id
 
     def to_dict(self) -> Dict[str, Any]:
+        meta = dict(self.meta) if self.meta else {}
+        meta["correlation_id"] = self.correlation_id
         return {
             "event_id": self.event_id,
             "event_type": self.event_type,
             "function_name": self.function_name,
             "timestamp": self.timestamp,
             "duration": self.duration,
-            "meta": self.meta
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "meta": meta
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TraceEvent":
+        """
+        Rebuild an event from ``to_dict()`` output, keeping its IDs (e.g. for
+        events received from another process).
+        """
+        event = cls.__new__(cls)
+        meta = dict(data.get("meta") or {})
+        event.correlation_id = meta.pop("correlation_id", None)
+        event.meta = meta
+        event.event_id = data["event_id"]
+        event.event_type = sys.intern(data["event_type"])
+        event.function_name = sys.intern(data["function_name"])
+        event.timestamp = data["timestamp"]
+        event.duration = data["duration"]
+        event.trace_id = data.get("trace_id")
+        event.span_id = data.get("span_id")
+        event.parent_span_id = data.get("parent_span_id")
+        return event
+
     def __repr__(self):
-        return f"<TraceEvent {self.event_id} ({self.event_type} - {self.function_name})>"
+        return f"<TraceEvent {self.event_id:016x} ({self.event_type} - {self.function_name})>"
+
+
+# Event fields that can be used as query filters.
+INDEXED_FIELDS = ("event_type", "function_name", "correlation_id")
+
+
+def create_storage(backend: str = None) -> BaseStorage:
+    """
+    Build the storage backend named by ``backend`` (default: TRACE_STORAGE_BACKEND).
+    """
+    backend = backend or TRACE_STORAGE_BACKEND
+    if backend == "memory":
+        return RingBufferStorage(
+            TRACE_STORAGE_CAPACITY,
+            TRACE_STORAGE_OVERFLOW,
+            indexes={name: attrgetter(name) for name in INDEXED_FIELDS},
+            timestamp_key=attrgetter("timestamp"),
+        )
+    if backend == "segmented":
+        return SegmentedLogStorage(
+            TRACE_SEGMENT_DIR,
+            segment_size=TRACE_SEGMENT_SIZE,
+            max_age=TRACE_RETENTION_MAX_AGE,
+            max_bytes=TRACE_RETENTION_MAX_BYTES,
+        )
+    if backend == "sqlite":
+        return SQLiteStorage(TRACE_SQLITE_PATH)
+    raise ValueError(f"Unknown storage backend {backend!r}")
 
 
 class TraceManager:
@@ -53,25 +165,289 @@ class TraceManager:
     """
 
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(TraceManager, cls).__new__(cls)
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super(TraceManager, cls).__new__(cls)
         return cls._instance
 
     def __init__(self):
-        self._storage = TRACE_STORAGE
+        # __init__ runs on every TraceManager() call; only set up the singleton once.
+        if getattr(self, "_initialized", False):
+            return
+        self._storage = create_storage()
+        # Replaced (never mutated) so record_event can iterate without a lock.
+        self._processors = ()
+        self._processors_lock = threading.Lock()
+        self._subscriptions = ()
+        self._stages = ()
+        self.metrics = MetricsRegistry()
+        self.errors = ErrorRegistry()
+        self.profiler: Optional[SamplingProfiler] = None
+        atexit.register(self.shutdown)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+        self._initialized = True
+
+    def _reset_after_fork(self):
+        """
+        Start a forked child with empty in-memory storage, no subscriptions and
+        fresh locks. The parent's backend is left untouched: persistent
+        backends are not safe to share between writer processes, and workers
+        that need a combined view should ship events to a collector.
+        Exporter and stage threads are restarted by ``exporters``.
+        """
+        TraceManager._instance_lock = threading.Lock()
+        self._processors_lock = threading.Lock()
+        self._subscriptions = ()
+        self._storage = create_storage("memory")
+        self.metrics._reset_after_fork()
+        self.errors._reset_after_fork()
+        if self.profiler is not None:
+            self.profiler._reset_after_fork()
 
     def record_event(self, event: TraceEvent):
-        LOGGER.info(f"Recording event {event.event_id} ({event.event_type}).")
-        self._storage.append(event.to_dict())
+        LOGGER.debug("Recording event %s (%s).", event.event_id, event.event_type)
+        if METRICS_ENABLED:
+            self.metrics.record(
+                event.event_type, event.function_name, event.duration, bool(event.meta and "error" in event.meta)
+            )
+        if sampling._pending and sampling.offer(event, self._store):
+            return
+        self._store(event)
+
+    def _store(self, event: TraceEvent):
+        seq = self._storage.append(event)
+        for processor in self._processors:
+            processor.submit(event)
+        if seq is not None:
+            for subscription in self._subscriptions:
+                subscription.offer(seq, event)
+
+    def capture_exception(self, exc: BaseException, function_name: str = "") -> Dict[str, Any]:
+        """
+        Count ``exc`` under its fingerprint and return the meta fields for the
+        failed call's event: ``error``, ``error_fingerprint`` and, the first
+        time a fingerprint is seen, an ``error_stack`` summary. Repeats are
+        only counted (see ``get_errors``).
+        """
+        record, first = self.errors.capture(exc, function_name)
+        meta = {"error": describe(exc), "error_fingerprint": record.fingerprint}
+        if first:
+            meta["error_stack"] = record.stack
+        return meta
+
+    def add_exporter(self, exporter: Exporter, **options) -> BatchExportProcessor:
+        """
+        Ship every recorded event to ``exporter`` from a background thread.
+        Keyword options are passed to ``BatchExportProcessor``.
+        """
+        processor = BatchExportProcessor(exporter, **options)
+        with self._processors_lock:
+            self._processors = self._processors + (processor,)
+        return processor
+
+    def add_stage(self, processor: BatchExportProcessor):
+        """
+        Register a background processor that records events into this manager
+        (e.g. the audit signer), so ``flush`` and ``shutdown`` drain it before
+        the exporters and storage.
+        """
+        with self._processors_lock:
+            self._stages = self._stages + (processor,)
+
+    def remove_exporter(self, processor: BatchExportProcessor):
+        """
+        Detach an exporter, exporting anything still queued for it first.
+        """
+        with self._processors_lock:
+            self._processors = tuple(p for p in self._processors if p is not processor)
+        processor.shutdown()
+
+    def subscribe(self, cursor: int = None, **options) -> Subscription:
+        """
+        Receive newly recorded events on the calling asyncio loop.
+
+        Filters (``event_type``, ``function_name``, ``correlation_id``) and
+        ``Subscription`` options are passed as keywords. With ``cursor``, stored
+        events after that sequence number are delivered first, however many
+        there are. They are read SUBSCRIPTION_BACKFILL_PAGE_SIZE at a time, off
+        the event loop, as the subscriber drains them.
+        """
+        filters = {name: options.pop(name, None) for name in INDEXED_FIELDS}
+        subscription = Subscription(filters=filters, **options)
+        if cursor is not None:
+            storage = self._storage
+
+            def page(after: int):
+                return storage.query(filters, cursor=after, limit=SUBSCRIPTION_BACKFILL_PAGE_SIZE)
+
+            subscription.backfill_from(page, cursor)
+        with self._processors_lock:
+            self._subscriptions = self._subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._processors_lock:
+            self._subscriptions = tuple(s for s in self._subscriptions if s is not subscription)
+        subscription.close("unsubscribed")
+
+    def flush(self, timeout: Optional[float] = None):
+        """
+        Block until all queued events have been recorded, handed to their
+        exporters and written by the storage backend.
+        """
+        for stage in self._stages:
+            stage.flush(timeout)
+        for processor in self._processors:
+            processor.flush(timeout)
+        self.flush_storage(timeout)
+
+    def flush_storage(self, timeout: Optional[float] = None):
+        """
+        Block until recorded events are visible to queries.
+        """
+        self._storage.flush(timeout)
+
+    def shutdown(self):
+        """
+        Flush and stop all stages and exporters. Registered with ``atexit``.
+        """
+        with self._processors_lock:
+            stages, self._stages = self._stages, ()
+            processors, self._processors = self._processors, ()
+        for stage in stages:
+            stage.shutdown()
+        for processor in processors:
+            processor.shutdown()
+        self.stop_profiler()
+        self._storage.close()
 
     def get_events(self) -> List[Dict[str, Any]]:
-        return self._storage
+        """
+        Return a snapshot of the stored events as dicts, oldest first.
+        """
+        return [as_event_dict(event) for event in self._storage.snapshot()]
+
+    def query(
+        self,
+        event_type: str = None,
+        function_name: str = None,
+        correlation_id: str = None,
+        since: float = None,
+        until: float = None,
+        cursor: int = None,
+        limit: int = 100
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Return one page of matching events (oldest first) and the cursor for
+        the next page, or None if there are no more matches yet.
+        """
+        rows, next_cursor = self._storage.query(
+            filters={
+                "event_type": event_type,
+                "function_name": function_name,
+                "correlation_id": correlation_id,
+            },
+            since=since,
+            until=until,
+            cursor=cursor,
+            limit=limit,
+        )
+        return [as_event_dict(event) for _, event in rows], next_cursor
+
+    def iter_events(self, page_size: int = 500, **filters) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over all matching events page by page, so only one page is
+        materialized at a time. Accepts the same filters as ``query``.
+        """
+        cursor = filters.pop("cursor", None)
+        while True:
+            events, cursor = self.query(cursor=cursor, limit=page_size, **filters)
+            yield from events
+            if cursor is None:
+                return
+
+    def span_trees(
+        self,
+        events: List[Dict[str, Any]] = None,
+        correlation_id: str = None
+    ) -> Dict[int, List[SpanNode]]:
+        """
+        Rebuild span trees, keyed by trace ID, from ``events`` (default: the
+        stored events), optionally limited to one correlation ID.
+        """
+        if events is None:
+            events = self.get_events()
+        if correlation_id is not None:
+            events = [e for e in events if e["meta"].get("correlation_id") == correlation_id]
+        return build_span_trees(events)
+
+    def set_storage(self, storage: BaseStorage) -> BaseStorage:
+        """
+        Swap the storage backend. Returns the previous one, which is not closed.
+        """
+        previous, self._storage = self._storage, storage
+        return previous
+
+    def storage_stats(self) -> Dict[str, int]:
+        """
+        Fill level and dropped/overwritten counters of the event store.
+        """
+        return self._storage.stats()
+
+    def get_metrics(self) -> List[Dict[str, Any]]:
+        """
+        Per-(event_type, function_name) counts, error counts, sum, min/max,
+        mean and p50/p95/p99 durations.
+        """
+        return self.metrics.snapshot()
+
+    def metrics_to_prometheus(self) -> str:
+        return self.metrics.to_prometheus()
+
+    def reset_metrics(self):
+        self.metrics.reset()
+
+    def start_profiler(self, **options) -> SamplingProfiler:
+        """
+        Start sampling the stacks of all threads in the background, tagged
+        with their correlation ID and span. Options are passed to
+        ``SamplingProfiler``; starting again replaces the previous profiler.
+        """
+        self.stop_profiler()
+        self.profiler = SamplingProfiler(**options).start()
+        return self.profiler
+
+    def stop_profiler(self) -> Optional[SamplingProfiler]:
+        """
+        Stop the profiler and return it; its samples stay available, e.g.
+        through ``to_folded()``.
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.stop()
+        return profiler
+
+    def get_errors(self) -> List[Dict[str, Any]]:
+        """
+        One entry per distinct error (fingerprint) with its occurrence count,
+        most frequent first.
+        """
+        return self.errors.snapshot()
+
+    def reset_errors(self):
+        self.errors.reset()
 
     def clear_events(self):
         LOGGER.info("Clearing all trace events.")
+        # Drain stages first so their pending events don't reappear afterwards.
+        for stage in self._stages:
+            stage.flush()
         self._storage.clear()
 
     def to_json(self) -> str:
-        return json.dumps(self._storage, indent=2)
+        return json.dumps(self.get_events(), indent=2)
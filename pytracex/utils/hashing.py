@@ -2,22 +2,77 @@
 hashing.py
 ----------
 Provides tamper-proof hashing for trace events.
+
+Audit events form a hash chain: each one is signed with an HMAC over its own
+canonical serialization and the previous event's signature, so removing,
+reordering or editing any stored event breaks the chain from that point on.
 """
 
 import hashlib
 import hmac
-from typing import Dict, Union
+import itertools
+import json
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from ..config import DEFAULT_SECRET_KEY
+from ..storage import as_event_dict
+
+GENESIS_HASH = "0" * 64
+
+# Meta keys written by AuditChain.
+CHAIN_FIELDS = ("chain_id", "chain_index", "prev_hash", "signature")
+
+
+def _json_key(key: Any) -> str:
+    # The string json.dumps writes for a dict key.
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, (bool, int, float)):
+        return json.dumps(key)
+    return repr(key)
+
+
+def _string_keys(data: Any) -> Any:
+    """
+    ``data`` with every dict key replaced by the string JSON stores it as.
+    Later keys win on collisions, as when the stored JSON is read back.
+    """
+    if isinstance(data, dict):
+        return {_json_key(key): _string_keys(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_string_keys(value) for value in data]
+    return data
+
+
+def canonical_bytes(data: Any) -> bytes:
+    """
+    Serialize ``data`` deterministically: sorted keys, compact separators,
+    tuples as lists. Values JSON can't represent fall back to ``repr``, as in
+    the persistent storage backends, so an event hashes the same before and
+    after a round trip through storage. Dicts whose keys can't be sorted
+    against each other (e.g. ``{1: "a", "b": 2}``) are sorted by their JSON
+    key strings.
+    """
+    try:
+        text = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=repr)
+    except TypeError:
+        text = json.dumps(_string_keys(data), sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=repr)
+    return text.encode("utf-8")
+
+
+def _key_bytes(secret_key: Union[str, bytes]) -> bytes:
+    return secret_key.encode("utf-8") if isinstance(secret_key, str) else secret_key
+
 
 def sign_event(event_data: Dict, secret_key: Union[str, bytes] = DEFAULT_SECRET_KEY) -> str:
     """
     Generate a cryptographic signature for an event.
     """
-    if isinstance(secret_key, str):
-        secret_key = secret_key.encode("utf-8")
-    
-    message = str(event_data).encode("utf-8")
-    return hmac.new(secret_key, message, hashlib.sha256).hexdigest()
+    return hmac.new(_key_bytes(secret_key), canonical_bytes(event_data), hashlib.sha256).hexdigest()
+
 
 def verify_signature(event_data: Dict, signature: str, secret_key: Union[str, bytes] = DEFAULT_SECRET_KEY) -> bool:
     """
@@ -25,3 +80,196 @@ def verify_signature(event_data: Dict, signature: str, secret_key: Union[str, by
     """
     expected_sig = sign_event(event_data, secret_key)
     return hmac.compare_digest(expected_sig, signature)
+
+
+def audit_payload(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The content of an event dict covered by its chained signature: type,
+    function, timing and meta, minus the chain fields themselves.
+    """
+    meta = {key: value for key, value in (event.get("meta") or {}).items() if key not in CHAIN_FIELDS}
+    return {
+        "event_type": event["event_type"],
+        "function_name": event["function_name"],
+        "timestamp": event["timestamp"],
+        "duration": event["duration"],
+        "meta": meta,
+    }
+
+
+def chain_signature(
+    content_digest: bytes, chain_id: str, index: int, prev_hash: str, secret_key: Union[str, bytes]
+) -> str:
+    """
+    HMAC over a chain link: the chain position, the previous signature and the
+    SHA-256 digest of the event's canonical content.
+    """
+    link = f"{chain_id}:{index}:{prev_hash}:".encode("ascii")
+    return hmac.new(_key_bytes(secret_key), link + content_digest, hashlib.sha256).hexdigest()
+
+
+def content_digest(event: Dict[str, Any]) -> bytes:
+    return hashlib.sha256(canonical_bytes(audit_payload(event))).digest()
+
+
+class AuditChain:
+    """
+    Links audit events into an HMAC chain.
+
+    ``seal`` stamps an event's meta with the chain ID (random per chain, so
+    several process lifetimes can share one store), its index, the previous
+    signature and its own signature. The event content is serialized and
+    digested outside the lock; only the small link HMAC is computed under it.
+    """
+
+    def __init__(self, secret_key: Union[str, bytes] = DEFAULT_SECRET_KEY, chain_id: str = None):
+        self.secret_key = _key_bytes(secret_key)
+        self.chain_id = chain_id or os.urandom(8).hex()
+        self._lock = threading.Lock()
+        self._index = 0
+        self._prev_hash = GENESIS_HASH
+        _chains.add(self)
+
+    def _restart_after_fork(self):
+        # Parent and child would otherwise both extend the same chain.
+        self.chain_id = os.urandom(8).hex()
+        self._lock = threading.Lock()
+        self._index = 0
+        self._prev_hash = GENESIS_HASH
+
+    def seal(self, event, digest: bytes = None) -> str:
+        """
+        Add the chain fields to ``event.meta`` and return its signature.
+        ``digest`` is the event's ``content_digest`` if already computed.
+        """
+        return self.seal_batch([event], None if digest is None else [digest])[0]
+
+    def seal_batch(self, events: List, digests: List[bytes] = None) -> List[str]:
+        """
+        Seal ``events`` as consecutive links, taking the lock once per batch.
+        Nothing is linked if any event's content can't be digested.
+        """
+        if digests is None:
+            digests = [content_digest(event.to_dict()) for event in events]
+        links = []
+        with self._lock:
+            for digest in digests:
+                index, prev_hash = self._index, self._prev_hash
+                signature = chain_signature(digest, self.chain_id, index, prev_hash, self.secret_key)
+                self._index += 1
+                self._prev_hash = signature
+                links.append((index, prev_hash, signature))
+        for event, (index, prev_hash, signature) in zip(events, links):
+            meta = event.meta
+            meta["chain_id"] = self.chain_id
+            meta["chain_index"] = index
+            meta["prev_hash"] = prev_hash
+            meta["signature"] = signature
+        return [signature for _, _, signature in links]
+
+
+_chains: "weakref.WeakSet[AuditChain]" = weakref.WeakSet()
+
+
+def _restart_chains_after_fork():
+    for chain in list(_chains):
+        chain._restart_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_chains_after_fork)
+
+
+def _check_chunk(events: List[Dict[str, Any]], secret_key: bytes) -> List[Tuple]:
+    """
+    Pool worker: recompute each event's signature from its own stored
+    ``prev_hash``. Links between events are checked afterwards in the parent.
+    """
+    checked = []
+    for event in events:
+        meta = event.get("meta") or {}
+        signature = meta.get("signature")
+        prev_hash = meta.get("prev_hash")
+        chain_id = meta.get("chain_id")
+        index = meta.get("chain_index")
+        valid = None not in (signature, prev_hash, chain_id, index) and hmac.compare_digest(
+            chain_signature(content_digest(event), chain_id, index, prev_hash, secret_key), signature
+        )
+        checked.append((chain_id, index, prev_hash, signature, valid, event.get("event_id"), event.get("timestamp")))
+    return checked
+
+
+def _chunks(events: Iterable, size: int):
+    iterator = iter(events)
+    while True:
+        chunk = [as_event_dict(event) for event in itertools.islice(iterator, size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def verify_log(
+    events: Iterable = None,
+    secret_key: Union[str, bytes] = DEFAULT_SECRET_KEY,
+    processes: Optional[int] = None,
+    chunk_size: int = 10_000,
+) -> Dict[str, Any]:
+    """
+    Verify the hash chains in ``events`` (default: every ``audit_call`` event
+    in the TraceManager's storage).
+
+    Signatures are recomputed in a process pool, ``chunk_size`` events per
+    task; logs that fit in one chunk, or ``processes`` <= 1, are checked inline.
+    Each chain is then walked in index order. A chain may start mid-way (older
+    events evicted by retention), but must have no gaps after that. Returns
+    ``{"valid", "checked", "chains", "first_broken"}``, where ``first_broken``
+    describes the earliest bad link across all chains, by event timestamp: its
+    chain ID, index, event ID and reason.
+    """
+    if events is None:
+        from ..trace_manager import TraceManager
+        events = TraceManager().iter_events(event_type="audit_call")
+    secret_key = _key_bytes(secret_key)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    chunks = _chunks(events, chunk_size)
+    first = next(chunks, [])
+    second = next(chunks, None)
+    all_chunks = itertools.chain([first] if second is None else [first, second], chunks)
+    if second is None or processes <= 1:
+        checked = map(_check_chunk, all_chunks, itertools.repeat(secret_key))
+        results = [item for chunk in checked for item in chunk]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            checked = pool.map(_check_chunk, all_chunks, itertools.repeat(secret_key))
+            results = [item for chunk in checked for item in chunk]
+
+    # Walk each chain in order; report the earliest break across chains.
+    results.sort(key=lambda item: (str(item[0]), item[1] if item[1] is not None else -1))
+    broken = None
+    broken_at = None
+    chains = 0
+    previous = None
+    for chain_id, index, prev_hash, signature, valid, event_id, timestamp in results:
+        reason = None
+        if chain_id is None or index is None:
+            reason = "missing chain fields"
+        elif not valid:
+            reason = "signature mismatch"
+        elif previous is not None and previous[0] == chain_id and previous[1] is not None:
+            if index != previous[1] + 1:
+                reason = f"missing events {previous[1] + 1}..{index - 1}" if index > previous[1] else "duplicate index"
+            elif prev_hash != previous[2]:
+                reason = "prev_hash does not match previous signature"
+        elif index == 0 and prev_hash != GENESIS_HASH:
+            reason = "chain does not start at genesis"
+        if previous is None or previous[0] != chain_id:
+            chains += 1
+        previous = (chain_id, index, signature)
+        if reason is not None:
+            at = (timestamp if isinstance(timestamp, (int, float)) else float("inf"), event_id or 0)
+            if broken is None or at < broken_at:
+                broken_at = at
+                broken = {"chain_id": chain_id, "chain_index": index, "event_id": event_id, "reason": reason}
+    return {"valid": broken is None, "checked": len(results), "chains": chains, "first_broken": broken}
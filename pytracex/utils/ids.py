@@ -0,0 +1,40 @@
+"""
+ids.py
+------
+Cheap, process-unique 64-bit identifiers for events and spans.
+"""
+
+import itertools
+import os
+
+# A random per-process prefix in the top bits and a monotonic counter in the
+# low 40 bits. The prefix is 23 bits so IDs stay positive signed 64-bit
+# integers (e.g. for SQLite). next() on itertools.count is atomic under the
+# GIL, so no lock is needed.
+_COUNTER_BITS = 40
+
+
+def _new_process_prefix() -> int:
+    return (int.from_bytes(os.urandom(3), "big") >> 1) << _COUNTER_BITS
+
+
+_process_prefix = _new_process_prefix()
+_counter = itertools.count(1)
+
+
+def _reset_after_fork():
+    # A forked child must not reuse its parent's prefix, or IDs would collide.
+    global _process_prefix, _counter
+    _process_prefix = _new_process_prefix()
+    _counter = itertools.count(1)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def next_id() -> int:
+    """
+    Return a new process-unique 64-bit ID.
+    """
+    return _process_prefix | next(_counter)
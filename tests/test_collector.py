@@ -0,0 +1,94 @@
+import os
+import time
+import pytest
+from pytracex.collector import CollectorServer, connect_collector
+from pytracex.decorators import trace
+from pytracex.trace_manager import TraceManager, TraceEvent
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork and Unix sockets")
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+def test_event_round_trips_through_dict():
+    event = TraceEvent(event_type="t", function_name="f", meta={"x": 1})
+    event.correlation_id = "cid"
+    assert TraceEvent.from_dict(event.to_dict()).to_dict() == event.to_dict()
+
+def test_forked_workers_ship_events_to_collector(tmp_path):
+    class Sink:
+        def __init__(self):
+            self.events = []
+
+        def record_event(self, event):
+            self.events.append(event)
+
+    sink = Sink()
+    path = str(tmp_path / "collector.sock")
+    manager = TraceManager()
+    with CollectorServer(path, manager=sink) as server:
+        processor = connect_collector(path, flush_interval=0.05)
+        try:
+            @trace
+            def work(i):
+                return i
+
+            pids = []
+            for worker in range(3):
+                pid = os.fork()
+                if pid == 0:
+                    # Child: fresh storage and threads; ship 10 events, then exit.
+                    code = 0 if manager.get_events() == [] else 1
+                    for i in range(10):
+                        work(i)
+                    manager.flush()
+                    os._exit(code)
+                pids.append(pid)
+            for pid in pids:
+                _, status = os.waitpid(pid, 0)
+                assert os.WEXITSTATUS(status) == 0
+
+            _wait_for(lambda: server.received == 30)
+        finally:
+            manager.remove_exporter(processor)
+
+    assert {e.function_name for e in sink.events} == {"work"}
+    # Each child drew a new ID prefix after fork.
+    assert len({e.event_id >> 40 for e in sink.events}) == 3
+    assert len({e.event_id for e in sink.events}) == 30
+
+def test_collector_socket_permissions_and_malformed_frames(tmp_path):
+    import socket
+    import stat
+    from pytracex.collector import CollectorExporter, _HEADER
+
+    class Sink:
+        def __init__(self):
+            self.events = []
+
+        def record_event(self, event):
+            self.events.append(event)
+
+    sink = Sink()
+    path = str(tmp_path / "private" / "collector.sock")
+    with CollectorServer(path, manager=sink) as server:
+        assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+        for payload in (b'[{"event_type": "x"}]', b'{"a": 1}', b"[1]"):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+            sock.sendall(_HEADER.pack(len(payload)) + payload)
+            # The server drops the connection without recording anything.
+            assert sock.recv(1) == b""
+            sock.close()
+
+        exporter = CollectorExporter(path)
+        exporter.export([TraceEvent(event_type="ok", function_name="f").to_dict()])
+        _wait_for(lambda: server.received == 1)
+        exporter.shutdown()
+    assert [e.event_type for e in sink.events] == ["ok"]
@@ -0,0 +1,98 @@
+import pytest
+from pytracex.trace_manager import TraceManager
+from pytracex.decorators import trace
+
+np = pytest.importorskip("numpy")
+from pytracex.columnar import to_columns, export_columnar, load_columnar, latency_percentiles
+
+def _event(event_type, function_name, duration, **meta):
+    return {
+        "event_id": 1,
+        "event_type": event_type,
+        "function_name": function_name,
+        "timestamp": 100.0,
+        "duration": duration,
+        "trace_id": 1,
+        "span_id": 2,
+        "parent_span_id": None,
+        "meta": meta,
+    }
+
+def test_to_columns_types_and_flattened_meta():
+    events = [
+        _event("function_call", "a", 0.1, status=200, ok=True, request={"path": "/x"}),
+        _event("http_request", "b", 0.2, status=500, ratio=0.5),
+        _event("function_call", "a", 0.3, correlation_id="c1", ok=False),
+    ]
+    columns = to_columns(events)
+
+    assert len(columns) == 3
+    assert columns["duration"].dtype == np.float64
+    assert columns["parent_span_id"].tolist() == [-1, -1, -1]
+    assert columns.categories["event_type"] == ["function_call", "http_request"]
+    assert columns["event_type"].tolist() == [0, 1, 0]
+    assert columns.decode("correlation_id") == [None, None, "c1"]
+    # A key missing from some events: floats with NaN instead of ints.
+    assert columns.kinds["meta.status"] == "float64"
+    assert np.isnan(columns["meta.status"][2])
+    assert columns.decode("meta.request.path") == ["/x", None, None]
+    assert columns.kinds["meta.ratio"] == "float64"
+
+def test_ints_beyond_int64_are_dictionary_encoded():
+    events = [_event("f", "a", 0.1, big=2 ** 64, small=1), _event("f", "a", 0.1, big=1, small=2)]
+    columns = to_columns(events)
+    assert columns.kinds["meta.small"] == "int64"
+    assert columns.kinds["meta.big"] == "dictionary"
+    assert columns.decode("meta.big") == [str(2 ** 64), "1"]
+
+def test_npy_export_round_trips_as_memory_maps(tmp_path):
+    manager = TraceManager()
+    manager.clear_events()
+
+    @trace
+    def work(x):
+        return x
+
+    for i in range(10):
+        work(i)
+
+    path = export_columnar(str(tmp_path / "traces"), format="npy")
+    columns = load_columnar(path)
+
+    assert len(columns) == 10
+    assert isinstance(columns["timestamp"], np.memmap)
+    assert set(columns.decode("function_name")) == {"work"}
+
+def test_npy_export_keeps_similar_column_names_apart(tmp_path):
+    events = [{"event_id": 1, "event_type": "e", "function_name": "f", "timestamp": 0.0,
+               "duration": 0.0, "meta": {"a/b": 1, "a_b": 2}}]
+    path = export_columnar(str(tmp_path / "traces"), events, format="npy")
+    columns = load_columnar(path)
+
+    assert list(columns["meta.a/b"]) == [1]
+    assert list(columns["meta.a_b"]) == [2]
+
+def test_latency_percentiles_match_numpy():
+    rng = np.random.default_rng(0)
+    events = [
+        _event("function_call", str(name), float(d))
+        for name, d in zip(rng.choice(["a", "b", "c"], 3000), rng.exponential(0.01, 3000))
+    ]
+    columns = to_columns(events)
+    result = latency_percentiles(columns, by=("function_name",), percentiles=(50, 99))
+
+    assert sorted(result["function_name"]) == ["a", "b", "c"]
+    for i, name in enumerate(result["function_name"]):
+        durations = [e["duration"] for e in events if e["function_name"] == name]
+        assert result["count"][i] == len(durations)
+        assert result["p50"][i] == pytest.approx(np.percentile(durations, 50))
+        assert result["p99"][i] == pytest.approx(np.percentile(durations, 99))
+        assert result["mean"][i] == pytest.approx(np.mean(durations))
+
+def test_parquet_requires_pyarrow(tmp_path):
+    from pytracex import columnar
+
+    if columnar.pq is not None:
+        pytest.skip("pyarrow installed")
+    with pytest.raises(ImportError):
+        export_columnar(str(tmp_path / "t.parquet"), events=[], format="parquet")
@@ -1,5 +1,7 @@
+import json
+import time
 import pytest
-from pytracex.trace_manager import TraceManager
+from pytracex.trace_manager import TraceManager, TraceEvent
 
 def test_dashboard_import():
     """
@@ -10,13 +12,106 @@ def test_dashboard_import():
     except ImportError:
         pytest.skip("Dashboard extras not installed.")
 
-def test_dashboard_routes():
-    """
-    Example test for the dashboard routes. This is tricky without an async test client.
-    If using FastAPI test client, you can do more thorough tests here.
-    """
+@pytest.fixture
+def client():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    from pytracex.dashboard import create_app
+
+    manager = TraceManager()
+    manager.clear_events()
+    manager.reset_metrics()
+    for i in range(25):
+        manager.record_event(TraceEvent(
+            event_type="even" if i % 2 == 0 else "odd",
+            function_name=f"f{i % 3}",
+            timestamp=1000.0 + i,
+        ))
+    return TestClient(create_app(manager))
+
+def test_dashboard_routes(client):
+    response = client.get("/traces", params={"limit": 10})
+    body = response.json()
+    assert len(body["events"]) == 10
+    assert body["events"][0]["timestamp"] == 1000.0
+
+    response = client.get("/traces", params={"limit": 10, "cursor": body["next_cursor"]})
+    assert response.json()["events"][0]["timestamp"] == 1010.0
+
+    assert client.delete("/traces").status_code == 200
+    assert client.get("/traces").json() == {"events": [], "next_cursor": None}
+
+def test_dashboard_filters(client):
+    body = client.get("/traces", params={"event_type": "odd", "function_name": "f0"}).json()
+    assert [e["timestamp"] for e in body["events"]] == [1003.0, 1009.0, 1015.0, 1021.0]
+
+    body = client.get("/traces", params={"since": 1020, "until": 1022}).json()
+    assert [e["timestamp"] for e in body["events"]] == [1020.0, 1021.0, 1022.0]
+
+    assert client.get("/traces", params={"limit": 5000}).status_code == 422
+
+def test_dashboard_ndjson_stream(client):
+    response = client.get("/traces/stream", params={"event_type": "even"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert len(lines) == 13
+    assert all(json.loads(line)["event_type"] == "even" for line in lines)
+
+def test_dashboard_metrics(client):
+    metrics = {(m["event_type"], m["function_name"]): m for m in client.get("/metrics").json()["metrics"]}
+    assert metrics[("even", "f0")]["count"] == 5
+    assert metrics[("odd", "f2")]["errors"] == 0
+
+    response = client.get("/metrics/prometheus")
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'pytracex_duration_seconds_count{event_type="even",function_name="f0"} 5' in response.text
+
+def test_dashboard_errors(client):
+    manager = TraceManager()
+    manager.reset_errors()
     try:
-        from pytracex.dashboard import run_dashboard
-        # Typically you'd use starlette.testclient or httpx to test the routes
-    except ImportError:
-        pytest.skip("Dashboard extras not installed.")
+        {}["missing"]
+    except KeyError as exc:
+        meta = manager.capture_exception(exc, "lookup")
+    (error,) = client.get("/errors").json()["errors"]
+    assert error["fingerprint"] == meta["error_fingerprint"]
+    assert error["type"] == "KeyError" and error["count"] == 1
+
+def test_dashboard_profile(client):
+    manager = TraceManager()
+    profiler = manager.start_profiler(hz=200)
+    try:
+        deadline = time.monotonic() + 0.1
+        while time.monotonic() < deadline:
+            pass
+    finally:
+        manager.stop_profiler()
+    response = client.get("/profile")
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text == profiler.to_folded()
+
+def test_dashboard_websocket_pushes_new_events(client):
+    _, cursor = TraceManager().query(limit=24)
+    with client.websocket_connect(f"/ws/traces?event_type=even&cursor={cursor}") as websocket:
+        message = websocket.receive_json()
+        assert [e["timestamp"] for e in message["events"]] == [1024.0]
+        assert message["dropped"] == 0
+
+        TraceManager().record_event(TraceEvent(event_type="even", timestamp=2000.0))
+        message = websocket.receive_json()
+        assert [e["timestamp"] for e in message["events"]] == [2000.0]
+
+def test_dashboard_websocket_unsubscribes_idle_clients_on_disconnect(client):
+    manager = TraceManager()
+    with client.websocket_connect("/ws/traces?event_type=never") as websocket:
+        websocket.send_text("ignored")
+        deadline = time.monotonic() + 5
+        while not manager._subscriptions and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(manager._subscriptions) == 1
+    # No event ever arrives; the disconnect alone ends the subscription.
+    deadline = time.monotonic() + 5
+    while manager._subscriptions and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager._subscriptions == ()
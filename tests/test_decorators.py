@@ -1,8 +1,9 @@
 import pytest
 from pytracex.trace_manager import TraceManager
-from pytracex.decorators import trace, audit
+from pytracex.decorators import trace, audit, get_audit_signer
+from pytracex.storage import RingBufferStorage
 from pytracex.config import DEFAULT_SECRET_KEY
-from pytracex.utils.hashing import verify_signature
+from pytracex.utils.hashing import verify_log
 
 @trace
 def sample_func(x, y):
@@ -22,7 +23,7 @@ def test_trace_decorator():
     e = events[0]
     assert e["function_name"] == "sample_func"
     assert e["event_type"] == "function_call"
-    assert e["meta"]["args"] == [2, 3]
+    assert e["meta"]["args"] == (2, 3)
 
 def test_audit_decorator():
     manager = TraceManager()
@@ -30,20 +31,136 @@ def test_audit_decorator():
 
     msg = critical_func(100)
     assert msg == "Processed 100"
+    manager.flush()
 
     events = manager.get_events()
     assert len(events) == 1
     e = events[0]
     assert e["event_type"] == "audit_call"
     assert "signature" in e["meta"]
+    assert e["meta"]["chain_index"] >= 0
 
-    # Verify the signature
-    event_data = {
-        "event_type": "audit_call",
-        "function_name": "critical_func",
-        "timestamp": e["timestamp"],
-        "duration": e["duration"],
-        "args": e["meta"]["args"],
-        "kwargs": e["meta"]["kwargs"]
-    }
-    assert verify_signature(event_data, e["meta"]["signature"], DEFAULT_SECRET_KEY)
+    # The stored event verifies as part of the audit hash chain
+    assert verify_log([e], DEFAULT_SECRET_KEY)["valid"]
+
+def test_audit_durable_and_batched_chain():
+    manager = TraceManager()
+    manager.clear_events()
+
+    @audit(durable=True)
+    def transfer(amount):
+        return amount
+
+    transfer(5)
+    # Durable: signed and stored before the call returned.
+    assert manager.get_events()[0]["meta"]["args"] == (5,)
+
+    for i in range(50):
+        critical_func(i)
+    manager.flush()
+    events = manager.get_events()
+    assert len(events) == 51
+    assert verify_log(events, DEFAULT_SECRET_KEY)["valid"]
+
+def test_audit_signs_arguments_as_passed():
+    manager = TraceManager()
+    manager.clear_events()
+
+    @audit
+    def submit(items, options=None):
+        return len(items)
+
+    items = [1, 2]
+    options = {"priority": bytearray(b"lo")}
+    submit(items, options=options)
+    # Mutated before the background signer gets to the event.
+    items.append(3)
+    options["priority"][:] = b"hi"
+    manager.flush()
+
+    event = manager.get_events()[0]
+    assert event["meta"]["args"] == ([1, 2],)
+    assert event["meta"]["kwargs"] == {"options": {"priority": bytearray(b"lo")}}
+    assert verify_log([event], DEFAULT_SECRET_KEY)["valid"]
+
+class _FailingStorage(RingBufferStorage):
+    def __init__(self, failures):
+        super().__init__(100)
+        self.failures = failures
+
+    def append(self, item):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        return super().append(item)
+
+def test_audit_storage_failures_are_raised_and_retried():
+    manager = TraceManager()
+    previous = manager.set_storage(_FailingStorage(failures=1))
+    signer = get_audit_signer()
+    errors = signer.export_errors
+    try:
+        @audit(durable=True)
+        def transfer(amount):
+            return amount
+
+        with pytest.raises(OSError, match="disk full"):
+            transfer(1)
+        assert signer.export_errors == errors + 1
+        assert signer.exporter.unrecorded
+
+        # The sealed event is stored with the next batch, keeping the chain whole.
+        assert transfer(2) == 2
+        events = manager.get_events()
+        assert sorted(e["meta"]["args"] for e in events) == [(1,), (2,)]
+        assert verify_log(events, DEFAULT_SECRET_KEY)["valid"]
+    finally:
+        manager.set_storage(previous)
+
+class _Unprintable:
+    def __repr__(self):
+        raise ValueError("no repr")
+
+def test_audit_event_that_cannot_be_signed_fails_its_own_call():
+    manager = TraceManager()
+    manager.clear_events()
+
+    @audit
+    def record(value):
+        return value
+
+    record(1)
+    with pytest.raises(ValueError, match="no repr"):
+        record(_Unprintable())
+    record(2)
+    manager.flush()
+
+    events = manager.get_events()
+    assert [e["meta"]["args"] for e in events] == [(1,), (2,)]
+    assert verify_log(events, DEFAULT_SECRET_KEY)["valid"]
+
+def test_audit_batch_seal_failure_only_drops_the_failing_event(monkeypatch):
+    from pytracex.decorators import audit_chain
+
+    manager = TraceManager()
+    manager.clear_events()
+    seal_batch = audit_chain.seal_batch
+
+    def failing_seal_batch(events, digests=None):
+        if any(e.meta["args"] == (2,) for e in events):
+            raise RuntimeError("cannot seal")
+        return seal_batch(events, digests)
+
+    monkeypatch.setattr(audit_chain, "seal_batch", failing_seal_batch)
+
+    @audit
+    def record(value):
+        return value
+
+    for value in (1, 2, 3):
+        record(value)
+    manager.flush()
+
+    events = manager.get_events()
+    assert [e["meta"]["args"] for e in events] == [(1,), (3,)]
+    assert verify_log(events, DEFAULT_SECRET_KEY)["valid"]
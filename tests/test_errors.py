@@ -0,0 +1,92 @@
+import pytest
+from pytracex.trace_manager import TraceManager
+from pytracex.decorators import trace, audit
+from pytracex.ml_tracking import ml_step
+from pytracex.errors import ErrorRegistry
+
+@pytest.fixture
+def manager():
+    manager = TraceManager()
+    manager.clear_events()
+    manager.reset_errors()
+    return manager
+
+def _raise_value_error(value):
+    raise ValueError(f"bad value {value}")
+
+def test_repeated_errors_share_a_fingerprint(manager):
+    @trace
+    def parse(value):
+        _raise_value_error(value)
+
+    for i in range(50):
+        with pytest.raises(ValueError):
+            parse(i)
+
+    events = manager.get_events()
+    assert len(events) == 50
+    assert len({e["meta"]["error_fingerprint"] for e in events}) == 1
+    assert events[1]["meta"]["error"] == "ValueError: bad value 1"
+    # The stack summary is only attached to the first occurrence.
+    stack = events[0]["meta"]["error_stack"]
+    assert all("error_stack" not in e["meta"] for e in events[1:])
+    assert "parse" in stack[0] and "_raise_value_error" in stack[-1]
+    assert not any("instrumentation.py" in frame for frame in stack)
+
+    (error,) = manager.get_errors()
+    assert error["count"] == 50
+    assert error["type"] == "ValueError"
+    assert error["message"] == "bad value 0"
+    assert error["function_name"] == "parse"
+
+def test_error_locations_and_types_are_distinguished():
+    registry = ErrorRegistry()
+
+    def fail(kind):
+        if kind == "a":
+            raise KeyError(kind)
+        if kind == "b":
+            raise KeyError(kind)
+        raise IndexError(kind)
+
+    fingerprints = set()
+    for kind in "abcab":
+        try:
+            fail(kind)
+        except LookupError as exc:
+            record, _ = registry.capture(exc, "fail")
+            fingerprints.add(record.fingerprint)
+
+    assert len(fingerprints) == 3
+    assert sorted(r["count"] for r in registry.snapshot()) == [1, 2, 2]
+
+def test_registry_is_bounded():
+    registry = ErrorRegistry(max_fingerprints=2)
+    for code in ("raise KeyError()", "raise IndexError()", "raise TypeError()"):
+        try:
+            exec(code)
+        except Exception as exc:
+            registry.capture(exc)
+    assert [r["type"] for r in registry.snapshot()] == ["IndexError", "TypeError"]
+
+def test_audit_and_ml_step_record_failures(manager):
+    @audit
+    def transfer(amount):
+        raise PermissionError("denied")
+
+    @ml_step("train")
+    def train(data):
+        raise RuntimeError("diverged")
+
+    with pytest.raises(PermissionError):
+        transfer(10)
+    with pytest.raises(RuntimeError):
+        train([1, 2])
+    manager.flush()
+
+    events = {e["event_type"]: e for e in manager.get_events()}
+    assert events["audit_call"]["meta"]["error"] == "PermissionError: denied"
+    assert "signature" in events["audit_call"]["meta"]
+    assert events["ml_step"]["meta"]["error"] == "RuntimeError: diverged"
+    assert "output" not in events["ml_step"]["meta"]
+    assert {e["function_name"] for e in manager.get_errors()} == {"transfer", "train"}
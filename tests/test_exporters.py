@@ -0,0 +1,87 @@
+import json
+import sqlite3
+import threading
+import pytest
+from pytracex.trace_manager import TraceManager, TraceEvent
+from pytracex.exporters import (
+    Exporter,
+    InMemoryExporter,
+    JSONLFileExporter,
+    SQLiteExporter,
+    BatchExportProcessor,
+)
+
+def test_in_memory_exporter_receives_events():
+    manager = TraceManager()
+    exporter = InMemoryExporter()
+    processor = manager.add_exporter(exporter)
+    try:
+        for i in range(10):
+            manager.record_event(TraceEvent(event_type="export_test", function_name=f"f{i}"))
+        manager.flush()
+        events = exporter.get_events()
+        assert [e["function_name"] for e in events] == [f"f{i}" for i in range(10)]
+    finally:
+        manager.remove_exporter(processor)
+
+def test_jsonl_exporter(tmp_path):
+    path = tmp_path / "events.jsonl"
+    processor = BatchExportProcessor(JSONLFileExporter(str(path)), max_batch_size=2)
+    for i in range(5):
+        processor.submit(TraceEvent(event_type="jsonl_test", meta={"obj": object()}))
+    processor.shutdown()
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 5
+    assert json.loads(lines[0])["event_type"] == "jsonl_test"
+
+def test_sqlite_exporter(tmp_path):
+    path = tmp_path / "events.db"
+    processor = BatchExportProcessor(SQLiteExporter(str(path)))
+    for i in range(3):
+        processor.submit(TraceEvent(event_type="sqlite_test", function_name="f"))
+    processor.shutdown()
+
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT event_type, function_name FROM trace_events").fetchall()
+    conn.close()
+    assert rows == [("sqlite_test", "f")] * 3
+
+def test_processor_drops_when_queue_full():
+    release = threading.Event()
+
+    class SlowExporter(Exporter):
+        def __init__(self):
+            self.count = 0
+
+        def export(self, batch):
+            release.wait()
+            self.count += len(batch)
+
+    exporter = SlowExporter()
+    processor = BatchExportProcessor(exporter, max_queue_size=2, max_batch_size=1)
+    accepted = sum(processor.submit(TraceEvent(event_type="drop_test")) for _ in range(20))
+
+    assert processor.dropped == 20 - accepted
+    assert processor.dropped > 0
+    assert processor.pending() == 2
+    # No room for the flush request: give up after the timeout.
+    assert processor.flush(timeout=0.05) is False
+    release.set()
+    processor.shutdown()
+    assert exporter.count == accepted
+
+def test_processor_survives_exporter_errors():
+    class FailingExporter(Exporter):
+        def export(self, batch):
+            raise RuntimeError("boom")
+
+    processor = BatchExportProcessor(FailingExporter())
+    processor.submit(TraceEvent(event_type="error_test"))
+    assert processor.flush(timeout=5)
+    assert processor.export_errors == 1
+    processor.shutdown()
+
+def test_processor_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        BatchExportProcessor(InMemoryExporter(), overflow="spill")
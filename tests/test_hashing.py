@@ -0,0 +1,65 @@
+import json
+from pytracex.trace_manager import TraceEvent
+from pytracex.utils.hashing import AuditChain, canonical_bytes, sign_event, verify_log, verify_signature
+
+def _chain_events(n, chain=None):
+    chain = chain or AuditChain("key")
+    events = []
+    for i in range(n):
+        event = TraceEvent(event_type="audit_call", function_name="f", meta={"args": (i, "card"), "kwargs": {"amount": 1.5}})
+        chain.seal(event)
+        events.append(event.to_dict())
+    return events
+
+def test_canonical_bytes_is_order_independent():
+    assert canonical_bytes({"b": 1, "a": (1, 2)}) == canonical_bytes({"a": [1, 2], "b": 1})
+    assert canonical_bytes({"é": None}) == '{"é":null}'.encode("utf-8")
+    assert verify_signature({"b": 1, "a": 2}, sign_event({"a": 2, "b": 1}, "k"), "k")
+
+def test_canonical_bytes_accepts_mixed_key_types():
+    data = {"args": ({1: "a", "b": 2},), "kwargs": {}}
+    # Same bytes as after a JSON round trip through storage.
+    assert canonical_bytes(data) == canonical_bytes(json.loads(json.dumps(data)))
+    assert canonical_bytes(data) == b'{"args":[{"1":"a","b":2}],"kwargs":{}}'
+
+def test_verify_log_accepts_intact_chain_after_round_trip():
+    events = _chain_events(20)
+    # Storage round trip: tuples become lists.
+    stored = [json.loads(json.dumps(e, default=repr)) for e in events]
+    result = verify_log(stored, "key")
+    assert result == {"valid": True, "checked": 20, "chains": 1, "first_broken": None}
+    # A chain whose oldest events were evicted still verifies.
+    assert verify_log(events[5:], "key")["valid"]
+
+def test_verify_log_reports_first_broken_link():
+    events = _chain_events(20)
+    events[7]["meta"]["kwargs"] = {"tampered": True}
+    del events[12]
+    result = verify_log(events, "key")
+    assert not result["valid"]
+    assert result["first_broken"]["chain_index"] == 7
+    assert result["first_broken"]["reason"] == "signature mismatch"
+
+    result = verify_log(events[8:], "key")
+    assert result["first_broken"]["reason"] == "missing events 12..12"
+    assert not verify_log(_chain_events(3), "wrong-key")["valid"]
+
+def test_verify_log_in_process_pool():
+    events = _chain_events(50) + _chain_events(30)
+    events[64]["timestamp"] += 1
+    result = verify_log(events, "key", processes=2, chunk_size=16)
+    assert result["checked"] == 80
+    assert result["chains"] == 2
+    assert result["first_broken"]["event_id"] == events[64]["event_id"]
+
+def test_verify_log_reports_earliest_break_across_chains():
+    older = _chain_events(5, AuditChain("key", chain_id="zz"))
+    newer = _chain_events(5, AuditChain("key", chain_id="aa"))
+    for event in newer:
+        event["timestamp"] += 10
+    older[3]["meta"]["args"] = [0, "tampered"]
+    newer[1]["meta"]["args"] = [0, "tampered"]
+    # "aa" sorts first, but the "zz" break happened earlier.
+    result = verify_log(newer + older, "key")
+    assert result["first_broken"]["chain_id"] == "zz"
+    assert result["first_broken"]["chain_index"] == 3
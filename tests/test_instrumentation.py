@@ -0,0 +1,159 @@
+import asyncio
+import inspect
+import time
+import pytest
+from pytracex.trace_manager import TraceManager
+from pytracex.decorators import trace, audit
+from pytracex.ml_tracking import ml_step
+from pytracex.context import set_correlation_id, get_current_span
+
+@pytest.fixture
+def manager():
+    manager = TraceManager()
+    manager.clear_events()
+    return manager
+
+def test_coroutine_duration_covers_await(manager):
+    @trace
+    async def slow(x):
+        await asyncio.sleep(0.05)
+        return x * 2
+
+    assert inspect.iscoroutinefunction(slow)
+    coro = slow(21)
+    assert manager.get_events() == []
+    assert asyncio.run(coro) == 42
+
+    events = manager.get_events()
+    assert len(events) == 1
+    assert events[0]["duration"] >= 0.04
+
+def test_correlation_id_propagates_into_tasks(manager):
+    @trace
+    async def child(n):
+        await asyncio.sleep(0)
+        return n
+
+    async def handler():
+        set_correlation_id("req-42")
+        return await asyncio.gather(*(asyncio.create_task(child(n)) for n in range(3)))
+
+    assert asyncio.run(handler()) == [0, 1, 2]
+    events = manager.get_events()
+    assert len(events) == 3
+    assert {e["meta"]["correlation_id"] for e in events} == {"req-42"}
+
+def test_async_errors_are_recorded(manager):
+    @trace
+    async def broken():
+        await asyncio.sleep(0)
+        raise KeyError("missing")
+
+    with pytest.raises(KeyError):
+        asyncio.run(broken())
+    assert manager.get_events()[0]["meta"]["error"] == "KeyError: 'missing'"
+
+def test_cancelled_coroutine_ends_its_span(manager):
+    @trace
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def handler():
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.01):
+                await slow()
+        return get_current_span()
+
+    assert asyncio.run(handler()) is None
+
+def test_interrupted_call_ends_its_span(manager):
+    @trace
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        interrupted()
+    assert get_current_span() is None
+
+def test_generator_is_timed_until_exhausted(manager):
+    @trace
+    def numbers(n):
+        for i in range(n):
+            time.sleep(0.01)
+            yield i
+
+    gen = numbers(3)
+    assert next(gen) == 0
+    assert manager.get_events() == []
+    assert list(gen) == [1, 2]
+
+    events = manager.get_events()
+    assert len(events) == 1
+    assert events[0]["duration"] >= 0.025
+
+def test_generator_send_and_early_close(manager):
+    @trace
+    def echo():
+        received = None
+        while True:
+            received = yield received
+
+    gen = echo()
+    next(gen)
+    assert gen.send("ping") == "ping"
+    gen.close()
+    assert len(manager.get_events()) == 1
+
+def test_async_generator_forwards_asend_and_athrow(manager):
+    @trace
+    async def accumulator():
+        total = 0
+        while True:
+            try:
+                value = yield total
+            except ValueError:
+                total = 0
+            else:
+                total += value or 0
+
+    async def drive():
+        agen = accumulator()
+        assert await agen.__anext__() == 0
+        assert await agen.asend(5) == 5
+        assert await agen.asend(2) == 7
+        assert await agen.athrow(ValueError()) == 0
+        await agen.aclose()
+
+    asyncio.run(drive())
+    assert len(manager.get_events()) == 1
+
+def test_async_audit_and_ml_step(manager):
+    @audit
+    async def pay(amount):
+        await asyncio.sleep(0.02)
+        return amount
+
+    @ml_step("fetch_batch")
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return [1, 2]
+
+    async def run():
+        await pay(10)
+        await fetch()
+
+    asyncio.run(run())
+    manager.flush()
+    # The audit event is stored by the background signer, possibly after the ml_step.
+    events = {e["event_type"]: e for e in manager.get_events()}
+    audit_event, ml_event = events["audit_call"], events["ml_step"]
+    assert audit_event["duration"] >= 0.015
+    assert ml_event["function_name"] == "fetch_batch"
+    assert ml_event["duration"] >= 0.015
+
+def test_durable_audit_is_sync_only():
+    async def pay(amount):
+        return amount
+
+    with pytest.raises(TypeError):
+        audit(pay, durable=True)
@@ -35,3 +35,127 @@ def test_io_tracing(tmp_path):
     assert "file_write" in event_types
     assert "file_read" in event_types
     assert "file_close" in event_types
+
+def test_aggregate_mode_emits_one_summary(tmp_path):
+    manager = TraceManager()
+    manager.clear_events()
+    test_file = tmp_path / "lines.txt"
+
+    trace_file_ops(mode="aggregate")
+    try:
+        with open(test_file, "w") as f:
+            f.write("first\n")
+            f.writelines(["second\n", "third\n"])
+        with open(test_file) as f:
+            assert f.readline() == "first\n"
+            assert [line for line in f] == ["second\n", "third\n"]
+        with open(test_file, "rb") as f:
+            buffer = bytearray(4)
+            assert f.readinto(buffer) == 4
+    finally:
+        untrace_file_ops()
+
+    events = manager.get_events()
+    assert [e["event_type"] for e in events] == ["file_io_summary"] * 3
+    write, read, binary = (e["meta"] for e in events)
+    assert write["writes"] == 2
+    assert write["bytes_written"] == len("first\nsecond\nthird\n")
+    assert read["reads"] == 3
+    assert read["bytes_read"] == len("first\nsecond\nthird\n")
+    assert binary["bytes_read"] == 4
+    assert read["max_latency"] >= 0.0
+
+def test_iteration_is_traced_in_events_mode(tmp_path):
+    manager = TraceManager()
+    manager.clear_events()
+    test_file = tmp_path / "lines.txt"
+    test_file.write_text("a\nb\n")
+
+    trace_file_ops()
+    try:
+        with open(test_file) as f:
+            lines = list(f)
+    finally:
+        untrace_file_ops()
+
+    assert lines == ["a\n", "b\n"]
+    reads = [e for e in manager.get_events() if e["event_type"] == "file_read"]
+    assert [e["function_name"] for e in reads] == ["readline", "readline"]
+
+def test_excluded_paths_are_not_traced(tmp_path):
+    manager = TraceManager()
+    manager.clear_events()
+
+    trace_file_ops(exclude=["*.skip"])
+    try:
+        with open(tmp_path / "data.skip", "w") as f:
+            f.write("ignored")
+        with open(tmp_path / "data.txt", "w") as f:
+            f.write("traced")
+    finally:
+        untrace_file_ops()
+
+    filenames = {str(e["meta"]["filename"]) for e in manager.get_events()}
+    assert filenames == {str(tmp_path / "data.txt")}
+
+def test_traced_io_scope(tmp_path):
+    import builtins
+    import io
+    import threading
+    from pytracex.io_tracing import traced_io, traced_open
+
+    manager = TraceManager()
+    manager.clear_events()
+    original_open = builtins.open
+    test_file = tmp_path / "scoped.txt"
+    other_thread_events = []
+
+    def other_thread():
+        with open(tmp_path / "other.txt", "w") as f:
+            f.write("untraced")
+        other_thread_events.append(len(manager.get_events()))
+
+    with traced_io():
+        assert builtins.open is traced_open
+        assert io.open is traced_open
+        test_file.write_text("via pathlib")
+        assert test_file.read_bytes() == b"via pathlib"
+        fd = os.open(test_file, os.O_RDONLY)
+        with os.fdopen(fd) as f:
+            f.read()
+        before = len(manager.get_events())
+        t = threading.Thread(target=other_thread)
+        t.start()
+        t.join()
+        assert other_thread_events == [before]
+
+    assert builtins.open is original_open
+    open(test_file).close()
+
+    calls = [(e["event_type"], e["function_name"]) for e in manager.get_events()]
+    assert calls.count(("file_open", "open")) == 3
+    assert ("file_open", "os.open") in calls
+    assert ("file_write", "write") in calls
+    assert len(calls) == before
+
+def test_nested_scopes_and_global_tracing(tmp_path):
+    import builtins
+    from pytracex.io_tracing import traced_io
+
+    original_open = builtins.open
+    manager = TraceManager()
+    manager.clear_events()
+
+    trace_file_ops()
+    with traced_io(mode="aggregate"):
+        with open(tmp_path / "a.txt", "w") as f:
+            f.write("x")
+    assert builtins.open is not original_open
+    with open(tmp_path / "b.txt", "w") as f:
+        f.write("y")
+    untrace_file_ops()
+    untrace_file_ops()
+    assert builtins.open is original_open
+
+    event_types = [e["event_type"] for e in manager.get_events()]
+    assert event_types == ["file_io_summary", "file_open", "file_write", "file_close"]
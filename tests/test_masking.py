@@ -0,0 +1,70 @@
+from collections import namedtuple
+import pytest
+from pytracex.masking import PIIMasker, mask_pii
+from pytracex.decorators import trace, audit
+from pytracex.trace_manager import TraceManager
+
+def test_masks_all_patterns_in_one_pass():
+    masked = mask_pii("mail bob@example.com, ssn 123-45-6789")
+    assert masked == "mail [EMAIL REDACTED], ssn [SSN REDACTED]"
+
+def test_preserves_container_types():
+    Point = namedtuple("Point", "x y")
+    value = {
+        "tuple": ("a@b.io", 1),
+        "list": ["123-45-6789"],
+        "set": {"a@b.io"},
+        "point": Point("a@b.io", 2),
+    }
+    masked = mask_pii(value)
+    assert masked["tuple"] == ("[EMAIL REDACTED]", 1)
+    assert masked["list"] == ["[SSN REDACTED]"]
+    assert masked["set"] == {"[EMAIL REDACTED]"}
+    assert masked["point"] == Point("[EMAIL REDACTED]", 2)
+
+def test_large_values_are_not_scanned():
+    masker = PIIMasker(max_scan_length=10)
+    assert masker.mask("x" * 11) == "[STRING OF 11 CHARS NOT SCANNED]"
+    assert masker.mask(b"x" * 11) == "[BINARY OF 11 BYTES NOT SCANNED]"
+    assert masker.mask(b"a@b.io") == b"a@b.io"
+    assert masker.mask(42) == 42
+
+def test_repeated_strings_are_cached():
+    masker = PIIMasker()
+    masker.mask("contact: a@b.io")
+    masker.mask("contact: a@b.io")
+    assert masker.mask_string.cache_info().hits == 1
+
+def test_long_strings_are_not_cached():
+    masker = PIIMasker(cache_max_length=20)
+    value = "contact: a@b.io " + "x" * 20
+    assert masker.mask(value) == masker.mask(value) == "contact: [EMAIL REDACTED] " + "x" * 20
+    assert masker.mask_string.cache_info().currsize == 0
+
+def test_custom_patterns_with_non_identifier_names():
+    masker = PIIMasker(
+        patterns={"credit-card": r"\d{4}-\d{4}-\d{4}-\d{4}", "phone": r"\+\d{11}"},
+        replacements={"credit-card": "[CARD]"},
+    )
+    assert masker.mask("1234-5678-9012-3456 +33612345678") == "[CARD] [REDACTED]"
+
+def test_safe_fields_are_not_scanned():
+    @trace(safe_fields=["note"])
+    def transfer(account, note, memo=None):
+        return True
+
+    @audit(safe_fields=("memo",))
+    def audited_transfer(account, memo=None):
+        return True
+
+    manager = TraceManager()
+    manager.clear_events()
+    transfer("a@b.io", "c@d.io", memo="e@f.io")
+    audited_transfer("a@b.io", memo="e@f.io")
+    manager.flush()
+
+    traced, audited = manager.get_events()
+    assert traced["meta"]["args"] == ("[EMAIL REDACTED]", "c@d.io")
+    assert traced["meta"]["kwargs"] == {"memo": "[EMAIL REDACTED]"}
+    assert audited["meta"]["args"] == ("[EMAIL REDACTED]",)
+    assert audited["meta"]["kwargs"] == {"memo": "e@f.io"}
@@ -0,0 +1,69 @@
+import random
+import pytest
+from pytracex.decorators import trace
+from pytracex.metrics import Aggregate, LogHistogram, MetricsRegistry
+from pytracex.trace_manager import TraceManager
+
+def test_histogram_quantiles_within_relative_error():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(-7, 1.5) for _ in range(20_000))
+    histogram = LogHistogram()
+    for value in values:
+        histogram.record(value)
+    for quantile, estimate in zip((0.5, 0.95, 0.99), histogram.quantiles((0.5, 0.95, 0.99))):
+        exact = values[int(quantile * len(values)) - 1]
+        assert abs(estimate - exact) / exact < 0.04
+
+def test_histogram_clamps_and_small_values_are_exact():
+    histogram = LogHistogram(precision_bits=4, max_bits=20)
+    histogram.record(-1.0)
+    histogram.record(5e-9)
+    histogram.record(10.0)
+    assert histogram.counts[0] == 1 and histogram.counts[5] == 1 and histogram.counts[-1] == 1
+    assert histogram.quantiles((0.5,)) == [5.5e-9]
+
+def test_aggregates_merge():
+    a, b = Aggregate("t", "f"), Aggregate("t", "f")
+    for i in range(1, 101):
+        (a if i % 2 else b).record(i / 1000, error=i > 95)
+    a.merge(b)
+    stats = a.to_dict()
+    assert stats["count"] == 100 and stats["errors"] == 5
+    assert stats["min"] == 0.001 and stats["max"] == 0.1
+    assert stats["p50"] == pytest.approx(0.050, rel=0.04)
+    assert stats["p99"] == pytest.approx(0.099, rel=0.04)
+    with pytest.raises(ValueError):
+        a.histogram.merge(LogHistogram(precision_bits=3))
+
+def test_registry_prometheus_export():
+    registry = MetricsRegistry()
+    held = registry.aggregate("function_call", 'we"ird')
+    registry.record("function_call", 'we"ird', 0.5, error=True)
+    text = registry.to_prometheus()
+    assert '# TYPE pytracex_duration_seconds summary' in text
+    assert 'pytracex_duration_seconds{event_type="function_call",function_name="we\\"ird",quantile="0.5"} 0.5' in text
+    assert 'pytracex_errors_total{event_type="function_call",function_name="we\\"ird"} 1' in text
+    registry.reset()
+    assert registry.snapshot() == [] and registry.aggregate("function_call", 'we"ird') is held
+
+def test_metrics_only_trace_stores_no_events():
+    manager = TraceManager()
+    manager.clear_events()
+
+    @trace(metrics_only=True)
+    def hot(x):
+        if x < 0:
+            raise ValueError(x)
+        return x
+
+    for i in range(100):
+        hot(i)
+    with pytest.raises(ValueError):
+        hot(-1)
+    assert manager.get_events() == []
+    (stats,) = [m for m in manager.get_metrics() if m["function_name"] == "hot"]
+    assert stats["count"] == 101 and stats["errors"] == 1
+
+    # Every call is measured, so a sample rate would silently do nothing.
+    with pytest.raises(ValueError):
+        trace(hot, metrics_only=True, sample_rate=0.5)
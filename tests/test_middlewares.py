@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+from pytracex.middlewares import TracingMiddleware
+from pytracex.trace_manager import TraceManager
+from pytracex.decorators import trace
+from pytracex.context import get_correlation_id
+from pytracex import sampling
+
+async def streaming_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    for chunk in (b"hello ", b"streaming ", b"world"):
+        await asyncio.sleep(0.01)
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def call(app, path="/stream", headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": list(headers)}
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+def test_streaming_response_is_timed_until_last_chunk():
+    manager = TraceManager()
+    manager.clear_events()
+    sent = call(TracingMiddleware(streaming_app))
+
+    (event,) = manager.get_events()
+    assert event["event_type"] == "api_request"
+    assert event["duration"] >= 0.025
+    assert event["meta"]["status_code"] == 200
+    assert event["meta"]["response_size"] == len(b"hello streaming world")
+    assert event["meta"]["route"] == "<unmatched>"
+    generated = event["meta"]["correlation_id"]
+    assert (b"x-correlation-id", generated.encode()) in sent[0]["headers"]
+
+def test_incoming_correlation_id_is_used_and_echoed():
+    @trace
+    def inner():
+        return get_correlation_id()
+
+    async def app(scope, receive, send):
+        assert inner() == "abc-123"
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    manager = TraceManager()
+    manager.clear_events()
+    sent = call(TracingMiddleware(app), headers=[(b"x-correlation-id", b"abc-123")])
+
+    assert (b"x-correlation-id", b"abc-123") in sent[0]["headers"]
+    function_event, request_event = manager.get_events()
+    assert function_event["meta"]["correlation_id"] == "abc-123"
+    assert function_event["parent_span_id"] == request_event["span_id"]
+    assert get_correlation_id() is None
+
+def test_app_errors_are_recorded():
+    async def app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    manager = TraceManager()
+    manager.clear_events()
+    with pytest.raises(RuntimeError):
+        call(TracingMiddleware(app))
+    (event,) = manager.get_events()
+    assert event["meta"]["status_code"] == 500
+    assert event["meta"]["error"] == "RuntimeError: boom"
+
+def test_fastapi_route_template():
+    fastapi = pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+
+    app = fastapi.FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"item_id": item_id}
+
+    manager = TraceManager()
+    manager.clear_events()
+    client = TestClient(app)
+    response = client.get("/items/7", headers={"X-Correlation-ID": "req-7"})
+    assert response.json() == {"item_id": 7}
+    assert response.headers["x-correlation-id"] == "req-7"
+
+    events = [e for e in manager.get_events() if e["event_type"] == "api_request"]
+    assert events[-1]["function_name"] == "HTTP /items/{item_id}"
+    assert events[-1]["meta"]["path"] == "/items/7"
+
+def test_tail_sampling_keeps_failing_requests():
+    @trace
+    def step(fail):
+        if fail:
+            raise ValueError("boom")
+
+    async def app(scope, receive, send):
+        step(False)
+        try:
+            step(scope["path"] == "/fail")
+        except ValueError:
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    manager = TraceManager()
+    manager.clear_events()
+    sampling.set_sample_rate(0.0)
+    sampling.set_tail_sampling(True, latency_threshold=10.0)
+    before = sampling.tail_stats()
+    middleware = TracingMiddleware(app)
+    try:
+        call(middleware, "/ok", [(b"x-correlation-id", b"ok-request")])
+        call(middleware, "/fail", [(b"x-correlation-id", b"failing-request")])
+    finally:
+        sampling.set_sample_rate(1.0)
+        sampling.set_tail_sampling(False)
+
+    events = manager.get_events()
+    assert {e["meta"]["correlation_id"] for e in events} == {"failing-request"}
+    assert [e["event_type"] for e in events] == ["function_call", "function_call", "api_request"]
+    stats = sampling.tail_stats()
+    assert stats["pending"] == 0
+    assert stats["kept"] == before["kept"] + 1
+    assert stats["discarded"] == before["discarded"] + 1
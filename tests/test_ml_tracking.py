@@ -1,3 +1,4 @@
+import json
 import pytest
 from pytracex.trace_manager import TraceManager
 from pytracex.ml_tracking import ml_step
@@ -25,3 +26,163 @@ def test_ml_step_decorator():
     assert events[0]["event_type"] == "ml_step"
     assert events[0]["function_name"] == "preprocess_data"
     assert events[1]["function_name"] == "train_model"
+
+def test_ml_step_records_summaries():
+    manager = TraceManager()
+    manager.clear_events()
+
+    @ml_step("tokenize")
+    def tokenize(texts, lowercase=True):
+        return {"tokens": [t.split() for t in texts]}
+
+    tokenize(["a b"] * 100, lowercase=False)
+    meta = manager.get_events()[0]["meta"]
+    assert meta["args"][0]["len"] == 100
+    assert len(meta["args"][0]["items"]) == 16
+    assert meta["kwargs"] == {"lowercase": False}
+    assert meta["output"]["items"]["tokens"]["len"] == 100
+
+def test_summary_size_cap_and_fallback_repr():
+    from pytracex.summaries import summarize
+
+    class Opaque:
+        def __repr__(self):
+            return "x" * 1000
+
+    assert summarize(Opaque()).endswith("... [1000 chars]")
+    # The byte budget applies while items are added: the summary stops early.
+    nested = {str(i): ["y" * 100] * 16 for i in range(16)}
+    summary = summarize(nested)
+    assert summary["truncated"] and 0 < len(summary["items"]) < 16
+    assert len(json.dumps(summary, separators=(",", ":"))) <= 4096
+
+def test_summary_cycles_and_depth():
+    from pytracex.summaries import summarize
+
+    loop = [1]
+    loop.append(loop)
+    summary = summarize(loop)
+    assert summary["items"][0] == 1
+    assert summary["items"][1] == {"type": "list", "len": 2, "cycle": True}
+
+    deep = {"a": {"b": {"c": {"d": 1}}}}
+    inner = summarize(deep)["items"]["a"]["items"]["b"]
+    assert inner["items"]["c"] == {"type": "dict", "len": 1, "truncated": True}
+
+def test_ndarray_summary_is_sampled_and_memoized():
+    np = pytest.importorskip("numpy")
+    from pytracex.summaries import summarize, summary_cache_info, clear_summary_cache
+
+    clear_summary_cache()
+    data = np.arange(100_000, dtype=np.float64).reshape(1000, 100)
+    data[0, :10] = np.nan
+    summary = summarize(data)
+    assert summary["shape"] == [1000, 100]
+    assert summary["dtype"] == "float64"
+    assert summary["nbytes"] == 800_000
+    assert summary["sampled"] == 10_000
+    assert summary["nulls"] >= 1
+    assert summary["max"] == 99_999.0
+
+    assert summarize(data) is summary
+    assert summary_cache_info()["hits"] == 1
+    data[500:, :] = -1.0
+    assert summarize(data)["min"] == -1.0
+    # Any edit the sampled statistics would see invalidates the memoized summary.
+    data.flat[10] = 1e9
+    assert summarize(data)["max"] == 1e9
+
+    small = np.array([1, 2, 3])
+    assert summarize(small)["mean"] == 2.0
+    small[0] = 7
+    assert summarize(small)["max"] == 7
+
+_normalize_calls = []
+
+def test_ml_step_cache_hits_misses_and_eviction(tmp_path):
+    np = pytest.importorskip("numpy")
+    from pytracex.step_cache import StepCache
+
+    manager = TraceManager()
+    manager.clear_events()
+    cache = StepCache(str(tmp_path / "cache"), max_bytes=20_000)
+    calls = _normalize_calls
+    calls.clear()
+
+    @ml_step("normalize", cache=cache)
+    def normalize(x, scale=1.0):
+        # A global, not a closure: closure values are part of the cache key.
+        _normalize_calls.append(1)
+        return {"x": x / x.max() * scale, "n": len(x)}
+
+    data = np.arange(1, 1001, dtype=np.float64)
+    first = normalize(data)
+    second = normalize(data.copy())
+    assert len(calls) == 1
+    # Hits are copy-on-write maps: writable like a miss, without touching the cache.
+    assert isinstance(second["x"], np.memmap) and second["x"].flags.writeable
+    np.testing.assert_array_equal(first["x"], second["x"])
+    second["x"][:] = 0.0
+    np.testing.assert_array_equal(normalize(data)["x"], first["x"])
+
+    normalize(data, scale=2.0)
+    normalize(data[::2])
+    assert len(calls) == 3
+
+    cache_events = [e["meta"] for e in manager.get_events() if e["event_type"] == "ml_cache"]
+    assert [m["hit"] for m in cache_events] == [False, True, True, False, False]
+    assert cache_events[1]["saved_seconds"] >= 0
+    assert cache_events[0]["stored_bytes"] >= 8000
+
+    # 8 + 8 + 4 KB of results in a 20 KB cache: the least recently used one is gone.
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] <= 20_000
+    normalize(data)
+    assert len(calls) == 4
+
+def test_ml_step_cache_key_covers_closures_and_defaults(tmp_path):
+    def make(scale, default_offset=0):
+        @ml_step("scale", cache=str(tmp_path))
+        def step(x, offset=default_offset):
+            return x * scale + offset
+        return step
+
+    assert make(2)(10) == 20
+    assert make(3)(10) == 30
+    assert make(3, default_offset=1)(10) == 31
+    assert make(3)(10) == 30
+
+    helper = object()
+
+    @ml_step("opaque", cache=str(tmp_path))
+    def opaque(x):
+        return x if helper else None
+
+    # A closure value that can't be fingerprinted: run uncached.
+    assert opaque(5) == 5 and opaque(5) == 5
+
+def test_ml_step_cache_key_covers_called_names(tmp_path):
+    # Same qualified name and bytecode; only the method called differs.
+    def define(upper):
+        if upper:
+            def shout(s):
+                return s.upper()
+        else:
+            def shout(s):
+                return s.lower()
+        return ml_step("shout", cache=str(tmp_path))(shout)
+
+    assert define(True)("Mixed") == "MIXED"
+    assert define(False)("Mixed") == "mixed"
+
+def test_ml_step_cache_skips_unfingerprintable_inputs(tmp_path):
+    manager = TraceManager()
+    manager.clear_events()
+
+    @ml_step(cache=str(tmp_path))
+    def step(obj):
+        return 1
+
+    assert step(object()) == 1
+    (event,) = [e for e in manager.get_events() if e["event_type"] == "ml_cache"]
+    assert event["meta"]["hit"] is False and "Cannot fingerprint" in event["meta"]["error"]
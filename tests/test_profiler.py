@@ -0,0 +1,103 @@
+import asyncio
+import sys
+import threading
+import time
+import pytest
+from pytracex import context
+from pytracex.context import set_correlation_id, reset_correlation_id, start_span, end_span
+from pytracex.profiler import SamplingProfiler
+from pytracex.trace_manager import TraceManager
+
+def busy_work(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        sum(range(100))
+
+def handle_request(correlation_id, seconds, spans):
+    corr_token = set_correlation_id(correlation_id)
+    span, span_token = start_span()
+    spans[correlation_id] = span
+    busy_work(seconds)
+    end_span(span_token)
+    reset_correlation_id(corr_token)
+
+def test_samples_are_tagged_with_request_context():
+    spans = {}
+    with SamplingProfiler(hz=200, traced_only=True) as profiler:
+        thread = threading.Thread(target=handle_request, args=("slow-request", 0.3, spans))
+        thread.start()
+        thread.join()
+    assert not profiler.running
+    assert not context._track_threads
+
+    stacks = profiler.folded(correlation_id="slow-request")
+    assert stacks and sum(stacks.values()) >= 10
+    assert all("handle_request" in stack and "busy_work" in stack for stack in stacks)
+    # Root frame first, innermost last.
+    stack = max(stacks, key=stacks.get)
+    assert stack.index("handle_request") < stack.index("busy_work")
+    assert profiler.folded(span_id=spans["slow-request"].span_id) == stacks
+    assert profiler.folded(correlation_id="other-request") == {}
+
+    # The main thread was only waiting in join() and has no context.
+    assert all("test_samples_are_tagged" not in stack for stack in profiler.folded())
+
+def test_thread_context_is_pruned():
+    with SamplingProfiler(hz=200):
+        # Resetting to no context removes the thread's entry...
+        handle_request("finished", 0.0, {})
+        assert threading.get_ident() not in context._thread_context
+
+        # ...and the profiler drops entries of threads that died holding one.
+        thread = threading.Thread(target=set_correlation_id, args=("leaked",))
+        thread.start()
+        thread.join()
+        deadline = time.monotonic() + 2
+        while thread.ident in context._thread_context and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert thread.ident not in context._thread_context
+
+async def interleaved_requests():
+    async def request(correlation_id):
+        set_correlation_id(correlation_id)
+        await asyncio.sleep(0)
+        if correlation_id == "busy":
+            busy_work(0.3)
+
+    # "idle" publishes its context last, then "busy" runs without changing it.
+    await asyncio.gather(request("busy"), request("idle"))
+
+def test_asyncio_samples_are_not_attributed_to_another_task():
+    with SamplingProfiler(hz=200) as profiler:
+        asyncio.run(interleaved_requests())
+
+    assert all("busy_work" not in stack for stack in profiler.folded(correlation_id="idle"))
+    if sys.version_info >= (3, 12):
+        # The running task's own context is readable.
+        assert any("busy_work" in stack for stack in profiler.folded(correlation_id="busy"))
+
+def test_folded_text_export(tmp_path):
+    with SamplingProfiler(hz=200) as profiler:
+        handle_request("request-1", 0.1, {})
+    path = tmp_path / "profile.folded"
+    text = profiler.to_folded(str(path), by_request=True)
+
+    assert path.read_text() == text
+    lines = text.splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert stack.startswith("request:")
+    assert profiler.stats()["samples"] > 0
+
+def test_trace_manager_profiler():
+    manager = TraceManager()
+    profiler = manager.start_profiler(hz=100)
+    assert profiler.running and context._track_threads
+    assert manager.stop_profiler() is profiler
+    assert not profiler.running and not context._track_threads
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        SamplingProfiler(hz=0)
@@ -0,0 +1,147 @@
+from collections import Counter
+import pytest
+from pytracex import sampling
+from pytracex.decorators import trace, audit
+from pytracex.masking import PIIMasker, get_masker, set_masker
+from pytracex.utils.hashing import verify_log
+from pytracex.trace_manager import TraceManager
+from pytracex.context import set_correlation_id, reset_correlation_id
+
+@pytest.fixture(autouse=True)
+def reset_sampling():
+    yield
+    sampling.set_tracing_enabled(True)
+    sampling.set_sample_rate(1.0)
+    sampling.set_sample_on_error(True)
+    sampling.set_tail_sampling(False, latency_threshold=1.0)
+    sampling.clear_sample_rate("per_function")
+
+def test_disabled_tracing_records_nothing():
+    @trace
+    def add(x, y):
+        return x + y
+
+    manager = TraceManager()
+    manager.clear_events()
+    sampling.set_tracing_enabled(False)
+    assert add(1, 2) == 3
+    assert manager.get_events() == []
+
+def test_sample_rates():
+    @trace(sample_rate=0.0)
+    def never():
+        return 1
+
+    @trace
+    def per_function():
+        return 2
+
+    manager = TraceManager()
+    manager.clear_events()
+    sampling.set_sample_rate(0.0, "per_function")
+    never()
+    per_function()
+    assert manager.get_events() == []
+
+    sampling.set_sample_rate(1.0, "per_function")
+    per_function()
+    assert [e["function_name"] for e in manager.get_events()] == ["per_function"]
+
+def test_sampled_out_errors_are_recorded():
+    @trace(sample_rate=0.0)
+    def fail(value):
+        raise ValueError("bad value")
+
+    manager = TraceManager()
+    manager.clear_events()
+    with pytest.raises(ValueError):
+        fail(42)
+
+    events = manager.get_events()
+    assert len(events) == 1
+    assert events[0]["meta"]["error"] == "ValueError: bad value"
+    assert events[0]["meta"]["args"] == (42,)
+
+    sampling.set_sample_on_error(False)
+    with pytest.raises(ValueError):
+        fail(42)
+    assert len(manager.get_events()) == 1
+
+def test_invalid_sample_rate():
+    with pytest.raises(ValueError):
+        sampling.set_sample_rate(1.5)
+    with pytest.raises(ValueError):
+        trace(sample_rate=-0.1)(lambda: None)
+
+def test_requests_are_sampled_by_correlation_id():
+    @trace
+    def step(x):
+        return x
+
+    manager = TraceManager()
+    manager.clear_events()
+    sampling.set_sample_rate(0.5)
+    ids = [f"request-{i}" for i in range(200)]
+    for correlation_id in ids:
+        token = set_correlation_id(correlation_id)
+        step(1)
+        step(2)
+        reset_correlation_id(token)
+
+    counts = Counter(e["meta"]["correlation_id"] for e in manager.get_events())
+    assert set(counts.values()) == {2}
+    assert set(counts) == {c for c in ids if sampling.sample_correlation_id(c, 0.5)}
+    assert 60 < len(counts) < 140
+    # Kept at a lower rate implies kept at a higher one.
+    assert all(sampling.sample_correlation_id(c, 0.9) for c in ids if sampling.sample_correlation_id(c, 0.5))
+
+def test_tail_sampling_never_drops_audit_events():
+    @audit
+    def pay(amount):
+        return amount
+
+    manager = TraceManager()
+    manager.clear_events()
+    sampling.set_sample_rate(0.0)
+    sampling.set_tail_sampling(True)
+    pay(1)
+    assert sampling.begin_request("req-1")
+    token = set_correlation_id("req-1")
+    pay(2)
+    reset_correlation_id(token)
+    # Make the signer seal it before the request ends.
+    manager.flush()
+    sampling.end_request("req-1")
+    pay(3)
+    manager.flush()
+
+    assert [e["meta"]["args"] for e in manager.get_events()] == [(1,), (2,), (3,)]
+    assert verify_log()["valid"]
+
+def test_fast_path_skips_masking_and_recording():
+    """
+    Disabled and sampled-out calls go straight to the function: nothing is
+    masked or recorded. Their timing is measured in benchmarks/bench_decorators.py.
+    """
+    masking_calls = []
+
+    class CountingMasker(PIIMasker):
+        def mask_arguments(self, *args, **kwargs):
+            masking_calls.append(args)
+            return super().mask_arguments(*args, **kwargs)
+
+    def identity(x):
+        return x
+
+    manager = TraceManager()
+    manager.clear_events()
+    previous = get_masker()
+    set_masker(CountingMasker())
+    try:
+        assert trace(sample_rate=0.0)(identity)(1) == 1
+        sampling.set_tracing_enabled(False)
+        assert trace(identity)(2) == 2
+    finally:
+        set_masker(previous)
+    assert masking_calls == []
+    assert manager.get_events() == []
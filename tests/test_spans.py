@@ -0,0 +1,75 @@
+import asyncio
+import time
+from pytracex.trace_manager import TraceManager, TraceEvent
+from pytracex.decorators import trace
+from pytracex.context import get_current_span, start_span, end_span
+from pytracex.spans import summarize_time
+
+@trace
+def leaf(delay):
+    time.sleep(delay)
+
+@trace
+def middle():
+    leaf(0.02)
+    leaf(0.001)
+
+@trace
+def handler():
+    middle()
+    TraceManager().record_event(TraceEvent(event_type="custom", function_name="note"))
+
+def test_nested_calls_form_a_tree():
+    manager = TraceManager()
+    manager.clear_events()
+    handler()
+    assert get_current_span() is None
+
+    trees = manager.span_trees()
+    assert len(trees) == 1
+    (root,) = next(iter(trees.values()))
+    assert root.name == "handler"
+    assert [child.name for child in root.children] == ["middle", "note"]
+
+    middle_node = root.children[0]
+    assert [child.name for child in middle_node.children] == ["leaf", "leaf"]
+    assert middle_node.self_time < middle_node.total_time
+    assert [node.name for node in root.critical_path()] == ["handler", "middle", "leaf"]
+
+    summary = summarize_time([root])
+    assert summary["leaf"]["count"] == 2
+    assert summary["leaf"]["self_time"] == summary["leaf"]["total_time"]
+
+def test_separate_calls_are_separate_traces():
+    manager = TraceManager()
+    manager.clear_events()
+    middle()
+    middle()
+    assert len(manager.span_trees()) == 2
+
+def test_span_context_propagates_into_tasks():
+    @trace
+    async def child():
+        await asyncio.sleep(0)
+
+    @trace
+    async def parent():
+        await asyncio.gather(child(), child())
+
+    manager = TraceManager()
+    manager.clear_events()
+    asyncio.run(parent())
+
+    (roots,) = manager.span_trees().values()
+    assert len(roots) == 1
+    assert [c.name for c in roots[0].children] == ["child", "child"]
+
+def test_manual_spans():
+    span, token = start_span()
+    inner, inner_token = start_span()
+    assert inner.parent_span_id == span.span_id
+    assert inner.trace_id == span.trace_id
+    end_span(inner_token)
+    assert get_current_span() is span
+    end_span(token)
+    assert get_current_span() is None
@@ -0,0 +1,348 @@
+import sys
+import threading
+import pytest
+from pytracex.storage import RingBufferStorage
+
+def test_ring_buffer_overwrites_oldest():
+    storage = RingBufferStorage(3)
+    for i in range(5):
+        assert storage.append(i) == i
+
+    assert storage.snapshot() == [2, 3, 4]
+    stats = storage.stats()
+    assert stats["size"] == 3
+    assert stats["overwritten"] == 2
+    assert stats["dropped"] == 0
+
+def test_ring_buffer_drops_newest():
+    storage = RingBufferStorage(3, overflow="drop_newest")
+    results = [storage.append(i) for i in range(5)]
+
+    assert results == [0, 1, 2, None, None]
+    assert storage.snapshot() == [0, 1, 2]
+    assert storage.stats()["dropped"] == 2
+
+def test_ring_buffer_clear_and_reuse():
+    storage = RingBufferStorage(2)
+    storage.append("a")
+    storage.append("b")
+    storage.clear()
+    assert len(storage) == 0
+    assert storage.snapshot() == []
+
+    storage.append("c")
+    assert storage.snapshot() == ["c"]
+
+def test_ring_buffer_rejects_bad_config():
+    with pytest.raises(ValueError):
+        RingBufferStorage(0)
+    with pytest.raises(ValueError):
+        RingBufferStorage(10, overflow="grow")
+
+def test_ring_buffer_concurrent_writers():
+    storage = RingBufferStorage(1000)
+
+    def writer(n):
+        for i in range(500):
+            storage.append((n, i))
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = storage.stats()
+    assert stats["recorded"] == 4000
+    assert stats["size"] == 1000
+    assert stats["overwritten"] == 3000
+    assert len(storage.snapshot()) == 1000
+
+def _indexed_storage(capacity=100):
+    return RingBufferStorage(
+        capacity,
+        indexes={"kind": lambda item: item[0]},
+        timestamp_key=lambda item: item[1],
+    )
+
+def test_query_filters_and_pagination():
+    storage = _indexed_storage()
+    for i in range(20):
+        storage.append(("a" if i % 4 == 0 else "b", float(i)))
+
+    rows, cursor = storage.query({"kind": "a"}, limit=3)
+    assert [item for _, item in rows] == [("a", 0.0), ("a", 4.0), ("a", 8.0)]
+    rows, cursor = storage.query({"kind": "a"}, cursor=cursor, limit=3)
+    assert [item for _, item in rows] == [("a", 12.0), ("a", 16.0)]
+    assert cursor is None
+
+    rows, _ = storage.query(since=17.0)
+    assert [item[1] for _, item in rows] == [17.0, 18.0, 19.0]
+    rows, _ = storage.query({"kind": "b"}, since=5.0, until=7.0)
+    assert [item[1] for _, item in rows] == [5.0, 6.0, 7.0]
+    assert storage.query({"kind": "missing"}) == ([], None)
+
+    with pytest.raises(ValueError):
+        storage.query({"unknown": 1})
+
+def test_query_spans_several_chunks():
+    storage = _indexed_storage(capacity=5000)
+    for i in range(6000):
+        storage.append(("a" if i % 3 else "b", float(i)))
+
+    # Matches are copied out under the lock in chunks, then filtered.
+    rows, cursor = storage.query({"kind": "a"}, since=1500.0, limit=2000)
+    assert len(rows) == 2000 and rows[0][1] == ("a", 1501.0)
+    rows, cursor = storage.query({"kind": "a"}, cursor=cursor, limit=5000)
+    assert cursor is None
+    assert rows[-1][1] == ("a", 5999.0)
+    rows, _ = storage.query(until=1010.0, limit=5000)
+    assert [item[1] for _, item in rows] == [float(i) for i in range(1000, 1011)]
+
+def test_indexes_follow_evictions():
+    storage = _indexed_storage(capacity=4)
+    for i in range(10):
+        storage.append(("a" if i < 8 else "b", float(i)))
+
+    rows, _ = storage.query({"kind": "a"})
+    assert [item[1] for _, item in rows] == [6.0, 7.0]
+    assert sum(len(seqs) for seqs in storage._indexes["kind"].values()) == 4
+
+    # Out-of-order timestamps must not hide events from "since" queries.
+    storage.append(("c", 1.0))
+    rows, _ = storage.query(since=0.5)
+    assert [item[1] for _, item in rows] == [7.0, 8.0, 9.0, 1.0]
+
+def _segmented(tmp_path, **options):
+    from pytracex.storage import SegmentedLogStorage
+    options.setdefault("segment_size", 512)
+    options.setdefault("index_interval", 4)
+    return SegmentedLogStorage(str(tmp_path / "log"), **options)
+
+def _event(i, kind="a", timestamp=None):
+    from pytracex.trace_manager import TraceEvent
+    return TraceEvent(event_type=kind, function_name=f"f{i}", timestamp=timestamp or 1000.0 + i)
+
+def test_segmented_log_rolls_and_queries(tmp_path):
+    storage = _segmented(tmp_path)
+    seqs = [storage.append(_event(i, "a" if i % 3 == 0 else "b")) for i in range(60)]
+    assert seqs == list(range(60))
+    assert storage.stats()["segments"] > 3
+    assert len(storage) == 60
+
+    rows, cursor = storage.query({"event_type": "a"}, limit=5)
+    assert [seq for seq, _ in rows] == [0, 3, 6, 9, 12]
+    rows, _ = storage.query({"event_type": "a"}, cursor=cursor, limit=100)
+    assert rows[0][0] == 15
+
+    rows, _ = storage.query(since=1050.0, until=1052.0)
+    assert [event["timestamp"] for _, event in rows] == [1050.0, 1051.0, 1052.0]
+    assert [e["function_name"] for e in storage.snapshot()][:2] == ["f0", "f1"]
+    storage.close()
+
+def test_segmented_log_recovers_after_restart(tmp_path):
+    storage = _segmented(tmp_path)
+    for i in range(30):
+        storage.append(_event(i))
+    storage.close()
+
+    # Simulate a torn write at the end of the active segment.
+    active = sorted((tmp_path / "log").glob("segment-*.log"))[-1]
+    with open(active, "ab") as f:
+        f.write(b"\x50\x00\x00\x00{\"trunc")
+
+    reopened = _segmented(tmp_path)
+    assert len(reopened) == 30
+    assert reopened.append(_event(30)) == 30
+    rows, _ = reopened.query(cursor=28)
+    assert [event["function_name"] for _, event in rows] == ["f29", "f30"]
+    reopened.close()
+
+def test_segmented_log_retention(tmp_path):
+    storage = _segmented(tmp_path, max_bytes=2048)
+    for i in range(200):
+        storage.append(_event(i))
+
+    stats = storage.stats()
+    assert stats["bytes"] <= 2048 + 512
+    assert stats["recorded"] == 200
+    rows, _ = storage.query(limit=1000)
+    assert rows[-1][0] == 199
+    assert rows[0][0] > 0
+    assert len(list((tmp_path / "log").glob("*.log"))) == stats["segments"]
+
+    storage.clear()
+    assert len(storage) == 0
+    assert storage.append(_event(0)) == 200
+    storage.close()
+
+def test_segmented_log_age_retention_and_removed_segments(tmp_path):
+    import os
+
+    storage = _segmented(tmp_path)
+    for i in range(60):
+        storage.append(_event(i))
+    assert storage.stats()["segments"] > 2
+
+    # Segments listed by a reader, then deleted before it gets to them.
+    listed = storage._readable_segments()
+    storage.clear()
+    assert [list(segment.records(segment.first_seq, 0, size)) for segment, size in listed[:-1]] == [[]] * (len(listed) - 1)
+
+    for i in range(60, 120):
+        storage.append(_event(i))
+    for path in sorted((tmp_path / "log").glob("*.log"))[:-1]:
+        os.utime(path, (0, 0))
+    # Age retention runs on reads, not only when a segment rolls...
+    storage.max_age = 60.0
+    rows, _ = storage.query(limit=1000)
+    assert storage.stats()["segments"] == 1
+    assert len(rows) == len(storage) < 60
+    storage.close()
+
+    # ...and when the log is opened again.
+    for path in (tmp_path / "log").glob("*.log"):
+        os.utime(path, (0, 0))
+    reopened = _segmented(tmp_path, max_age=60.0)
+    assert reopened.stats()["segments"] == 1
+    reopened.close()
+
+def test_trace_manager_with_segmented_backend(tmp_path):
+    from pytracex.trace_manager import TraceManager, TraceEvent
+
+    manager = TraceManager()
+    previous = manager.set_storage(_segmented(tmp_path))
+    try:
+        manager.record_event(TraceEvent(event_type="persisted", function_name="f"))
+        events, _ = manager.query(event_type="persisted")
+        assert events[0]["function_name"] == "f"
+        assert manager.get_events()[0]["event_type"] == "persisted"
+    finally:
+        manager.set_storage(previous).close()
+
+def _sqlite(tmp_path, **options):
+    from pytracex.storage import SQLiteStorage
+    options.setdefault("flush_interval", 0.05)
+    return SQLiteStorage(str(tmp_path / "traces.db"), **options)
+
+def test_sqlite_storage_queries(tmp_path):
+    storage = _sqlite(tmp_path)
+    seqs = [storage.append(_event(i, "a" if i % 3 == 0 else "b")) for i in range(60)]
+    assert seqs == list(range(60))
+    storage.flush()
+    assert len(storage) == 60
+
+    rows, cursor = storage.query({"event_type": "a"}, limit=5)
+    assert [seq for seq, _ in rows] == [0, 3, 6, 9, 12]
+    rows, cursor = storage.query({"event_type": "a"}, cursor=cursor, limit=100)
+    assert rows[0][0] == 15 and cursor is None
+
+    rows, _ = storage.query({"function_name": "f3"}, since=1000.0, until=1010.0)
+    assert [event["event_type"] for _, event in rows] == ["a"]
+    rows, _ = storage.query(since=1050.0, until=1052.0)
+    assert [event["timestamp"] for _, event in rows] == [1050.0, 1051.0, 1052.0]
+    with pytest.raises(ValueError):
+        storage.query({"meta": "x"})
+
+    storage.clear()
+    assert len(storage) == 0
+    storage.close()
+
+def test_sqlite_storage_reopens_and_continues_sequence(tmp_path):
+    storage = _sqlite(tmp_path)
+    for i in range(10):
+        storage.append(_event(i))
+    storage.close()
+
+    reopened = _sqlite(tmp_path)
+    assert len(reopened) == 10
+    assert reopened.append(_event(10)) == 10
+    reopened.flush()
+    rows, _ = reopened.query(cursor=8)
+    assert [event["function_name"] for _, event in rows] == ["f9", "f10"]
+    reopened.close()
+
+def test_sqlite_storage_writes_in_sequence_order(tmp_path):
+    storage = _sqlite(tmp_path)
+    writer = storage._writer.exporter
+    written = []
+    export = writer.export
+
+    def recording_export(rows):
+        written.extend(row[0] for row in rows)
+        export(rows)
+
+    writer.export = recording_export
+
+    def append_many():
+        for i in range(200):
+            storage.append(_event(i))
+
+    threads = [threading.Thread(target=append_many) for _ in range(4)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    storage.flush()
+    assert written == list(range(800))
+    assert storage.stats()["pending"] == 0
+    storage.close()
+
+def test_sqlite_storage_closes_readers_of_exited_threads(tmp_path):
+    storage = _sqlite(tmp_path)
+    for _ in range(5):
+        thread = threading.Thread(target=storage.query)
+        thread.start()
+        thread.join()
+    # The opening thread's reader and the last worker's, which exited last.
+    assert len(storage._connections) == 2
+    storage.close()
+    assert storage._connections == {}
+
+def test_trace_manager_with_sqlite_backend(tmp_path):
+    from pytracex.trace_manager import TraceManager, TraceEvent
+
+    manager = TraceManager()
+    previous = manager.set_storage(_sqlite(tmp_path))
+    try:
+        manager.record_event(TraceEvent(event_type="persisted", function_name="f", meta={"x": 1}))
+        manager.flush()
+        events, _ = manager.query(event_type="persisted")
+        assert events[0]["function_name"] == "f"
+        assert events[0]["meta"]["x"] == 1
+    finally:
+        manager.set_storage(previous).close()
+
+@pytest.mark.parametrize("backend", ["memory", "segmented", "sqlite"])
+def test_durable_audit_is_stored_on_return(tmp_path, backend):
+    from pytracex.trace_manager import TraceManager
+    from pytracex.decorators import audit
+
+    make = {
+        "memory": lambda: RingBufferStorage(100),
+        "segmented": lambda: _segmented(tmp_path, segment_size=1 << 20),
+        "sqlite": lambda: _sqlite(tmp_path, flush_interval=60.0),
+    }[backend]
+    manager = TraceManager()
+    storage = make()
+    previous = manager.set_storage(storage)
+    try:
+        @audit(durable=True)
+        def transfer(amount):
+            return amount
+
+        transfer(7)
+        assert [list(e["meta"]["args"]) for e in manager.get_events()] == [[7]]
+        if backend != "memory":
+            # Already on disk: a second instance reading the same files sees it.
+            reader = make()
+            assert [e["function_name"] for e in reader.snapshot()] == ["transfer"]
+            reader.close()
+    finally:
+        manager.set_storage(previous)
+        storage.close()
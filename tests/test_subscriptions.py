@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import pytest
+from pytracex import trace_manager
+from pytracex.trace_manager import TraceManager, TraceEvent
+from pytracex.subscriptions import SubscriptionClosed
+
+def test_subscription_receives_only_new_matching_events():
+    manager = TraceManager()
+    manager.clear_events()
+    manager.record_event(TraceEvent(event_type="old"))
+
+    async def run():
+        subscription = manager.subscribe(event_type="wanted")
+        try:
+            manager.record_event(TraceEvent(event_type="wanted", function_name="a"))
+            manager.record_event(TraceEvent(event_type="other"))
+            manager.record_event(TraceEvent(event_type="wanted", function_name="b"))
+            events, cursor = await asyncio.wait_for(subscription.next_batch(), 1)
+            return events, cursor
+        finally:
+            manager.unsubscribe(subscription)
+
+    events, cursor = asyncio.run(run())
+    assert [e["function_name"] for e in events] == ["a", "b"]
+    assert cursor is not None
+
+def test_subscription_resumes_from_cursor():
+    manager = TraceManager()
+    manager.clear_events()
+    for name in ("first", "second", "third"):
+        manager.record_event(TraceEvent(event_type="resume", function_name=name))
+    _, cursor = manager.query(limit=1)
+
+    async def run():
+        subscription = manager.subscribe(cursor=cursor)
+        try:
+            return await asyncio.wait_for(subscription.next_batch(), 1)
+        finally:
+            manager.unsubscribe(subscription)
+
+    events, _ = asyncio.run(run())
+    assert [e["function_name"] for e in events] == ["second", "third"]
+
+def test_bursts_from_threads_are_coalesced():
+    manager = TraceManager()
+
+    async def run():
+        subscription = manager.subscribe(event_type="burst")
+        try:
+            def writer():
+                for _ in range(200):
+                    manager.record_event(TraceEvent(event_type="burst"))
+            threads = [threading.Thread(target=writer) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            events, _ = await asyncio.wait_for(subscription.next_batch(coalesce=0.01), 1)
+            return len(events)
+        finally:
+            manager.unsubscribe(subscription)
+
+    assert asyncio.run(run()) == 800
+
+def test_slow_consumer_policies():
+    manager = TraceManager()
+
+    async def run():
+        dropping = manager.subscribe(event_type="slow", max_pending=5)
+        disconnecting = manager.subscribe(event_type="slow", max_pending=5, overflow="disconnect")
+        try:
+            for i in range(8):
+                manager.record_event(TraceEvent(event_type="slow", function_name=str(i)))
+            events, _ = await dropping.next_batch()
+            assert [e["function_name"] for e in events] == ["3", "4", "5", "6", "7"]
+            assert dropping.dropped == 3
+            with pytest.raises(SubscriptionClosed):
+                await disconnecting.next_batch()
+        finally:
+            manager.unsubscribe(dropping)
+            manager.unsubscribe(disconnecting)
+
+    asyncio.run(run())
+
+def test_backfill_is_not_limited_by_max_pending():
+    manager = TraceManager()
+    manager.clear_events()
+    manager.record_event(TraceEvent(event_type="backlog", function_name="start"))
+    for i in range(20):
+        manager.record_event(TraceEvent(event_type="backlog", function_name=str(i)))
+    _, cursor = manager.query(event_type="backlog", limit=1)
+
+    async def run():
+        subscription = manager.subscribe(cursor=cursor, event_type="backlog", max_pending=5, overflow="disconnect")
+        try:
+            events, _ = await asyncio.wait_for(subscription.next_batch(), 1)
+            assert [e["function_name"] for e in events] == [str(i) for i in range(20)]
+            manager.record_event(TraceEvent(event_type="backlog", function_name="live"))
+            events, _ = await asyncio.wait_for(subscription.next_batch(), 1)
+            assert [e["function_name"] for e in events] == ["live"]
+        finally:
+            manager.unsubscribe(subscription)
+
+    asyncio.run(run())
+
+def test_backfill_is_paged_off_the_loop(monkeypatch):
+    manager = TraceManager()
+    manager.clear_events()
+    monkeypatch.setattr(trace_manager, "SUBSCRIPTION_BACKFILL_PAGE_SIZE", 5)
+    storage = manager._storage
+    query = storage.query
+    query_threads = []
+
+    def tracking_query(*args, **kwargs):
+        query_threads.append(threading.get_ident())
+        return query(*args, **kwargs)
+
+    monkeypatch.setattr(storage, "query", tracking_query)
+    manager.record_event(TraceEvent(event_type="paged", function_name="start"))
+    for i in range(20):
+        manager.record_event(TraceEvent(event_type="paged", function_name=str(i)))
+    _, cursor = query(filters={"event_type": "paged"}, limit=1)
+
+    async def run():
+        subscription = manager.subscribe(cursor=cursor, event_type="paged", max_pending=2, overflow="disconnect")
+        try:
+            # Nothing is read until the subscriber asks for events.
+            assert query_threads == []
+            names = []
+            while len(names) < 25:
+                events, _ = await asyncio.wait_for(subscription.next_batch(), 1)
+                assert len(events) <= 5
+                names += [e["function_name"] for e in events]
+                if len(names) == 5:
+                    # More live events than max_pending while backfilling.
+                    for i in range(5):
+                        manager.record_event(TraceEvent(event_type="paged", function_name=f"live-{i}"))
+            assert names == [str(i) for i in range(20)] + [f"live-{i}" for i in range(5)]
+            assert not subscription.closed and subscription.dropped == 0
+            assert threading.get_ident() not in query_threads
+        finally:
+            manager.unsubscribe(subscription)
+
+    asyncio.run(run())
@@ -22,3 +22,45 @@ def test_clear_events():
 
     manager.clear_events()
     assert len(manager.get_events()) == 0
+
+def test_get_events_returns_snapshot():
+    manager = TraceManager()
+    manager.clear_events()
+    manager.record_event(TraceEvent(event_type="snapshot_test"))
+
+    events = manager.get_events()
+    manager.record_event(TraceEvent(event_type="snapshot_test"))
+
+    assert len(events) == 1
+    assert len(manager.get_events()) == 2
+    assert manager.storage_stats()["size"] == 2
+
+def test_trace_event_ids_and_lazy_dict():
+    from pytracex.context import set_correlation_id
+    set_correlation_id("corr-1")
+    try:
+        meta = {"k": "v"}
+        first = TraceEvent(event_type="id_test", meta=meta)
+        second = TraceEvent(event_type="id_test")
+    finally:
+        set_correlation_id(None)
+
+    assert isinstance(first.event_id, int)
+    assert 0 < first.event_id < 2 ** 63
+    assert second.event_id == first.event_id + 1
+    assert not hasattr(first, "__dict__")
+
+    d = first.to_dict()
+    assert d["meta"] == {"k": "v", "correlation_id": "corr-1"}
+    assert meta == {"k": "v"}
+    assert second.to_dict()["meta"] == {"correlation_id": "corr-1"}
+
+def test_trace_storage_is_a_deprecated_snapshot():
+    from pytracex import config
+
+    manager = TraceManager()
+    manager.clear_events()
+    manager.record_event(TraceEvent(event_type="legacy"))
+    with pytest.warns(DeprecationWarning, match="TRACE_STORAGE"):
+        events = config.TRACE_STORAGE
+    assert [e.event_type for e in events] == ["legacy"]